@@ -1,4 +1,5 @@
 from collections import defaultdict
+from multiprocessing import freeze_support
 from typing import Optional, List, Tuple, Dict
 
 import pygame
@@ -297,5 +298,7 @@ class App(AppContainer, Navigator):
 
 
 if __name__ == "__main__":
+    # Hints are searched for in worker processes, which a frozen app on Windows starts by running itself again
+    freeze_support()
     theApp = App()
     theApp.on_execute()
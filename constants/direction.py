@@ -1,8 +1,6 @@
 from enum import Enum
 from typing import Optional, Dict, Callable
 
-import pygame
-
 from coordinate import Coordinate
 
 
@@ -13,6 +11,15 @@ class Direction(Enum):
     down = 3
 
 
+# The unit coordinate for each direction. Coordinates never change, so these are shared by everything moving.
+_UNIT_COORDINATES: Dict[Direction, Coordinate] = {
+    Direction.up: Coordinate(x=0, y=-1),
+    Direction.down: Coordinate(x=0, y=1),
+    Direction.right: Coordinate(x=1, y=0),
+    Direction.left: Coordinate(x=-1, y=0),
+}
+
+
 def try_get_move_from_key(pressed_keys: Dict[int, bool]) -> Optional[Direction]:
     """
     Get a move from pressed keys. Returns None if no move key is pressed,
@@ -20,6 +27,9 @@ def try_get_move_from_key(pressed_keys: Dict[int, bool]) -> Optional[Direction]:
     :param pressed_keys: the pressed keys
     :return: the direction of movement
     """
+    # Imported here so directions can be used without loading pygame (e.g. by the solver)
+    import pygame
+
     if pressed_keys[pygame.K_UP]:
         return Direction.up
     elif pressed_keys[pygame.K_DOWN]:
@@ -54,15 +64,10 @@ def direction_to_coordinate(direction: Direction) -> Coordinate:
     :param direction: the direction of the unit coordinate
     :return: the unit coordinate
     """
-    if direction == Direction.up:
-        return Coordinate(x=0, y=-1)
-    elif direction == Direction.down:
-        return Coordinate(x=0, y=1)
-    elif direction == Direction.right:
-        return Coordinate(x=1, y=0)
-    elif direction == Direction.left:
-        return Coordinate(x=-1, y=0)
-    raise ValueError(f"Unknown direction: {direction.name}")
+    coordinate = _UNIT_COORDINATES.get(direction)
+    if coordinate is None:
+        raise ValueError(f"Unknown direction: {direction.name}")
+    return coordinate
 
 
 def direction_sorter(direction: Direction) -> Callable[[Coordinate], int]:
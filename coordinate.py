@@ -1,8 +1,20 @@
 from math import sqrt
 from typing import Tuple
 
+# Hashes are y * HASH_STRIDE + x + HASH_OFFSET, which is different for every coordinate with |x| < 2 ** 31 and
+# |y| < 2 ** 28. The offset keeps them away from -1, which Python turns into -2.
+HASH_STRIDE = 1 << 32
+HASH_OFFSET = 1 << 31
+
 
 class Coordinate:
+    """
+    An (x, y) position. Hashes never collide on any grid that fits in memory, so looking coordinates up in a
+    dictionary never has to compare more than the one that matches. Only x and y are stored, as grids make very
+    many coordinates.
+    """
+    __slots__ = ("__x", "__y")
+
     def __init__(self, x: int, y: int):
         self.__x = x
         self.__y = y
@@ -31,26 +43,27 @@ class Coordinate:
         return self.__x / factor, self.__y / factor
 
     def __iter__(self):
-        return iter([self.x, self.y])
+        return iter((self.__x, self.__y))
 
     def __eq__(self, other):
         if other is self:
             return True
         if isinstance(other, Coordinate):
-            return other.x == self.x and other.y == self.y
+            return other.__x == self.__x and other.__y == self.__y
         return False
 
     def __hash__(self):
-        return self.x.__hash__() + self.y.__hash__()
+        # Coordinates of whole numbers and equal ones of floats hash the same
+        return hash(self.__y * HASH_STRIDE + self.__x + HASH_OFFSET)
 
     def __add__(self, other):
         if isinstance(other, Coordinate):
-            return Coordinate(x=self.x + other.x, y=self.y + other.y)
+            return Coordinate(x=self.__x + other.__x, y=self.__y + other.__y)
         raise ValueError("Cannot add a non-coordinate")
 
     def __sub__(self, other):
         if isinstance(other, Coordinate):
-            return Coordinate(x=self.x - other.x, y=self.y - other.y)
+            return Coordinate(x=self.__x - other.__x, y=self.__y - other.__y)
         raise ValueError("Cannot subtract a non-coordinate")
 
     def __str__(self):
@@ -0,0 +1,339 @@
+from typing import List, Tuple, TYPE_CHECKING
+
+from constants.direction import Direction
+from coordinate import Coordinate
+from solver.level import Level, WALL, GOAL, FLOOR
+from solver.zobrist import get_zobrist_table
+
+if TYPE_CHECKING:
+    from app_container import AppContainer
+    from grid import Grid
+
+# Flags for what is on each cell
+WALL_FLAG = 1
+GOAL_FLAG = 2
+CRATE_FLAG = 4
+PLAYER_FLAG = 8
+
+# Anything a player or crate cannot move into
+BLOCKING_FLAGS = WALL_FLAG | CRATE_FLAG | PLAYER_FLAG
+
+
+class GameState:
+    """
+    A compact, mutable alternative to the Grid which stores what is on each cell as flags in a bytearray.
+    Moves and pushes update the cells in place, without creating any pieces, and do not need an app container.
+
+    Cells are numbered as in the Level the state is built from.
+    """
+    def __init__(self, level: Level):
+        self.__level = level
+        self.__offsets = level.offsets
+        self.__zobrist = get_zobrist_table(level.size)
+
+        self.__cells = bytearray(level.size)
+        for cell, wall in enumerate(level.walls):
+            if wall:
+                self.__cells[cell] = WALL_FLAG
+        for goal in level.goals:
+            self.__cells[goal] |= GOAL_FLAG
+        for crate in level.crates:
+            self.__cells[crate] |= CRATE_FLAG
+        for player in level.players:
+            self.__cells[player] |= PLAYER_FLAG
+
+        # Kept sorted so players can be moved in order without building a new list
+        self.__players: List[int] = sorted(level.players)
+        self.__crates_off_goals = sum(1 for crate in level.crates if crate not in level.goals)
+
+        # Zobrist hashes, kept up to date as pieces move
+        self.__crates_hash = self.__zobrist.crates_hash(level.crates)
+        self.__players_hash = self.__zobrist.players_hash(level.players)
+
+        # Counters for the moves made so far
+        self.moves = 0
+        self.pushes = 0
+
+    @staticmethod
+    def from_map(custom_map: List[List[str]]) -> "GameState":
+        """
+        Build a game state from a map definition in the same format as read by read_map
+        :param custom_map: the map definition
+        :return: the game state
+        """
+        return GameState(Level(custom_map))
+
+    @staticmethod
+    def from_grid(grid: "Grid") -> "GameState":
+        """
+        Build a game state from the current positions of the pieces in a grid
+        :param grid: the grid to copy
+        :return: the game state
+        """
+        from pieces.crate import CratePiece
+        from pieces.goal import GoalPiece
+        from pieces.player import PlayerPiece
+        from pieces.wall import WallPiece
+
+        definition = [[FLOOR] * grid.width for _ in range(grid.height)]
+        for letter, piece_type in ((WALL, WallPiece), (GOAL, GoalPiece)):
+            for piece in grid.get_pieces_of_type(piece_type):
+                for coordinate in grid.get_terrain_coordinates(piece):
+                    definition[coordinate.y][coordinate.x] = letter
+
+        state = GameState(Level(definition))
+        for piece in grid.get_pieces_of_type(CratePiece):
+            state.add_crate(state.level.cell(piece.x, piece.y))
+        for piece in grid.get_pieces_of_type(PlayerPiece):
+            state.add_player(state.level.cell(piece.x, piece.y))
+        return state
+
+    def to_grid(self, app_container: "AppContainer") -> "Grid":
+        """
+        Build a grid with pieces matching this state
+        :param app_container: the app container for the grid and its pieces
+        :return: the new grid
+        """
+        from grid import Grid
+        from pieces.crate import CratePiece
+        from pieces.goal import GoalPiece
+        from pieces.player import PlayerPiece
+        from pieces.wall import WallPiece
+
+        grid = Grid(app_container, self.width, self.height)
+        wall = grid.terrain_piece(WallPiece)
+        goal = grid.terrain_piece(GoalPiece)
+        for y in range(self.height):
+            for x in range(self.width):
+                flags = self.__cells[self.__level.cell(x, y)]
+                if flags & WALL_FLAG:
+                    grid.add_piece(wall, Coordinate(x, y))
+                if flags & GOAL_FLAG:
+                    grid.add_piece(goal, Coordinate(x, y))
+                if flags & CRATE_FLAG:
+                    grid.add_piece(CratePiece(grid, app_container), Coordinate(x, y))
+                if flags & PLAYER_FLAG:
+                    grid.add_piece(PlayerPiece(grid, app_container), Coordinate(x, y))
+        return grid
+
+    @property
+    def level(self) -> Level:
+        return self.__level
+
+    @property
+    def width(self) -> int:
+        return self.__level.width
+
+    @property
+    def height(self) -> int:
+        return self.__level.height
+
+    @property
+    def cells(self) -> bytearray:
+        """ The flags for every cell. This should not be modified directly. """
+        return self.__cells
+
+    @property
+    def players(self) -> Tuple[int, ...]:
+        return tuple(self.__players)
+
+    @property
+    def crates(self) -> Tuple[int, ...]:
+        return tuple(c for c, flags in enumerate(self.__cells) if flags & CRATE_FLAG)
+
+    @property
+    def crates_mask(self) -> int:
+        """ The crates as a bitboard, with bit n set if there is a crate on cell n """
+        return self.__mask(CRATE_FLAG)
+
+    @property
+    def walls_mask(self) -> int:
+        return self.__mask(WALL_FLAG)
+
+    @property
+    def goals_mask(self) -> int:
+        return self.__level.goals_mask
+
+    @property
+    def is_solved(self) -> bool:
+        """ True if every crate is on a goal """
+        return self.__crates_off_goals == 0
+
+    @property
+    def crates_hash(self) -> int:
+        """ The Zobrist hash of the crates """
+        return self.__crates_hash
+
+    @property
+    def hash(self) -> int:
+        """ The Zobrist hash of the crates and the exact positions of the players """
+        return self.__crates_hash ^ self.__players_hash
+
+    def normalised_hash(self) -> int:
+        """
+        The Zobrist hash of the crates and the region a single player can walk around, so that positions which
+        only differ by the player walking have the same hash. With several players, every player must be
+        in the same place as all players move together.
+        :return: the hash of the position
+        """
+        if len(self.__players) != 1:
+            return self.hash
+
+        cells = self.__cells
+        offsets = self.__offsets.values()
+        reachable = [self.__players[0]]
+        seen = {reachable[0]}
+        for cell in reachable:
+            for offset in offsets:
+                neighbour = cell + offset
+                if neighbour not in seen and not cells[neighbour] & (WALL_FLAG | CRATE_FLAG):
+                    seen.add(neighbour)
+                    reachable.append(neighbour)
+        return self.__zobrist.position_hash(self.__crates_hash, min(reachable))
+
+    def key(self) -> Tuple[int, Tuple[int, ...]]:
+        """
+        :return: a hashable snapshot of the crates and players
+        """
+        return self.crates_mask, tuple(self.__players)
+
+    def copy(self) -> "GameState":
+        """
+        :return: an independent copy of this state
+        """
+        state = GameState.__new__(GameState)
+        state.__level = self.__level
+        state.__offsets = self.__offsets
+        state.__zobrist = self.__zobrist
+        state.__cells = bytearray(self.__cells)
+        state.__players = list(self.__players)
+        state.__crates_off_goals = self.__crates_off_goals
+        state.__crates_hash = self.__crates_hash
+        state.__players_hash = self.__players_hash
+        state.moves = self.moves
+        state.pushes = self.pushes
+        return state
+
+    def cell_at(self, coordinate: Coordinate) -> int:
+        """
+        :param coordinate: a coordinate on the map
+        :return: the flags on that square
+        """
+        return self.__cells[self.__level.cell(coordinate.x, coordinate.y)]
+
+    def add_crate(self, cell: int):
+        """
+        Put a crate on a cell
+        :param cell: the cell, which must be empty floor
+        :return: nothing
+        """
+        if self.__cells[cell] & BLOCKING_FLAGS:
+            raise ValueError(f"Cell is not empty: {self.__level.coordinate(cell)}")
+        self.__cells[cell] |= CRATE_FLAG
+        self.__crates_hash ^= self.__zobrist.crate_keys[cell]
+        if not self.__cells[cell] & GOAL_FLAG:
+            self.__crates_off_goals += 1
+
+    def add_player(self, cell: int):
+        """
+        Put a player on a cell
+        :param cell: the cell, which must be empty floor
+        :return: nothing
+        """
+        if self.__cells[cell] & BLOCKING_FLAGS:
+            raise ValueError(f"Cell is not empty: {self.__level.coordinate(cell)}")
+        self.__cells[cell] |= PLAYER_FLAG
+        self.__players_hash ^= self.__zobrist.player_keys[cell]
+        self.__players.append(cell)
+        self.__players.sort()
+
+    def move(self, direction: Direction) -> bool:
+        """
+        Move every player in the given direction following the rules of the game. Players move at the same time,
+        starting with the one furthest in the direction of movement, and can push a line of crates as long as
+        the square beyond the line is empty.
+        :param direction: the direction to move in
+        :return: True if any player moved
+        """
+        offset = self.__offsets[direction]
+        players = self.__players
+        count = len(players)
+        moved = False
+        for i in range(count):
+            # Players are sorted by cell, so the furthest player is at one end of the list
+            index = count - 1 - i if offset > 0 else i
+            if self.__step(index, offset):
+                moved = True
+
+        if count > 1:
+            players.sort()
+        if moved:
+            self.moves += 1
+        return moved
+
+    def push(self, crate: int, direction: Direction) -> bool:
+        """
+        Push a crate (and any line of crates in front of it) one square, moving the only player straight
+        behind the crate first. This does not check the player could walk there, which is useful when
+        searching over pushes.
+        :param crate: the cell of the crate to push
+        :param direction: the direction to push in
+        :return: True if the crate moved
+        """
+        cells = self.__cells
+        offset = self.__offsets[direction]
+        pusher = crate - offset
+        if len(self.__players) != 1 or not cells[crate] & CRATE_FLAG or cells[pusher] & (WALL_FLAG | CRATE_FLAG):
+            return False
+
+        player = self.__players[0]
+        self.__place_player(0, pusher)
+        if self.__step(0, offset):
+            self.moves += 1
+            return True
+
+        self.__place_player(0, player)
+        return False
+
+    def __step(self, index: int, offset: int) -> bool:
+        """
+        Move a single player by an offset, pushing any crates in front of it
+        """
+        cells = self.__cells
+        player = self.__players[index]
+        target = player + offset
+        end = target
+        while cells[end] & CRATE_FLAG:
+            end += offset
+        if cells[end] & (WALL_FLAG | PLAYER_FLAG):
+            return False
+
+        if end != target:
+            # Shuffling a line of crates along is the same as moving the first crate to the end
+            cells[target] &= ~CRATE_FLAG
+            cells[end] |= CRATE_FLAG
+            self.__crates_hash = self.__zobrist.push(self.__crates_hash, target, end)
+            self.pushes += (end - target) // offset
+            self.__crates_off_goals += (cells[target] & GOAL_FLAG) // GOAL_FLAG - (cells[end] & GOAL_FLAG) // GOAL_FLAG
+
+        self.__place_player(index, target)
+        return True
+
+    def __place_player(self, index: int, cell: int):
+        """
+        Move a player straight to a cell
+        """
+        cells = self.__cells
+        player = self.__players[index]
+        cells[player] &= ~PLAYER_FLAG
+        cells[cell] |= PLAYER_FLAG
+        self.__players[index] = cell
+        player_keys = self.__zobrist.player_keys
+        self.__players_hash ^= player_keys[player] ^ player_keys[cell]
+
+    def __mask(self, flag: int) -> int:
+        mask = 0
+        for cell, flags in enumerate(self.__cells):
+            if flags & flag:
+                mask |= 1 << cell
+        return mask
@@ -1,12 +1,51 @@
-from typing import List, Iterable, Dict, Set, TYPE_CHECKING
+from array import array
+from collections import Counter
+from enum import Enum
+from typing import (List, Iterable, Dict, Hashable, Mapping, NamedTuple, Sequence, Set, Tuple, Optional, Union,
+                    TYPE_CHECKING)
 
 from app_container import AppContainer, UsesAppContainer
+from constants.direction import Direction, direction_to_coordinate
 from coordinate import Coordinate
 from pieces.floor import FloorPiece
+from pieces.static import StaticPiece
 from pieces.wall import WallPiece
+from zobrist import zobrist_key
 
 if TYPE_CHECKING:
     from pieces.piece import Piece
+    from solver.analysis import MapAnalysis
+    from solver.deadlocks import DeadlockDetector
+
+# A piece moving from one place in the grid to another, see Grid.begin. Changes to the terrain have no piece,
+# and the index is that of the static pieces on the coordinate before and after.
+_Change = Tuple[Optional["Piece"], Optional[Coordinate], int, Optional[Coordinate], int]
+
+# The static pieces on a coordinate, from the bottom up
+_Stack = Tuple[StaticPiece, ...]
+
+# The terrain is split into square chunks with sides of 2 to the power of this, so that a chunk with the same
+# static pieces on every coordinate, such as solid wall outside a large map, costs no more than a single number
+CHUNK_BITS = 4
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_CELLS = CHUNK_SIZE * CHUNK_SIZE
+
+
+class MoveOutcome(Enum):
+    blocked = 0
+    walk = 1
+    push = 2
+
+
+class MovePrediction(NamedTuple):
+    """
+    What would happen if a piece moved, see Grid.predict_move
+    """
+    outcome: MoveOutcome
+    # Where the piece would end up, or where it already is if blocked
+    destination: Coordinate
+    # Where each pushed piece would move from and to, starting with the one furthest from the mover
+    pushes: List[Tuple[Coordinate, Coordinate]]
 
 
 class Grid(UsesAppContainer):
@@ -15,18 +54,59 @@ class Grid(UsesAppContainer):
         self.__width = width
         self.__height = height
 
-        # Various dictionaries for efficiency
+        # The static analysis of the map this grid was read from, if it is being played, see MapViewModel
+        self.map_analysis: Optional["MapAnalysis"] = None
+
+        # Watches crates as they move for positions which can never be solved, if the map is being played
+        self.deadlock_detector: Optional["DeadlockDetector"] = None
+
+        # Various dictionaries for efficiency. Only pieces which can move are in these, static pieces are terrain.
         self.__coordinates_to_pieces: Dict[Coordinate, List["Piece"]] = dict()
         self.__pieces_to_coordinates: Dict["Piece", Coordinate] = dict()
         self.__piece_types_to_pieces: Dict[type, Set["Piece"]] = dict()
 
-        self.__piece_types_to_pieces[FloorPiece] = set()
-        for x in range(0, width):
-            for y in range(0, height):
-                floor = FloorPiece(self, self.app_container)
-                self.__coordinates_to_pieces[Coordinate(x=x, y=y)] = [floor]
-                self.__pieces_to_coordinates[floor] = Coordinate(x=x, y=y)
-                self.__piece_types_to_pieces[type(floor)].add(floor)
+        # The terrain is a number for each coordinate indexing the distinct stacks of static pieces in the grid.
+        # Static pieces are flyweights shared by every coordinate they are on, see terrain_piece. The numbers are
+        # kept in chunks, row by row, where a chunk is either the one number for all its coordinates or an array
+        # of CHUNK_CELLS numbers once they differ.
+        self.__chunks_across = (width + CHUNK_SIZE - 1) >> CHUNK_BITS
+        chunks_down = (height + CHUNK_SIZE - 1) >> CHUNK_BITS
+        self.__chunks: List[Union[int, array]] = [0] * (self.__chunks_across * chunks_down)
+        self.__stacks: List[_Stack] = []
+        self.__stack_indices: Dict[_Stack, int] = dict()
+        # The number of coordinates each static piece is on, so it can leave the pieces of its type once unused
+        self.__terrain_counts: Dict[StaticPiece, int] = dict()
+        self.__flyweights: Dict[type, StaticPiece] = dict()
+
+        # Once a grid has been forked, the chunks of terrain are shared with the fork and have to be copied before
+        # either grid changes them. Chunks are only copied as they change, and these are the ones this grid has
+        # copied since, or None if nothing is shared.
+        self.__terrain_shared = False
+        self.__owned_chunks: Optional[Set[int]] = None
+
+        # A Zobrist hash of every piece type on every coordinate, updated as pieces are added and removed, kept in
+        # two parts so the terrain's can be replaced by load_terrain. The floor every grid starts with is left out,
+        # as it is the same for every grid of the same size.
+        self.__zobrist_hash = 0
+        self.__terrain_zobrist_hash = 0
+
+        # The names Zobrist keys are made from, by the class of the piece they are for. Static pieces which are not
+        # the flyweight of their class, such as the bricks on the start screen, look different from each other so
+        # are each keyed by the piece instead. A class or piece whose name is already taken gets a number added.
+        self.__zobrist_names: Dict[Hashable, str] = dict()
+
+        # Changes made while a transaction is open, as (piece, coordinate and index in the pieces there before,
+        # coordinate and index after), where a coordinate of None means not in the grid. They are only registered
+        # with the undo manager once the outermost transaction commits, so a rollback can undo them in place.
+        self.__journal: List[_Change] = []
+
+        # The length of the journal and the undo manager's position when each open transaction began
+        self.__transactions: List[Tuple[int, int]] = []
+
+        floor = self.terrain_piece(FloorPiece)
+        self.__stack_index((floor,))
+        self.__terrain_counts[floor] = width * height
+        self.__piece_types_to_pieces[FloorPiece] = {floor}
 
     @property
     def app_container(self):
@@ -40,26 +120,142 @@ class Grid(UsesAppContainer):
     def height(self) -> int:
         return self.__height
 
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        A 64 bit hash of the class of every piece on every coordinate. Grids with the same pieces in the
+        same places have the same hash, so this can be used to spot repeated positions. Terrain from load_terrain
+        is left out, as it is the same for every position of a map. See normalised_hash to ignore where the player
+        is in the area they can walk around.
+        """
+        return self.__zobrist_hash ^ self.__terrain_zobrist_hash
+
+    def normalised_hash(self) -> int:
+        """
+        A 64 bit hash like zobrist_hash, but of the region a single player can walk around rather than where in it
+        the player is, so that positions which only differ by the player walking have the same hash, as with
+        GameState.normalised_hash. Crates, and anything else that moves, block the player. With several players,
+        every player must be in the same place as all players move together.
+        :return: the hash of the position
+        """
+        from pieces.player import PlayerPiece
+
+        players = self.__piece_types_to_pieces.get(PlayerPiece)
+        if not players or len(players) != 1:
+            return self.zobrist_hash
+
+        player = next(iter(players))
+        start = self.__pieces_to_coordinates[player]
+        passable = [all(piece.allow_player_move for piece in stack) for stack in self.__stacks]
+        steps = [direction_to_coordinate(direction) for direction in Direction]
+        reachable = [start]
+        seen = {start}
+        for coordinate in reachable:
+            for step in steps:
+                neighbour = coordinate + step
+                if neighbour in seen or neighbour in self.__coordinates_to_pieces or not self.contains(neighbour):
+                    continue
+                if passable[self.__terrain_index(neighbour)]:
+                    seen.add(neighbour)
+                    reachable.append(neighbour)
+        lowest = min(reachable, key=lambda coordinate: (coordinate.y, coordinate.x))
+        return self.zobrist_hash ^ self.__zobrist_key(player, start) ^ self.__zobrist_key(player, lowest)
+
     def add_outer_wall(self):
         """
-        Add wall pieces all around the border of the grid
+        Add wall pieces all around the border of the grid. Like load_terrain, this is for building a grid, so
+        nothing is recorded to undo.
         :return: nothing
         """
-        for x in range(0, self.width):
-            self.add_piece(WallPiece(self, self.app_container), Coordinate(x, 0))
-            self.add_piece(WallPiece(self, self.app_container), Coordinate(x, self.height - 1))
+        wall = self.terrain_piece(WallPiece)
+        border = {Coordinate(x, y) for x in range(0, self.width) for y in (0, self.height - 1)}
+        border.update(Coordinate(x, y) for x in (0, self.width - 1) for y in range(0, self.height))
+        for coordinate in border:
+            stack = self.__stack_at(coordinate)
+            if stack[-1:] != (wall,):
+                self.__put_terrain(coordinate, self.__stack_index(tuple(p for p in stack if p is not wall) + (wall,)))
+
+    def load_terrain(self, rows: Sequence[Sequence[Hashable]], stacks: Mapping[Hashable, Sequence[StaticPiece]]):
+        """
+        Replace the static pieces on every coordinate at once, such as when reading a map, which is much faster
+        than adding them one coordinate at a time. The chunks are built directly, so chunks with the same pieces
+        everywhere are a single number. Nothing is recorded to undo, and the terrain is left out of the Zobrist
+        hash, like the floor every grid starts with.
+        :param rows: a key for each coordinate, row by row, such as the letters of a map
+        :param stacks: the static pieces each key stands for, from the bottom up, such as those from terrain_piece
+        :return: nothing, but raises an error if the rows are not the size of the grid or a key has no pieces
+        """
+        if len(rows) != self.__height or any(len(row) != self.__width for row in rows):
+            raise ValueError("The terrain must be the same size as the grid")
+
+        indices = {key: self.__stack_index(tuple(stack)) for key, stack in stacks.items()}
+        try:
+            cells = [array("H", map(indices.__getitem__, row)) for row in rows]
+        except KeyError as e:
+            raise ValueError(f"No static pieces given for {e}")
+        counts = Counter()
+        for row in cells:
+            counts.update(row)
 
-        for y in range(0, self.height):
-            self.add_piece(WallPiece(self, self.app_container), Coordinate(0, y))
-            self.add_piece(WallPiece(self, self.app_container), Coordinate(self.width - 1, y))
+        chunks: List[Union[int, array]] = []
+        for top in range(0, self.__height, CHUNK_SIZE):
+            band = cells[top:top + CHUNK_SIZE]
+            for left in range(0, self.__width, CHUNK_SIZE):
+                chunk = array("H")
+                for row in band:
+                    part = row[left:left + CHUNK_SIZE]
+                    chunk.extend(part)
+                    # Coordinates past the edge of the grid repeat the last one, see __write_chunk
+                    chunk.extend(part[-1:] * (CHUNK_SIZE - len(part)))
+                chunk.extend(chunk[-CHUNK_SIZE:] * (CHUNK_SIZE - len(band)))
+                chunks.append(chunk[0] if chunk.count(chunk[0]) == CHUNK_CELLS else chunk)
 
+        self.__chunks = chunks
+        self.__terrain_shared = False
+        self.__owned_chunks = None
+        for piece in self.__terrain_counts:
+            self.__piece_types_to_pieces[type(piece)].discard(piece)
+        self.__terrain_counts = dict()
+        for index, count in counts.items():
+            for piece in self.__stacks[index]:
+                self.__terrain_counts[piece] = self.__terrain_counts.get(piece, 0) + count
+                self.__piece_types_to_pieces.setdefault(type(piece), set()).add(piece)
+        self.__terrain_zobrist_hash = 0
+
+    def terrain_piece(self, piece_type: type) -> StaticPiece:
+        """
+        Get the piece of a static type, such as WallPiece, shared by every coordinate of this grid it is on.
+        Static pieces never move, so one of each type is enough however big the grid is.
+        :param piece_type: a type of static piece which only needs the grid and app container to make
+        :return: the piece, which can be added to as many coordinates as needed
+        """
+        piece = self.__flyweights.get(piece_type)
+        if piece is None:
+            piece = self.__flyweights[piece_type] = piece_type(self, self.app_container)
+        return piece
 
     def __iter__(self) -> Iterable[Coordinate]:
-        return iter(self.__coordinates_to_pieces.keys())
+        for x in range(0, self.__width):
+            for y in range(0, self.__height):
+                yield Coordinate(x, y)
+
+    def iter_open_coordinates(self) -> Iterable[Coordinate]:
+        """
+        Iterate over the coordinates of the grid a piece could ever be on, chunk by chunk, which is much faster
+        than iterating over the grid itself for large maps surrounded by solid wall. Chunks which are all wall or
+        have nothing at all on them are skipped, unless a piece has been put there anyway.
+        """
+        occupied = {self.__chunk_number(coordinate) for coordinate in self.__coordinates_to_pieces}
+        for number, chunk in enumerate(self.__chunks):
+            if type(chunk) is int and number not in occupied and _is_solid(self.__stacks[chunk]):
+                continue
+            yield from self.__chunk_coordinates(number)
 
     def __getitem__(self, coordinate: Coordinate) -> List["Piece"]:
         self.__check_coordinate(coordinate)
-        return list(self.__coordinates_to_pieces[coordinate])
+        pieces = list(self.__stacks[self.__terrain_index(coordinate)])
+        pieces.extend(self.__coordinates_to_pieces.get(coordinate, ()))
+        return pieces
 
     def remove_pieces(self, coordinate: Coordinate) -> None:
         """
@@ -67,48 +263,47 @@ class Grid(UsesAppContainer):
         :param coordinate: where to remove all pieces
         :return: nothing
         """
-        for pieces in list(self.__coordinates_to_pieces[coordinate]):
+        self.__check_coordinate(coordinate)
+        for pieces in list(self.__coordinates_to_pieces.get(coordinate, [])):
             self.remove_piece(pieces)
+        self.__set_terrain(coordinate, ())
 
     def remove_piece(self, piece: "Piece") -> None:
         """
-        Remove a piece from the grid
+        Remove a piece from the grid. Static pieces are removed from every coordinate they are on.
         :param piece: the piece to remove
         :return: nothing
         """
-        coordinate = self.__pieces_to_coordinates.get(piece, None)
-        if coordinate:
-            self.__coordinates_to_pieces[coordinate].remove(piece)
-            self.__pieces_to_coordinates.pop(piece, None)
+        if isinstance(piece, StaticPiece):
+            for coordinate in self.get_terrain_coordinates(piece):
+                self.__set_terrain(coordinate, tuple(p for p in self.__stack_at(coordinate) if p is not piece))
+            return
 
-        if type(piece) in self.__piece_types_to_pieces and piece in self.__piece_types_to_pieces[type(piece)]:
-            self.__piece_types_to_pieces[type(piece)].remove(piece)
+        coordinate, index = self.__lift(piece)
 
         # If we actually did remove the piece, put it back on undo
         if coordinate:
-            self.undo_manager.register(lambda: self.add_piece(piece, coordinate), lambda: self.remove_piece(piece))
+            self.__record((piece, coordinate, index, None, -1))
 
     def add_piece(self, piece: "Piece", coordinate: Coordinate):
         """
         Add a piece to the grid, putting it on top of any existing pieces.
-        This also removes it from any existing location
+        This also removes it from any existing location, except for static pieces, which are terrain and stay on
+        every other coordinate they are on
         :param piece: the piece to add
         :param coordinate: where to add the piece
         :return: nothing
         """
         self.__check_coordinate(coordinate)
-        self.remove_piece(piece)
-
-        self.__coordinates_to_pieces[coordinate].append(piece)
-        self.__pieces_to_coordinates[piece] = coordinate
+        if isinstance(piece, StaticPiece):
+            self.__set_terrain(coordinate, tuple(p for p in self.__stack_at(coordinate) if p is not piece) + (piece,))
+            return
 
-        if not type(piece) in self.__piece_types_to_pieces:
-            self.__piece_types_to_pieces[type(piece)] = set()
-
-        self.__piece_types_to_pieces[type(piece)].add(piece)
+        self.remove_piece(piece)
+        index = self.__place(piece, coordinate)
 
         # If the piece did exist at a previous location, remove will have recorded an undo to put it back already
-        self.undo_manager.register(lambda: self.remove_piece(piece), lambda: self.add_piece(piece, coordinate))
+        self.__record((piece, None, -1, coordinate, index))
 
     def move_piece(self, piece: "Piece", coordinate: Coordinate):
         """
@@ -119,6 +314,133 @@ class Grid(UsesAppContainer):
         """
         self.add_piece(piece, coordinate)
 
+    def begin(self):
+        """
+        Start a transaction, which groups changes to the grid so they can be thrown away together, such as trying
+        to move a piece whose neighbours may refuse to move out of the way. Transactions can be nested.
+        :return: nothing
+        """
+        self.__transactions.append((len(self.__journal), self.undo_manager.position))
+
+    def commit(self):
+        """
+        Keep the changes made since the last transaction began. Once the outermost transaction commits, they
+        are registered with the undo manager.
+        :return: nothing
+        """
+        if not self.__transactions:
+            raise ValueError("No transaction to commit")
+        self.__transactions.pop()
+        if not self.__transactions:
+            for change in self.__journal:
+                self.__register(change)
+            self.__journal.clear()
+
+    def rollback(self):
+        """
+        Undo every change made since the last transaction began, including anything registered with the undo
+        manager in the meantime such as animations and sounds. Nothing rolled back can be redone.
+        :return: nothing
+        """
+        if not self.__transactions:
+            raise ValueError("No transaction to roll back")
+        length, position = self.__transactions.pop()
+        journal = self.__journal
+        while len(journal) > length:
+            piece, coordinate, index, _, _ = journal.pop()
+            self.__restore(piece, coordinate, index)
+        self.undo_manager.rollback(position)
+
+    def contains(self, coordinate: Coordinate) -> bool:
+        """
+        :param coordinate: a coordinate in (x, y)
+        :return: True if the coordinate is inside the grid
+        """
+        return 0 <= coordinate.x < self.__width and 0 <= coordinate.y < self.__height
+
+    def predict_move(self, piece: "Piece", direction: Direction) -> MovePrediction:
+        """
+        Work out what would happen if a piece, such as a player, moved one square in a direction, following the
+        same rules as Piece.move. Nothing in the grid changes, and no sounds, animations or undo history are made,
+        so this is cheap enough to call many times a frame.
+        :param piece: the piece to move
+        :param direction: the direction to move in
+        :return: whether the piece would be blocked, walk or push, where it would end up and what it would push
+        """
+        coordinate = self.get_piece_coordinate(piece)
+        moves = piece.predict_move(coordinate + direction_to_coordinate(direction))
+        if moves is None:
+            return MovePrediction(MoveOutcome.blocked, coordinate, [])
+
+        pushes = [(self.__pieces_to_coordinates[pushed], destination) for pushed, destination in moves[:-1]]
+        return MovePrediction(MoveOutcome.push if pushes else MoveOutcome.walk, moves[-1][1], pushes)
+
+    def can_move(self, piece: "Piece", direction: Direction) -> bool:
+        """
+        :param piece: the piece to move
+        :param direction: the direction to move in
+        :return: True if the piece could move one square in the direction, see predict_move
+        """
+        return piece.predict_move(self.get_piece_coordinate(piece) + direction_to_coordinate(direction)) is not None
+
+    def fork(self, app_container: AppContainer) -> "Grid":
+        """
+        Make a copy of this grid which can be changed without affecting this one, such as to look ahead at moves.
+        The chunks of terrain are shared until one of the grids first changes them, so forking a large map is cheap.
+        Everything else is copied straight away: each piece belongs to a single grid, so the fork needs its own
+        copy of every piece which can move, and with them the pieces on each coordinate and of each type. The one
+        static piece of each kind is made for the fork's own app container, so it draws the fork's terrain.
+        :param app_container: the app container for the fork, such as a HeadlessAppContainer, so that moves on the
+        fork never play sounds, start animations or touch this grid's undo history
+        :return: the fork
+        """
+        if self.__transactions:
+            raise ValueError("Cannot fork a grid part way through a transaction")
+
+        grid = Grid.__new__(Grid)
+        grid.__app_container = app_container
+        grid.__width = self.__width
+        grid.__height = self.__height
+        grid.map_analysis = self.map_analysis
+        grid.deadlock_detector = self.deadlock_detector.copy() if self.deadlock_detector else None
+        grid.__chunks_across = self.__chunks_across
+        grid.__chunks = self.__chunks
+        grid.__zobrist_hash = self.__zobrist_hash
+        grid.__terrain_zobrist_hash = self.__terrain_zobrist_hash
+        grid.__journal = []
+        grid.__transactions = []
+
+        # The chunks are now shared, so both grids have to copy them before changing them
+        self.__terrain_shared = True
+        grid.__terrain_shared = True
+        grid.__owned_chunks = None
+
+        # Static pieces belong to a single grid too, and the stacks of them keep their indices in the fork
+        grid.__flyweights = dict()
+        statics: Dict[StaticPiece, StaticPiece] = dict()
+        for piece in {piece for stack in self.__stacks for piece in stack}:
+            if self.__flyweights.get(type(piece)) is piece:
+                statics[piece] = grid.terrain_piece(type(piece))
+            else:
+                statics[piece] = piece.copy_to(grid)
+        grid.__stacks = [tuple(statics[piece] for piece in stack) for stack in self.__stacks]
+        grid.__stack_indices = {stack: index for index, stack in enumerate(grid.__stacks)}
+        grid.__terrain_counts = {statics[piece]: count for piece, count in self.__terrain_counts.items()}
+        grid.__zobrist_names = {statics.get(owner, owner): name for owner, name in self.__zobrist_names.items()}
+
+        # Pieces which move belong to a single grid, so the fork needs its own
+        grid.__coordinates_to_pieces = dict()
+        grid.__pieces_to_coordinates = dict()
+        grid.__piece_types_to_pieces = {piece_type: set() for piece_type in self.__piece_types_to_pieces}
+        for piece in grid.__terrain_counts:
+            grid.__piece_types_to_pieces[type(piece)].add(piece)
+        for coordinate, pieces in self.__coordinates_to_pieces.items():
+            copies = grid.__coordinates_to_pieces[coordinate] = [piece.copy_to(grid) for piece in pieces]
+            for copy in copies:
+                grid.__pieces_to_coordinates[copy] = coordinate
+                grid.__piece_types_to_pieces[type(copy)].add(copy)
+        return grid
+
     def get_piece_coordinate(self, piece: "Piece"):
         """
         Get the coordinates for a piece. Raises a KeyError if the piece is not in the grid.
@@ -129,7 +451,8 @@ class Grid(UsesAppContainer):
 
     def get_pieces_of_type(self, piece_type: type) -> Set["Piece"]:
         """
-        Get all pieces of a given type
+        Get all pieces of a given type. Static pieces are shared by every coordinate they are on, so there is
+        usually only one of each static type, see get_terrain_coordinates.
         :param piece_type: the type of piece to get
         :return: a set of all those piece types
         """
@@ -138,6 +461,221 @@ class Grid(UsesAppContainer):
 
         return set(self.__piece_types_to_pieces[piece_type])
 
+    def get_terrain_coordinates(self, piece: StaticPiece) -> List[Coordinate]:
+        """
+        Get every coordinate a static piece is on
+        :param piece: the static piece
+        :return: the coordinates, chunk by chunk
+        """
+        indices = {index for index, stack in enumerate(self.__stacks) if piece in stack}
+        coordinates = []
+        for number, chunk in enumerate(self.__chunks):
+            if type(chunk) is int:
+                if chunk in indices:
+                    coordinates.extend(self.__chunk_coordinates(number))
+            elif not indices.isdisjoint(chunk):
+                coordinates.extend(coordinate for coordinate in self.__chunk_coordinates(number)
+                                   if chunk[self.__chunk_cell(coordinate)] in indices)
+        return coordinates
+
+    def __lift(self, piece: "Piece") -> Tuple[Optional[Coordinate], int]:
+        """
+        Take a piece out of the grid without recording anything
+        :return: where the piece was and its index in the pieces there, or None and -1 if it was not in the grid
+        """
+        coordinate = self.__pieces_to_coordinates.pop(piece, None)
+        index = -1
+        if coordinate:
+            pieces = self.__coordinates_to_pieces[coordinate]
+            index = pieces.index(piece)
+            del pieces[index]
+            if not pieces:
+                del self.__coordinates_to_pieces[coordinate]
+            self.__zobrist_hash ^= self.__zobrist_key(piece, coordinate)
+
+        if type(piece) in self.__piece_types_to_pieces:
+            self.__piece_types_to_pieces[type(piece)].discard(piece)
+        return coordinate, index
+
+    def __place(self, piece: "Piece", coordinate: Coordinate, index: Optional[int] = None) -> int:
+        """
+        Put a piece into the grid without recording anything
+        :return: the index of the piece in the pieces on the coordinate
+        """
+        pieces = self.__coordinates_to_pieces.setdefault(coordinate, [])
+        if index is None or index >= len(pieces):
+            index = len(pieces)
+        pieces.insert(index, piece)
+        self.__pieces_to_coordinates[piece] = coordinate
+        self.__zobrist_hash ^= self.__zobrist_key(piece, coordinate)
+
+        if not type(piece) in self.__piece_types_to_pieces:
+            self.__piece_types_to_pieces[type(piece)] = set()
+
+        self.__piece_types_to_pieces[type(piece)].add(piece)
+        return index
+
+    def __chunk_number(self, coordinate: Coordinate) -> int:
+        return (coordinate.y >> CHUNK_BITS) * self.__chunks_across + (coordinate.x >> CHUNK_BITS)
+
+    @staticmethod
+    def __chunk_cell(coordinate: Coordinate) -> int:
+        return ((coordinate.y & (CHUNK_SIZE - 1)) << CHUNK_BITS) | (coordinate.x & (CHUNK_SIZE - 1))
+
+    def __chunk_coordinates(self, number: int) -> Iterable[Coordinate]:
+        """
+        Get the coordinates in a chunk which are inside the grid, row by row
+        """
+        left = (number % self.__chunks_across) << CHUNK_BITS
+        top = (number // self.__chunks_across) << CHUNK_BITS
+        for y in range(top, min(top + CHUNK_SIZE, self.__height)):
+            for x in range(left, min(left + CHUNK_SIZE, self.__width)):
+                yield Coordinate(x, y)
+
+    def __terrain_index(self, coordinate: Coordinate) -> int:
+        """
+        Get the index of the stack of static pieces on a coordinate
+        """
+        chunk = self.__chunks[self.__chunk_number(coordinate)]
+        return chunk if type(chunk) is int else chunk[self.__chunk_cell(coordinate)]
+
+    def __stack_at(self, coordinate: Coordinate) -> _Stack:
+        return self.__stacks[self.__terrain_index(coordinate)]
+
+    def __stack_index(self, stack: _Stack) -> int:
+        """
+        Get the index of a stack of static pieces, adding it if it is new
+        """
+        index = self.__stack_indices.get(stack)
+        if index is None:
+            index = self.__stack_indices[stack] = len(self.__stacks)
+            self.__stacks.append(stack)
+        return index
+
+    def __own_terrain(self):
+        """
+        Copy the terrain before changing it, if it is shared with a fork. Only the list of chunks is copied here,
+        each chunk is copied as it changes.
+        """
+        if self.__terrain_shared:
+            self.__chunks = list(self.__chunks)
+            self.__owned_chunks = set()
+            self.__terrain_shared = False
+
+    def __set_terrain(self, coordinate: Coordinate, stack: _Stack):
+        """
+        Change the static pieces on a coordinate, recording the change
+        """
+        before = self.__terrain_index(coordinate)
+        if self.__stacks[before] == stack:
+            return
+        self.__own_terrain()
+        after = self.__stack_index(stack)
+        self.__put_terrain(coordinate, after)
+        self.__record((None, coordinate, before, coordinate, after))
+
+    def __put_terrain(self, coordinate: Coordinate, index: int):
+        """
+        Change the static pieces on a coordinate to a stack already in the grid, without recording anything
+        """
+        self.__own_terrain()
+        counts = self.__terrain_counts
+        for piece in self.__stacks[self.__terrain_index(coordinate)]:
+            counts[piece] -= 1
+            if not counts[piece]:
+                del counts[piece]
+                self.__piece_types_to_pieces[type(piece)].discard(piece)
+            self.__terrain_zobrist_hash ^= self.__zobrist_key(piece, coordinate)
+        self.__write_chunk(coordinate, index)
+        for piece in self.__stacks[index]:
+            if piece not in counts:
+                counts[piece] = 0
+                self.__piece_types_to_pieces.setdefault(type(piece), set()).add(piece)
+            counts[piece] += 1
+            self.__terrain_zobrist_hash ^= self.__zobrist_key(piece, coordinate)
+
+    def __write_chunk(self, coordinate: Coordinate, index: int):
+        """
+        Set the stack index of a coordinate in its chunk, making the chunk an array if it was all one stack, and
+        back again if it is all one stack afterwards
+        """
+        number = self.__chunk_number(coordinate)
+        chunk = self.__chunks[number]
+        if type(chunk) is int:
+            if chunk == index:
+                return
+            # Coordinates of the chunk past the edge of the grid are given the same stack, so they never stop the
+            # chunk from being all one stack again
+            chunk = array("H", [chunk]) * CHUNK_CELLS
+        elif self.__owned_chunks is not None and number not in self.__owned_chunks:
+            chunk = array("H", chunk)
+        if self.__owned_chunks is not None:
+            self.__owned_chunks.add(number)
+
+        cell = self.__chunk_cell(coordinate)
+        chunk[cell] = index
+        if chunk[0] == chunk[-1] == index and chunk.count(index) == CHUNK_CELLS:
+            chunk = index
+        self.__chunks[number] = chunk
+
+    def __restore(self, piece: Optional["Piece"], coordinate: Optional[Coordinate], index: int):
+        """
+        Put a piece back where it was, or out of the grid if the coordinate is None. Without a piece, put the
+        terrain on the coordinate back instead.
+        """
+        if piece is None:
+            self.__put_terrain(coordinate, index)
+            return
+        self.__lift(piece)
+        if coordinate is not None:
+            self.__place(piece, coordinate, index)
+
+    def __record(self, change: _Change):
+        """
+        Remember a change, in the journal if a transaction is open or with the undo manager if not
+        """
+        if self.__transactions:
+            self.__journal.append(change)
+        else:
+            self.__register(change)
+
+    def __register(self, change: _Change):
+        piece, before, before_index, after, after_index = change
+        self.undo_manager.register(lambda: self.__restore(piece, before, before_index),
+                                   lambda: self.__restore(piece, after, after_index))
+
+    def __zobrist_key(self, piece: "Piece", coordinate: Coordinate) -> int:
+        """
+        Get the Zobrist key for a piece on a coordinate
+        :param piece: the piece
+        :param coordinate: the coordinate of the piece
+        :return: the key for that class of piece on that coordinate
+        """
+        owner = type(piece)
+        if isinstance(piece, StaticPiece) and self.__flyweights.get(owner) is not piece:
+            owner = piece
+        name = self.__zobrist_names.get(owner)
+        if name is None:
+            name = self.__zobrist_name(owner)
+        return zobrist_key(name, coordinate.y * self.__width + coordinate.x)
+
+    def __zobrist_name(self, owner: Hashable) -> str:
+        """
+        Choose the name Zobrist keys are made from for a class of piece, or a static piece which is not a flyweight,
+        which no other class or piece in this grid has
+        :param owner: the class or piece
+        :return: the name
+        """
+        piece_type = owner if isinstance(owner, type) else type(owner)
+        name = base = f"{piece_type.__module__}.{piece_type.__qualname__}"
+        taken = set(self.__zobrist_names.values())
+        number = 1
+        while name in taken:
+            name = f"{base}#{number}"
+            number += 1
+        self.__zobrist_names[owner] = name
+        return name
+
     def __check_coordinate(self, coordinate: Coordinate):
         """
         Check the coordinates fall within the grid
@@ -149,3 +687,168 @@ class Grid(UsesAppContainer):
             raise ValueError(f"x out of range: {x}")
         if y < 0 or y >= self.__height:
             raise ValueError(f"y out of range: {y}")
+
+
+def _is_solid(stack: _Stack) -> bool:
+    """
+    :param stack: the static pieces on a coordinate
+    :return: True if no piece could ever be there, as there is nothing there at all or there is a wall
+    """
+    return not stack or any(type(piece) == WallPiece for piece in stack)
+
+
+def test_grid_fork():
+    # Imported here, as pieces which can move import the grid
+    from headless import HeadlessAppContainer
+    from pieces.crate import CratePiece
+    from pieces.player import PlayerPiece
+
+    app_container = HeadlessAppContainer()
+    grid = Grid(app_container, 6, 5)
+    grid.add_outer_wall()
+    player = PlayerPiece(grid, app_container)
+    crate = CratePiece(grid, app_container)
+    grid.add_piece(player, Coordinate(1, 2))
+    grid.add_piece(crate, Coordinate(2, 2))
+    start = grid.zobrist_hash
+    position = app_container.undo_manager.position
+
+    fork = grid.fork(HeadlessAppContainer())
+    assert fork.zobrist_hash == start
+    fork_player = next(iter(fork.get_pieces_of_type(PlayerPiece)))
+    assert fork_player is not player and fork_player.grid is fork
+
+    # The fork pushes the crate, which leaves this grid alone
+    assert fork_player.move(Coordinate(2, 2))
+    assert [type(p) for p in fork[Coordinate(3, 2)]] == [FloorPiece, CratePiece]
+    assert grid.get_piece_coordinate(player) == Coordinate(1, 2)
+    assert grid.get_piece_coordinate(crate) == Coordinate(2, 2)
+    assert grid.zobrist_hash == start
+    assert app_container.undo_manager.position == position
+
+    # This grid moving leaves the fork alone
+    assert player.move(Coordinate(1, 1))
+    assert fork.get_piece_coordinate(fork_player) == Coordinate(2, 2)
+
+    # A fork of the fork is separate from both
+    second = fork.fork(HeadlessAppContainer())
+    second_player = next(iter(second.get_pieces_of_type(PlayerPiece)))
+    assert second_player.move(Coordinate(2, 3))
+    assert fork.get_piece_coordinate(fork_player) == Coordinate(2, 2)
+    assert second.zobrist_hash != fork.zobrist_hash
+
+    # Changing the terrain after forking only changes the grid it was changed in
+    grid.add_piece(grid.terrain_piece(WallPiece), Coordinate(4, 3))
+    assert [type(p) for p in grid[Coordinate(4, 3)]] == [FloorPiece, WallPiece]
+    assert [type(p) for p in fork[Coordinate(4, 3)]] == [FloorPiece]
+    assert [type(p) for p in second[Coordinate(4, 3)]] == [FloorPiece]
+    fork.remove_pieces(Coordinate(0, 0))
+    assert fork[Coordinate(0, 0)] == []
+    assert [type(p) for p in grid[Coordinate(0, 0)]] == [FloorPiece, WallPiece]
+    assert [type(p) for p in second[Coordinate(0, 0)]] == [FloorPiece, WallPiece]
+
+
+def test_grid_transactions():
+    # Imported here, as pieces which can move import the grid
+    from headless import HeadlessAppContainer
+    from pieces.crate import CratePiece
+    from pieces.player import PlayerPiece
+
+    app_container = HeadlessAppContainer()
+    undo_manager = app_container.undo_manager
+    grid = Grid(app_container, 6, 5)
+    grid.add_outer_wall()
+    player = PlayerPiece(grid, app_container)
+    crate = CratePiece(grid, app_container)
+    grid.add_piece(player, Coordinate(1, 2))
+    grid.add_piece(crate, Coordinate(2, 2))
+    start = grid.zobrist_hash
+    position = undo_manager.position
+
+    # Rolling back the inner transaction only undoes the changes made since it began
+    grid.begin()
+    grid.move_piece(crate, Coordinate(3, 2))
+    moved = grid.zobrist_hash
+    grid.begin()
+    grid.move_piece(player, Coordinate(2, 2))
+    grid.add_piece(grid.terrain_piece(WallPiece), Coordinate(2, 1))
+    grid.rollback()
+    assert grid.get_piece_coordinate(player) == Coordinate(1, 2)
+    assert grid.get_piece_coordinate(crate) == Coordinate(3, 2)
+    assert [type(p) for p in grid[Coordinate(2, 1)]] == [FloorPiece]
+    assert grid.zobrist_hash == moved
+    assert undo_manager.position == position
+
+    grid.rollback()
+    assert grid.get_piece_coordinate(crate) == Coordinate(2, 2)
+    assert grid.zobrist_hash == start
+    assert undo_manager.position == position
+
+    # Anything registered with the undo manager during a transaction, such as an animation, is undone too
+    undone = []
+    grid.begin()
+    undo_manager.register(lambda: undone.append(True), lambda: None)
+    grid.rollback()
+    assert undone == [True]
+    assert undo_manager.position == position
+
+    # Changes are only registered with the undo manager once the outermost transaction commits
+    grid.begin()
+    grid.begin()
+    grid.move_piece(crate, Coordinate(3, 2))
+    grid.commit()
+    assert undo_manager.position == position
+    grid.commit()
+    assert undo_manager.position > position
+    undo_manager.undo_to_index(position)
+    assert grid.get_piece_coordinate(crate) == Coordinate(2, 2)
+    assert grid.zobrist_hash == start
+
+    try:
+        grid.rollback()
+        assert False
+    except ValueError:
+        pass
+
+
+def test_grid_failed_push():
+    # Imported here, as pieces which can move import the grid
+    from headless import HeadlessAppContainer
+    from pieces.crate import CratePiece
+    from pieces.player import PlayerPiece
+
+    app_container = HeadlessAppContainer()
+    undo_manager = app_container.undo_manager
+    grid = Grid(app_container, 7, 5)
+    grid.add_outer_wall()
+    grid.add_piece(grid.terrain_piece(WallPiece), Coordinate(5, 2))
+    player = PlayerPiece(grid, app_container)
+    crates = [CratePiece(grid, app_container), CratePiece(grid, app_container)]
+    grid.add_piece(player, Coordinate(1, 2))
+    grid.add_piece(crates[0], Coordinate(3, 2))
+    grid.add_piece(crates[1], Coordinate(4, 2))
+
+    # Walk up to the crates first, so the player already faces them
+    assert player.move(Coordinate(2, 2))
+    before = grid.zobrist_hash
+    position = undo_manager.position
+
+    # The crate at the front of the line is against the wall, so neither crate can move
+    assert not player.move(Coordinate(3, 2))
+    assert grid.get_piece_coordinate(player) == Coordinate(2, 2)
+    assert [grid.get_piece_coordinate(crate) for crate in crates] == [Coordinate(3, 2), Coordinate(4, 2)]
+    assert grid.zobrist_hash == before
+    assert undo_manager.position == position
+
+    # With room to move, the crates are pushed out of the way before another player on the same coordinate
+    # refuses to move, so they have to be put back
+    grid.remove_piece(grid.terrain_piece(WallPiece))
+    grid.add_outer_wall()
+    grid.add_piece(PlayerPiece(grid, app_container), Coordinate(3, 2))
+    before = grid.zobrist_hash
+    position = undo_manager.position
+    assert not player.move(Coordinate(3, 2))
+    assert grid.get_piece_coordinate(player) == Coordinate(2, 2)
+    assert [grid.get_piece_coordinate(crate) for crate in crates] == [Coordinate(3, 2), Coordinate(4, 2)]
+    assert grid.zobrist_hash == before
+    assert undo_manager.position == position
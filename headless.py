@@ -0,0 +1,251 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from pygame.rect import Rect
+
+from animations.animation import Animation
+from animator import Animator
+from app_container import AppContainer
+from constants.direction import Direction
+from music_player import MusicPlayer
+from navigator import Navigator
+from opengl_support.drawable import Drawable
+from undo import UndoManager
+
+# The number of images in each of the player's animations, the same as the real resources
+PLAYER_ANIMATION_IMAGES = 3
+
+# The size of the pretend display
+DEFAULT_DISPLAY_SIZE = 640, 704
+
+
+class NullDrawable(Drawable):
+    """
+    Stands in for a tile or font, drawing nothing
+    """
+    def draw(self, rect: Rect):
+        pass
+
+    def draw_text(self, text: str, font_colour, rect: Rect):
+        pass
+
+    def get_surface(self, text: str, font_colour) -> "NullDisplay":
+        return NullDisplay(0, 0)
+
+    def reload(self):
+        pass
+
+
+class NullSound:
+    """
+    Stands in for a sound, playing nothing
+    """
+    def __init__(self):
+        self.__volume = 1.0
+
+    def play(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_volume(self) -> float:
+        return self.__volume
+
+    def set_volume(self, volume: float):
+        self.__volume = volume
+
+
+class NullDisplay:
+    """
+    Stands in for the display surface, which only has a size
+    """
+    def __init__(self, width: int, height: int):
+        self.__size = width, height
+
+    def get_width(self) -> int:
+        return self.__size[0]
+
+    def get_height(self) -> int:
+        return self.__size[1]
+
+    def get_size(self) -> Tuple[int, int]:
+        return self.__size
+
+
+class HeadlessResources:
+    """
+    The same resources as Resources, but without loading any images, sounds or fonts, so it needs no display,
+    audio device or OpenGL context
+    """
+    def __init__(self, display_size: Tuple[int, int] = DEFAULT_DISPLAY_SIZE):
+        self.__drawable = NullDrawable()
+        self.__sound = NullSound()
+        self.__player: Dict[Direction, List[Drawable]] = {
+            direction: [self.__drawable] * PLAYER_ANIMATION_IMAGES for direction in Direction
+        }
+        self.display = NullDisplay(*display_size)
+
+    def reload(self):
+        pass
+
+    @property
+    def tiles1(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def tiles2(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def tiles3(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def title_font(self) -> NullDrawable:
+        return self.__drawable
+
+    @property
+    def menu_font(self) -> NullDrawable:
+        return self.__drawable
+
+    @property
+    def you_win_font(self) -> NullDrawable:
+        return self.__drawable
+
+    @property
+    def crate_sound(self) -> NullSound:
+        return self.__sound
+
+    @property
+    def menu_background(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def crate_success_sound(self) -> NullSound:
+        return self.__sound
+
+    @property
+    def coin_sound(self) -> NullSound:
+        return self.__sound
+
+    @property
+    def win_sound(self) -> NullSound:
+        return self.__sound
+
+    @property
+    def crate(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def floor(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def goal(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def wall(self) -> Drawable:
+        return self.__drawable
+
+    @property
+    def player(self) -> Dict[Direction, List[Drawable]]:
+        return self.__player
+
+
+class SilentMusicPlayer(MusicPlayer):
+    """
+    A music player which plays nothing, and so registers nothing to cancel with the undo manager
+    """
+    def __init__(self):
+        pass
+
+    def play_crate_slide(self):
+        pass
+
+    def play_crate_moved_onto_goal(self):
+        pass
+
+    def play_you_win(self):
+        pass
+
+    def reset(self):
+        pass
+
+
+class InstantAnimator(Animator):
+    """
+    An animator which finishes every animation as soon as it is added, so nothing is ever animating
+    """
+    def add_animation(self, animation: Animation):
+        animation.start()
+        animation.cancel()
+
+
+class HeadlessAppContainer(AppContainer, Navigator):
+    """
+    An app container for running the game without a window, such as in tests, bots or worker processes.
+    Nothing is drawn or played and animations finish instantly, but pieces, grids and view models behave exactly
+    as they do in the game. Views asked for are remembered instead of being shown.
+    """
+    def __init__(self, display_size: Tuple[int, int] = DEFAULT_DISPLAY_SIZE):
+        """
+        :param display_size: the size views are told the display is
+        """
+        self.__undo_manager = UndoManager()
+        self.__animator = InstantAnimator(self.__undo_manager)
+        self.__music_player = SilentMusicPlayer()
+        self.__resources = HeadlessResources(display_size)
+        self.__keys_pressed: Dict[int, bool] = defaultdict(lambda: False)
+        self.__view: Optional[Tuple[type, any]] = None
+        self.__quit = False
+
+    @property
+    def undo_manager(self) -> UndoManager:
+        return self.__undo_manager
+
+    @property
+    def animator(self) -> Animator:
+        return self.__animator
+
+    @property
+    def music_player(self) -> MusicPlayer:
+        return self.__music_player
+
+    @property
+    def resources(self) -> HeadlessResources:
+        return self.__resources
+
+    @property
+    def navigator(self) -> Navigator:
+        return self
+
+    @property
+    def keys_pressed(self) -> Dict[int, bool]:
+        return self.__keys_pressed
+
+    @property
+    def view(self) -> Optional[Tuple[type, any]]:
+        """ The type and parameters of the last view asked for, or None if no view has been asked for """
+        return self.__view
+
+    @property
+    def quit_requested(self) -> bool:
+        return self.__quit
+
+    def go_to_view(self, view: type, parameters: any):
+        self.__view = (view, parameters)
+
+    def quit(self):
+        self.__quit = True
+
+
+class HeadlessView:
+    """
+    Stands in for a view, so view models can be created without one, e.g. MapViewModel(HeadlessView(container,
+    MapViewParameters(map_index=0)))
+    """
+    def __init__(self, app_container: AppContainer, parameters: any):
+        self.app_container = app_container
+        self.parameters = parameters
@@ -0,0 +1,48 @@
+import os
+from typing import Iterable, List
+
+# Lines starting with this are comments, such as the name of the next level
+COMMENT = ";"
+
+# Packs with these extensions are in the standard XSB format instead, see maps.xsb
+XSB_EXTENSIONS = (".xsb", ".sok")
+
+
+def parse_level_pack(lines: Iterable[str]) -> List[List[List[str]]]:
+    """
+    Read a pack of levels written with the same letters as the maps in maps.py, one row per line, e.g.
+        WWWWW
+        WPBGW
+        WWWWW
+    Levels are separated by blank lines, and comment lines are ignored.
+    :param lines: the lines of the pack
+    :return: the map definitions, in the same format as read by read_map
+    """
+    levels = []
+    rows: List[List[str]] = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith(COMMENT):
+            continue
+        if line:
+            rows.append(list(line))
+        elif rows:
+            levels.append(rows)
+            rows = []
+    if rows:
+        levels.append(rows)
+    return levels
+
+
+def read_level_pack(path: str) -> List[List[List[str]]]:
+    """
+    Read a pack of levels from a file. See parse_level_pack for the format, or maps.xsb for files with an
+    XSB_EXTENSIONS extension.
+    :param path: the path to the file
+    :return: the map definitions, in the same format as read by read_map
+    """
+    if os.path.splitext(path)[1].lower() in XSB_EXTENSIONS:
+        from maps.xsb import read_xsb_pack
+        return read_xsb_pack(path)
+    with open(path) as file:
+        return parse_level_pack(file)
@@ -1,9 +1,11 @@
+from itertools import chain
 from typing import List
 
 from app_container import AppContainer
 from coordinate import Coordinate
 from grid import Grid
 from pieces.crate import CratePiece
+from pieces.floor import FloorPiece
 from pieces.goal import GoalPiece
 from pieces.player import PlayerPiece
 from pieces.wall import WallPiece
@@ -23,19 +25,24 @@ def read_map(app_container: AppContainer, custom_map: List[List[str]]) -> Grid:
             raise ValueError("Maps must be rectangles")
 
     grid = Grid(app_container, width, height)
+    floor = grid.terrain_piece(FloorPiece)
+    wall = grid.terrain_piece(WallPiece)
+    goal = grid.terrain_piece(GoalPiece)
+    stacks = dict()
+    for string in set(chain.from_iterable(custom_map)):
+        # Goals go underneath any crate or player starting on them
+        stacks[string] = (floor,) + ((wall,) if string == 'W' else ()) + ((goal,) if 'G' in string else ())
+    grid.load_terrain(custom_map, stacks)
+
+    pieces = {string for string in stacks if 'P' in string or 'B' in string}
     for y, row in enumerate(custom_map):
         for x, string in enumerate(row):
-            if string == 'W':
-                grid.add_piece(
-                    WallPiece(grid, app_container), Coordinate(x, y))
-            if string == 'P':
+            if string not in pieces:
+                continue
+            if 'P' in string:
                 grid.add_piece(
                     PlayerPiece(grid, app_container), Coordinate(x, y))
-            if string == 'B':
+            if 'B' in string:
                 grid.add_piece(
                     CratePiece(grid, app_container), Coordinate(x, y))
-            if string == 'G':
-                grid.add_piece(
-                    GoalPiece(grid, app_container), Coordinate(x, y))
-
     return grid
@@ -0,0 +1,211 @@
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from solver.level import WALL, FLOOR, PLAYER, CRATE, GOAL, CRATE_ON_GOAL, PLAYER_ON_GOAL
+
+# The letters of the XSB format, and the strings they become in a map definition
+XSB_LETTERS = {
+    "#": WALL,
+    " ": FLOOR,
+    "-": FLOOR,
+    "_": FLOOR,
+    "@": PLAYER,
+    "+": PLAYER_ON_GOAL,
+    "$": CRATE,
+    "*": CRATE_ON_GOAL,
+    ".": GOAL,
+}
+
+# The index of a pack is kept next to it, in a file with this suffix added to the pack's name
+INDEX_SUFFIX = ".idx"
+
+# The index starts with these bytes, the format version, the size and modification time of the pack it was built
+# from, and the number of levels, followed by the start and end byte offset of every level
+INDEX_MAGIC = b"SKXI"
+INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sHQQQ")
+_OFFSET = struct.Struct("<QQ")
+
+
+def is_level_row(line: str) -> bool:
+    """
+    :param line: a line of a pack, without its line ending
+    :return: True if the line is a row of a level, rather than a blank line, title or comment
+    """
+    return "#" in line and all(letter in XSB_LETTERS for letter in line)
+
+
+def parse_xsb_level(rows: List[str]) -> List[List[str]]:
+    """
+    Turn the rows of a level in XSB format into a map definition. Rows are padded out to a rectangle, and any floor
+    outside the walls is filled in with walls.
+    :param rows: the rows of the level
+    :return: the map definition, in the same format as read by read_map
+    :raises ValueError: if the rows are not a level
+    """
+    if not rows:
+        raise ValueError("No empty maps allowed!")
+    width = max(len(row) for row in rows)
+    definition = []
+    for row in rows:
+        try:
+            definition.append([XSB_LETTERS[letter] for letter in row.ljust(width)])
+        except KeyError as e:
+            raise ValueError(f"Not an XSB letter: {e.args[0]!r}")
+
+    # Floor that can be reached from the edges without crossing a wall is outside the level
+    height = len(definition)
+    outside = [(x, y) for y in range(height) for x in range(width)
+               if (x in (0, width - 1) or y in (0, height - 1)) and definition[y][x] != WALL]
+    for x, y in outside:
+        definition[y][x] = WALL
+    while outside:
+        x, y = outside.pop()
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < width and 0 <= ny < height and definition[ny][nx] != WALL:
+                definition[ny][nx] = WALL
+                outside.append((nx, ny))
+    return definition
+
+
+def iter_xsb_levels(lines: Iterable[str]) -> Iterator[List[List[str]]]:
+    """
+    Read the levels of a pack in XSB format one at a time, without keeping more than one level in memory.
+    Anything that is not a row of a level, such as a title or comment, ends the current level.
+    :param lines: the lines of the pack
+    :return: the map definitions, in the same format as read by read_map
+    """
+    rows: List[str] = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if is_level_row(line):
+            rows.append(line)
+        elif rows:
+            yield parse_xsb_level(rows)
+            rows = []
+    if rows:
+        yield parse_xsb_level(rows)
+
+
+def build_xsb_index(path: str) -> List[Tuple[int, int]]:
+    """
+    Find where every level is in a pack, reading it one line at a time
+    :param path: the path to the pack
+    :return: the start and end byte offsets of every level
+    """
+    offsets = []
+    start: Optional[int] = None
+    position = 0
+    with open(path, "rb") as file:
+        for line in file:
+            end = position
+            position += len(line)
+            if is_level_row(line.rstrip(b"\r\n").decode("latin-1")):
+                if start is None:
+                    start = end
+            elif start is not None:
+                offsets.append((start, end))
+                start = None
+    if start is not None:
+        offsets.append((start, position))
+    return offsets
+
+
+class XsbPack:
+    """
+    A pack of levels in XSB format, which can be opened at any level without reading the levels before it.
+    The first time a pack is opened, the byte offset of every level is written to an index next to it, which is
+    rebuilt whenever the pack changes. Both files are memory mapped, so opening a level is a lookup in the index
+    and a read of just that level's bytes.
+    """
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        """
+        :param path: the path to the pack
+        :param index_path: where to keep the index, or None to put it next to the pack
+        """
+        self.__path = path
+        self.__index_path = index_path or path + INDEX_SUFFIX
+        stat = os.stat(path)
+        self.__index = self.__open_index(stat)
+        if self.__index is None:
+            offsets = build_xsb_index(path)
+            try:
+                self.__write_index(stat, offsets)
+                self.__index = self.__open_index(stat)
+            except OSError:
+                # The index cannot be kept, such as for a pack in a read only directory, so just use it this time
+                pass
+            if self.__index is None:
+                self.__index = _INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns,
+                                                  len(offsets)) + b"".join(_OFFSET.pack(*o) for o in offsets)
+        self.__count = _INDEX_HEADER.unpack_from(self.__index, 0)[4]
+
+        # An empty file cannot be memory mapped, but it has no levels to read either
+        self.__map = None
+        if stat.st_size:
+            with open(path, "rb") as file:
+                self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __getitem__(self, index: int) -> List[List[str]]:
+        """
+        :param index: the index of the level in the pack, where negative indices count from the end
+        :return: the map definition, in the same format as read by read_map
+        """
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError("level index out of range")
+        start, end = _OFFSET.unpack_from(self.__index, _INDEX_HEADER.size + index * _OFFSET.size)
+        return parse_xsb_level(self.__map[start:end].decode("latin-1").splitlines())
+
+    def __iter__(self) -> Iterator[List[List[str]]]:
+        for index in range(self.__count):
+            yield self[index]
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def close(self):
+        for resource in (self.__map, self.__index):
+            if isinstance(resource, mmap.mmap):
+                resource.close()
+
+    def __open_index(self, stat: os.stat_result):
+        """
+        Memory map the index if it exists and was built from the pack as it is now
+        """
+        try:
+            with open(self.__index_path, "rb") as file:
+                index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(index) >= _INDEX_HEADER.size:
+            magic, version, size, modified, count = _INDEX_HEADER.unpack_from(index, 0)
+            if (magic, version, size, modified) == (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns) \
+                    and len(index) == _INDEX_HEADER.size + count * _OFFSET.size:
+                return index
+        index.close()
+        return None
+
+    def __write_index(self, stat: os.stat_result, offsets: List[Tuple[int, int]]):
+        with open(self.__index_path, "wb") as file:
+            file.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(offsets)))
+            for pair in offsets:
+                file.write(_OFFSET.pack(*pair))
+
+
+def read_xsb_pack(path: str) -> List[List[List[str]]]:
+    """
+    Read every level of a pack in XSB format. See iter_xsb_levels, and XsbPack for opening single levels of
+    large packs.
+    :param path: the path to the pack
+    :return: the map definitions, in the same format as read by read_map
+    """
+    with open(path, encoding="latin-1") as file:
+        return list(iter_xsb_levels(file))
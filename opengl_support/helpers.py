@@ -4,7 +4,7 @@ from OpenGL.GL import GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T, glLoa
     glEnable, GL_BLEND, \
     GL_COLOR_MATERIAL, GL_MULTISAMPLE, GL_SAMPLE_ALPHA_TO_COVERAGE, GL_SRC_ALPHA, glBlendFunc, GL_ONE_MINUS_SRC_ALPHA, \
     glBlendFuncSeparate, glClearColor, GL_ONE, GL_PROJECTION, glMatrixMode, glOrtho, GL_MODELVIEW, GL_COLOR_BUFFER_BIT, \
-    GL_DEPTH_BUFFER_BIT, glClear
+    GL_DEPTH_BUFFER_BIT, glClear, glColor4f
 from pygame.surface import SurfaceType
 # noinspection PyBroadException
 try:
@@ -67,6 +67,15 @@ def set_background_and_clear(colour: pygame.Color):
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
 
+def set_draw_opacity(opacity: float):
+    """
+    Set the opacity of everything drawn from now on, by tinting the textures.
+    :param opacity: the opacity, from 0 (invisible) to 1 (solid)
+    :return: nothing
+    """
+    glColor4f(1.0, 1.0, 1.0, opacity)
+
+
 # noinspection PyBroadException
 def try_enable_vsync() -> bool:
     """
@@ -1,4 +1,4 @@
-from typing import Tuple, Optional, Callable
+from typing import Tuple, Optional, Callable, List
 
 from constants.direction import coordinate_change_to_direction, try_get_move_from_key, Direction
 from animations.linear_animation import LinearAnimation
@@ -35,11 +35,28 @@ class CratePiece(Piece):
 
         return self.move(new_coordinate)
 
+    def copy_to(self, grid: "Grid") -> "CratePiece":
+        piece = super().copy_to(grid)
+        piece.animation = None
+        piece.animation_direction = None
+        return piece
+
+    def predict_reaction(self, piece: "Piece") -> Optional[List[Tuple["Piece", Coordinate]]]:
+        piece_coordinate = self.grid.get_piece_coordinate(piece)
+        return self.predict_move(self.coordinate + (self.coordinate - piece_coordinate))
+
     def move(self, coordinate: Coordinate):
         old_coordinate = self.coordinate
         if not super().move(coordinate):
             return False
 
+        deadlock_detector = self.grid.deadlock_detector
+        if deadlock_detector:
+            deadlock = deadlock_detector.deadlock
+            deadlock_detector.crate_moved(old_coordinate, coordinate)
+            self.undo_manager.register(lambda: deadlock_detector.restore(old_coordinate, coordinate, deadlock),
+                                       lambda: deadlock_detector.crate_moved(old_coordinate, coordinate))
+
         direction_change = coordinate_change_to_direction(self.coordinate - old_coordinate)
         if self.animation and self.animation_direction == direction_change:
             self.animation.extend(1, WALK_SPEED)
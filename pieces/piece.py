@@ -1,6 +1,6 @@
-import uuid
+import copy
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from pygame.rect import Rect
 
@@ -20,6 +20,17 @@ class Piece(UsesAppContainer, ABC):
     def app_container(self):
         return self.__app_container
 
+    def copy_to(self, grid: "Grid") -> "Piece":
+        """
+        Make a copy of this piece for another grid, such as a fork of this piece's grid
+        :param grid: the grid the copy belongs to, whose app container it uses
+        :return: the copy, which is not added to the grid
+        """
+        piece = copy.copy(self)
+        piece.grid = grid
+        piece.__app_container = grid.app_container
+        return piece
+
     @property
     def coordinate(self) -> Coordinate:
         return self.grid.get_piece_coordinate(self)
@@ -36,9 +47,12 @@ class Piece(UsesAppContainer, ABC):
     def draw(self, grid_offset: Tuple[int, int], square_size: int):
         pass
 
-    def get_rect_at_coordinate(self, grid_offset: Tuple[int, int], square_size: int):
-        return Rect(grid_offset[0] + (self.coordinate.x * square_size),
-                    grid_offset[1] + (self.coordinate.y * square_size),
+    def get_rect_at_coordinate(self, grid_offset: Tuple[int, int], square_size: int,
+                               coordinate: Optional[Coordinate] = None):
+        if coordinate is None:
+            coordinate = self.coordinate
+        return Rect(grid_offset[0] + (coordinate.x * square_size),
+                    grid_offset[1] + (coordinate.y * square_size),
                     square_size, square_size)
 
     def move(self, coordinate: Coordinate) -> bool:
@@ -51,17 +65,46 @@ class Piece(UsesAppContainer, ABC):
         if coordinate == self.coordinate:
             return False
 
-        label = str(uuid.uuid4())
-        self.undo_manager.save_position(label)
+        # Pieces in the way may move out of it before another one refuses, so try it out in a transaction
+        self.grid.begin()
         for piece in self.grid[coordinate]:
             if not piece.react_to_piece_move(self):
-                self.undo_manager.undo(label)
+                self.grid.rollback()
                 return False
 
         self.grid.move_piece(self, coordinate)
-        self.undo_manager.delete_label(label)
+        self.grid.commit()
         return True
 
+    def predict_move(self, coordinate: Coordinate) -> Optional[List[Tuple["Piece", Coordinate]]]:
+        """
+        Work out what would happen if this piece moved onto the given coordinate, without changing anything.
+
+        :param coordinate: the coordinate to move onto
+        :return: every piece that would move and where to in the order they would move, ending with this piece,
+        or None if this piece would be unable to move
+        """
+        if coordinate == self.coordinate or not self.grid.contains(coordinate):
+            return None
+
+        moves = []
+        for piece in self.grid[coordinate]:
+            reaction = piece.predict_reaction(self)
+            if reaction is None:
+                return None
+            moves.extend(reaction)
+        moves.append((self, coordinate))
+        return moves
+
+    @abstractmethod
+    def predict_reaction(self, piece: "Piece") -> Optional[List[Tuple["Piece", Coordinate]]]:
+        """
+        Work out what react_to_piece_move would do, without changing anything.
+        :param piece: the piece moving onto this one.
+        :return: the pieces which would move out of the way and where to, or None if the move would fail.
+        """
+        pass
+
     @abstractmethod
     def react_to_piece_move(self, piece: "Piece") -> bool:
         """
@@ -1,4 +1,4 @@
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, List
 
 from animations.animation import Animation
 from animations.linear_animation import LinearAnimation
@@ -36,6 +36,14 @@ class PlayerPiece(Piece):
         """
         return False
 
+    def predict_reaction(self, piece: "Piece") -> Optional[List[Tuple["Piece", Coordinate]]]:
+        return None
+
+    def copy_to(self, grid: "Grid") -> "PlayerPiece":
+        piece = super().copy_to(grid)
+        piece.animation = None
+        return piece
+
     def move(self, coordinate: Coordinate):
         def set_direction(direction: Direction):
             self.direction = direction
@@ -1,7 +1,8 @@
 from typing import TYPE_CHECKING
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from app_container import AppContainer
+from coordinate import Coordinate
 from opengl_support.drawable import Drawable
 from pieces.piece import Piece
 
@@ -10,6 +11,10 @@ if TYPE_CHECKING:
 
 
 class StaticPiece(Piece):
+    """
+    A piece which never moves, such as a wall. Static pieces are terrain: one piece is shared by every coordinate
+    it is on, so it has no coordinate of its own, see Grid.terrain_piece.
+    """
     def __init__(self, grid: "Grid", app_container: AppContainer, drawable: Drawable, allow_player_move: bool = False):
         super().__init__(grid, app_container)
         self.drawable = drawable
@@ -18,5 +23,9 @@ class StaticPiece(Piece):
     def react_to_piece_move(self, piece: "Piece") -> bool:
         return self.allow_player_move
 
+    def predict_reaction(self, piece: "Piece") -> Optional[List[Tuple["Piece", Coordinate]]]:
+        return [] if self.allow_player_move else None
+
     def draw(self, grid_offset: Tuple[int, int], square_size: int):
-        self.drawable.draw(self.get_rect_at_coordinate(grid_offset, square_size))
+        for coordinate in self.grid.get_terrain_coordinates(self):
+            self.drawable.draw(self.get_rect_at_coordinate(grid_offset, square_size, coordinate))
@@ -0,0 +1,187 @@
+from functools import lru_cache
+from typing import List, Dict, FrozenSet, NamedTuple, Tuple
+
+from solver.level import Level, WALL, GOAL, FLOOR
+from solver.symmetry import SymmetryGroup
+
+# Used for squares a crate can never be pushed from onto a goal
+UNREACHABLE = 1 << 30
+
+# Used in the room lookup for cells which are walls or tunnels
+NO_ROOM = -1
+
+
+class GoalRoom(NamedTuple):
+    """
+    A room with goals in that can only be entered through one tunnel cell, so crates pushed in can be
+    taken straight to a goal
+    """
+    cells: FrozenSet[int]
+    entrance: int
+    goals: FrozenSet[int]
+
+
+class MapAnalysis:
+    """
+    Facts about a level which only depend on its walls and goals, so can be computed once and shared by
+    solvers, hints and deadlock checks. Use get_map_analysis to get a cached copy for a map.
+    """
+    def __init__(self, level: Level):
+        self.__level = level
+        self.__goal_distances = self.__calculate_goal_distances()
+
+        if self.__goal_distances:
+            self.__distances = [min(column) for column in zip(*self.__goal_distances.values())]
+        else:
+            self.__distances = [UNREACHABLE] * level.size
+        self.__dead_squares = frozenset(c for c in level.floor if self.__distances[c] == UNREACHABLE)
+
+        self.__horizontal_tunnels, self.__vertical_tunnels = self.__find_tunnels()
+        self.__rooms, self.__room_of = self.__find_rooms()
+        self.__goal_rooms = self.__find_goal_rooms()
+        self.__symmetry_group = SymmetryGroup(level)
+
+    @property
+    def level(self) -> Level:
+        return self.__level
+
+    @property
+    def goal_distances(self) -> Dict[int, List[int]]:
+        """
+        For every goal, the fewest pushes needed to move a crate from each cell onto that goal ignoring all
+        other crates, or UNREACHABLE if it can never get there.
+        """
+        return self.__goal_distances
+
+    @property
+    def distances(self) -> List[int]:
+        """ For every cell, the fewest pushes needed to move a crate from that cell onto its nearest goal """
+        return self.__distances
+
+    @property
+    def dead_squares(self) -> FrozenSet[int]:
+        """ Floor cells a crate can never be pushed from onto any goal """
+        return self.__dead_squares
+
+    @property
+    def horizontal_tunnels(self) -> FrozenSet[int]:
+        """ Floor cells with walls above and below, so a crate or player can only pass through left or right """
+        return self.__horizontal_tunnels
+
+    @property
+    def vertical_tunnels(self) -> FrozenSet[int]:
+        """ Floor cells with walls to the left and right, so a crate or player can only pass up or down """
+        return self.__vertical_tunnels
+
+    @property
+    def tunnels(self) -> FrozenSet[int]:
+        return self.__horizontal_tunnels | self.__vertical_tunnels
+
+    @property
+    def rooms(self) -> List[FrozenSet[int]]:
+        """ The floor split into rooms, which are connected to each other only through tunnels """
+        return self.__rooms
+
+    @property
+    def room_of(self) -> List[int]:
+        """ For every cell, the index of the room it is in, or NO_ROOM for walls and tunnels """
+        return self.__room_of
+
+    @property
+    def goal_rooms(self) -> List[GoalRoom]:
+        """ The rooms with goals in which have a single entrance """
+        return self.__goal_rooms
+
+    @property
+    def symmetry_group(self) -> SymmetryGroup:
+        """ The rotations and reflections of the level which leave its walls and goals unchanged """
+        return self.__symmetry_group
+
+    def is_dead(self, cell: int) -> bool:
+        """
+        :param cell: the cell to check
+        :return: True if a crate on this cell can never reach a goal
+        """
+        return self.__distances[cell] == UNREACHABLE
+
+    def __calculate_goal_distances(self) -> Dict[int, List[int]]:
+        """
+        Work backwards from each goal, "pulling" a crate away from it to find the push distance to every cell
+        """
+        level = self.__level
+        walls = level.walls
+        offsets = list(level.offsets.values())
+        goal_distances = dict()
+        for goal in level.goals:
+            distances = [UNREACHABLE] * level.size
+            distances[goal] = 0
+            queue = [goal]
+            for cell in queue:
+                distance = distances[cell] + 1
+                for offset in offsets:
+                    # A crate on "previous" can be pushed onto "cell" if something fits behind it to push it
+                    previous = cell - offset
+                    if walls[previous] or walls[previous - offset] or distances[previous] != UNREACHABLE:
+                        continue
+                    distances[previous] = distance
+                    queue.append(previous)
+            goal_distances[goal] = distances
+        return goal_distances
+
+    def __find_tunnels(self) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        level = self.__level
+        walls = level.walls
+        stride = level.stride
+        horizontal = frozenset(c for c in level.floor if walls[c - stride] and walls[c + stride])
+        vertical = frozenset(c for c in level.floor if walls[c - 1] and walls[c + 1])
+        return horizontal, vertical
+
+    def __find_rooms(self) -> Tuple[List[FrozenSet[int]], List[int]]:
+        level = self.__level
+        offsets = list(level.offsets.values())
+        tunnels = self.tunnels
+        room_of = [NO_ROOM] * level.size
+        rooms = []
+        for start in level.floor:
+            if start in tunnels or room_of[start] != NO_ROOM:
+                continue
+            index = len(rooms)
+            room_of[start] = index
+            room = [start]
+            for cell in room:
+                for offset in offsets:
+                    neighbour = cell + offset
+                    if not level.walls[neighbour] and neighbour not in tunnels and room_of[neighbour] == NO_ROOM:
+                        room_of[neighbour] = index
+                        room.append(neighbour)
+            rooms.append(frozenset(room))
+        return rooms, room_of
+
+    def __find_goal_rooms(self) -> List[GoalRoom]:
+        level = self.__level
+        offsets = list(level.offsets.values())
+        goal_rooms = []
+        for room in self.__rooms:
+            goals = room & level.goals
+            if not goals:
+                continue
+            entrances = {cell + offset for cell in room for offset in offsets
+                         if not level.walls[cell + offset] and cell + offset not in room}
+            if len(entrances) == 1:
+                goal_rooms.append(GoalRoom(room, entrances.pop(), goals))
+        return goal_rooms
+
+
+def get_map_analysis(custom_map: List[List[str]]) -> MapAnalysis:
+    """
+    Get the analysis of a map, which is only calculated the first time it is asked for
+    :param custom_map: the map definition, in the same format as read by read_map
+    :return: the analysis
+    """
+    # Only the walls and goals matter, so maps which just move the crates or players share an analysis
+    return _analyse(tuple(tuple(s if s == WALL else GOAL if GOAL in s else FLOOR for s in row) for row in custom_map))
+
+
+@lru_cache(maxsize=256)
+def _analyse(custom_map: Tuple[Tuple[str, ...], ...]) -> MapAnalysis:
+    return MapAnalysis(Level([list(row) for row in custom_map]))
@@ -0,0 +1,63 @@
+from random import Random
+from timeit import timeit
+from typing import List
+
+from maps.maps import MAPS
+from solver.analysis import MapAnalysis, UNREACHABLE, get_map_analysis
+from solver.heuristics import CrateMatching, minimum_matching_cost
+from solver.level import Level
+
+# Positions sampled from each map, and times each heuristic is evaluated on each of them
+SAMPLES = 20
+REPEATS = 200
+
+
+def sample_positions(level: Level, samples: int, random: Random) -> List[List[int]]:
+    """
+    Scatter the level's crates over floor cells where a crate could still reach a goal
+    """
+    analysis = get_map_analysis(level.definition)
+    live = [cell for cell in level.floor if not analysis.is_dead(cell)]
+    count = min(len(level.crates), len(live))
+    return [random.sample(live, count) for _ in range(samples)]
+
+
+def nearest_goal_sum(analysis: MapAnalysis, crates: List[int]) -> int:
+    """ The simpler lower bound, sending every crate to its nearest goal """
+    distances = analysis.distances
+    return sum(distances[c] for c in crates)
+
+
+def run_benchmark():
+    """
+    Compare the nearest goal and minimum matching lower bounds on every map, showing how tight each bound is
+    on average, how many positions only the matching finds cannot be solved, and how long each takes to
+    calculate in microseconds
+    """
+    random = Random(0)
+    print(f"{'map':>4} {'crates':>6} {'nearest':>8} {'matching':>8} {'dead':>5} {'nearest us':>10} "
+          f"{'matching us':>11} {'update us':>9}")
+    for index, definition in enumerate(MAPS):
+        level = Level(definition)
+        if not level.crates:
+            continue
+        analysis = get_map_analysis(definition)
+        positions = sample_positions(level, SAMPLES, random)
+        matchings = [CrateMatching(analysis, crates) for crates in positions]
+        moves = [(crates[0], random.choice([c for c in level.floor if c not in crates])) for crates in positions]
+
+        live = [(crates, m.cost) for crates, m in zip(positions, matchings) if m.cost != UNREACHABLE]
+        nearest = sum(nearest_goal_sum(analysis, crates) for crates, _ in live) / max(len(live), 1)
+        matching = sum(cost for _, cost in live) / max(len(live), 1)
+        scale = 1e6 / (SAMPLES * REPEATS)
+        nearest_time = timeit(lambda: [nearest_goal_sum(analysis, crates) for crates in positions], number=REPEATS)
+        matching_time = timeit(lambda: [minimum_matching_cost(analysis, crates) for crates in positions],
+                               number=REPEATS)
+        update_time = timeit(lambda: [m.moved(start, finish) for m, (start, finish) in zip(matchings, moves)],
+                             number=REPEATS)
+        print(f"{index:>4} {len(level.crates):>6} {nearest:>8.1f} {matching:>8.1f} {SAMPLES - len(live):>5} "
+              f"{nearest_time * scale:>10.1f} {matching_time * scale:>11.1f} {update_time * scale:>9.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
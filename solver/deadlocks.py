@@ -0,0 +1,210 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from coordinate import Coordinate
+from solver.analysis import MapAnalysis, UNREACHABLE
+
+# Reasons a position can be deadlocked
+DEAD_SQUARE = "dead square"
+FROZEN_CRATE = "frozen crate"
+CLOSED_CORRAL = "closed corral"
+
+
+class Deadlock(NamedTuple):
+    """
+    Why a position can never be solved, and the cells of the crates involved
+    """
+    reason: str
+    cells: Tuple[int, ...]
+
+
+class DeadlockDetector:
+    """
+    Spots positions which can never be solved, looking only around the crates that moved so each check is cheap.
+    Once a deadlock is found, no move can undo it, so it is kept until the crates are put back (see restore).
+
+    Crates in this game are pushed in lines, so two crates side by side (or a 2x2 block) can still be pushed
+    along together unless the line runs into a wall. A crate is "frozen" when it can never move again, which
+    is when the line of crates through it is stuck against a wall both horizontally and vertically.
+    """
+    def __init__(self, analysis: MapAnalysis, crates: Iterable[int]):
+        level = analysis.level
+        self.__level = level
+        self.__walls = level.walls
+        self.__goals = level.goals
+        self.__distances = analysis.distances
+        self.__offsets = (1, level.stride)
+
+        self.__crates = bytearray(level.size)
+        for crate in crates:
+            self.__crates[crate] = 1
+        self.__deadlock: Optional[Deadlock] = None
+
+        for crate in [c for c, flag in enumerate(self.__crates) if flag]:
+            self.__check(crate, ())
+            if self.__deadlock is not None:
+                break
+
+    def copy(self) -> "DeadlockDetector":
+        """
+        :return: a detector for the same position, which can be changed without affecting this one
+        """
+        detector = DeadlockDetector.__new__(DeadlockDetector)
+        detector.__level = self.__level
+        detector.__walls = self.__walls
+        detector.__goals = self.__goals
+        detector.__distances = self.__distances
+        detector.__offsets = self.__offsets
+        detector.__crates = bytearray(self.__crates)
+        detector.__deadlock = self.__deadlock
+        return detector
+
+    @property
+    def deadlock(self) -> Optional[Deadlock]:
+        """ The reason the position can never be solved, or None if no deadlock has been found """
+        return self.__deadlock
+
+    def crate_moved(self, start: Coordinate, finish: Coordinate):
+        """
+        Update the position after a crate moved, and check around it for deadlocks
+        :param start: where the crate moved from
+        :param finish: where the crate moved to
+        :return: nothing
+        """
+        start_cell = self.__level.cell(start.x, start.y)
+        finish_cell = self.__level.cell(finish.x, finish.y)
+        self.__crates[start_cell] = 0
+        self.__crates[finish_cell] = 1
+        if self.__deadlock is None:
+            self.__check(finish_cell, (start_cell,))
+
+    def restore(self, start: Coordinate, finish: Coordinate, deadlock: Optional[Deadlock]):
+        """
+        Put a crate back where it was before moving, for undo
+        :param start: where the crate moved from, which it is moved back to
+        :param finish: where the crate moved to
+        :param deadlock: the deadlock before the crate moved
+        :return: nothing
+        """
+        self.__crates[self.__level.cell(finish.x, finish.y)] = 0
+        self.__crates[self.__level.cell(start.x, start.y)] = 1
+        self.__deadlock = deadlock
+
+    def is_frozen(self, cell: int) -> bool:
+        """
+        :param cell: a cell with a crate on
+        :return: True if the crate can never move again
+        """
+        return self.__is_frozen(cell, set())
+
+    def __check(self, moved: int, vacated: Tuple[int, ...]):
+        """
+        Check the crate that moved, and the crates next to where it moved to and from, whose lines it changed
+        """
+        if self.__distances[moved] == UNREACHABLE:
+            self.__deadlock = Deadlock(DEAD_SQUARE, (moved,))
+            return
+
+        crates = self.__crates
+        nearby = [moved]
+        for cell in (moved,) + vacated:
+            for offset in self.__offsets:
+                for neighbour in (cell - offset, cell + offset):
+                    if crates[neighbour] and neighbour not in nearby:
+                        nearby.append(neighbour)
+
+        frozen = [cell for cell in nearby if self.__is_frozen(cell, set())]
+        off_goals = tuple(cell for cell in frozen if cell not in self.__goals)
+        if off_goals:
+            self.__deadlock = Deadlock(FROZEN_CRATE, off_goals)
+        elif frozen:
+            self.__check_corrals(frozen)
+
+    def __is_frozen(self, cell: int, assumed: Set[int]) -> bool:
+        """
+        Check both directions a crate could move in. Crates in "assumed" are being checked further up,
+        and are treated as walls, so crates blocking each other are frozen together.
+        """
+        assumed.add(cell)
+        try:
+            return all(self.__is_blocked(cell, offset, assumed) for offset in self.__offsets)
+        finally:
+            assumed.discard(cell)
+
+    def __is_blocked(self, cell: int, offset: int, assumed: Set[int]) -> bool:
+        """
+        Check if the crate can never move along one axis
+        """
+        walls = self.__walls
+        crates = self.__crates
+        across = self.__offsets[0] if offset != self.__offsets[0] else self.__offsets[1]
+
+        ends = []
+        for step in (offset, -offset):
+            # Follow the line of crates to its end. If that is a wall, the line can never move this way or
+            # back, as there is nowhere to push from, so long as the rest of the line cannot move away.
+            line = []
+            end = cell + step
+            while crates[end] and end not in assumed:
+                line.append(end)
+                end += step
+            if walls[end] or end in assumed:
+                if all(self.__is_blocked_alone(crate, across, assumed) for crate in line):
+                    return True
+            ends.append((end, line))
+
+        # A lone crate which would land on a dead square whichever way it is pushed can never move either
+        (first, first_line), (second, second_line) = ends
+        distances = self.__distances
+        return (not first_line and not second_line and
+                distances[first] == UNREACHABLE and distances[second] == UNREACHABLE)
+
+    def __is_blocked_alone(self, cell: int, offset: int, assumed: Set[int]) -> bool:
+        assumed.add(cell)
+        try:
+            return self.__is_blocked(cell, offset, assumed)
+        finally:
+            assumed.discard(cell)
+
+    def __check_corrals(self, frozen: Iterable[int]):
+        """
+        Frozen crates and walls can fence off part of the level for good. Crates can never leave a fenced off
+        area and crates outside can never get in, so it needs exactly as many crates as goals.
+        """
+        walls = self.__walls
+        crates = self.__crates
+        goals = self.__goals
+        is_frozen: Dict[int, bool] = {cell: True for cell in frozen}
+
+        def is_fence(cell: int) -> bool:
+            if walls[cell]:
+                return True
+            if not crates[cell]:
+                return False
+            if cell not in is_frozen:
+                is_frozen[cell] = self.__is_frozen(cell, set())
+            return is_frozen[cell]
+
+        seen = set()
+        every_goal_needed = sum(crates) == len(goals)
+        for fence in frozen:
+            for offset in self.__offsets:
+                for start in (fence - offset, fence + offset):
+                    if start in seen or is_fence(start):
+                        continue
+
+                    area_crates = 0
+                    area_goals = 0
+                    area = [start]
+                    seen.add(start)
+                    for cell in area:
+                        area_crates += crates[cell]
+                        area_goals += cell in goals
+                        for o in self.__offsets:
+                            for neighbour in (cell - o, cell + o):
+                                if neighbour not in seen and not is_fence(neighbour):
+                                    seen.add(neighbour)
+                                    area.append(neighbour)
+
+                    if area_crates > area_goals or (every_goal_needed and area_crates < area_goals):
+                        self.__deadlock = Deadlock(CLOSED_CORRAL, (fence,) + tuple(c for c in area if crates[c]))
+                        return
@@ -0,0 +1,191 @@
+from typing import List, NamedTuple, Optional, Sequence
+
+from solver.level import Level, WALL, DIRECTIONS
+
+try:
+    import numpy
+except ImportError:
+    # Only needed for BatchEnvironment, which cannot be created without it
+    numpy = None
+
+# The reward for every move, so shorter solutions score higher
+STEP_REWARD = -0.1
+
+# The reward for each crate pushed onto a goal, which is taken away again if it is pushed off
+GOAL_REWARD = 1.0
+
+# The reward for solving a board
+SOLVED_REWARD = 10.0
+
+# Observations have one bit set for each thing on a square
+OBSERVE_WALL = 1
+OBSERVE_GOAL = 2
+OBSERVE_CRATE = 4
+OBSERVE_PLAYER = 8
+
+
+class StepResult(NamedTuple):
+    """
+    The result of moving on every board at once. Each is an array with one entry per board.
+    """
+    rewards: "numpy.ndarray"
+    # True for boards which are solved, or have run out of steps
+    done: "numpy.ndarray"
+    # False for boards where the player walked into a wall or a crate which could not move
+    moved: "numpy.ndarray"
+    # The number of times a crate moved one square
+    pushes: "numpy.ndarray"
+
+
+class BatchEnvironment:
+    """
+    Many single player boards played at once, held as NumPy arrays so that one move on every board is a handful
+    of array operations instead of a loop over pieces. Boards can all be the same level, or different levels which
+    are padded with walls to the same size. The rules are the same as the game's, including pushing lines of crates.
+
+    Actions are indices into DIRECTIONS. Boards which are done keep accepting moves until they are reset.
+    """
+    def __init__(self, definitions: Sequence[List[List[str]]], copies: int = 1, max_steps: Optional[int] = None):
+        """
+        :param definitions: the map definitions, in the same format as read by read_map
+        :param copies: how many boards to make of each definition
+        :param max_steps: the moves after which a board is done even if not solved, or None for no limit
+        :raises ValueError: if there are no boards, or a level does not have exactly one player
+        """
+        if numpy is None:
+            raise ImportError("BatchEnvironment needs numpy")
+        if not definitions or copies <= 0:
+            raise ValueError("No boards to play")
+
+        # Pad every level to the same size, so that they all share the same cell numbers and offsets
+        width = max(len(definition[0]) for definition in definitions)
+        height = max(len(definition) for definition in definitions)
+        levels = []
+        for definition in definitions:
+            rows = [list(row) + [WALL] * (width - len(row)) for row in definition]
+            rows.extend([WALL] * width for _ in range(height - len(rows)))
+            level = Level(rows)
+            if len(level.players) != 1:
+                raise ValueError("Batched boards must have exactly one player")
+            levels.append(level)
+
+        level = levels[0]
+        self.__width = width
+        self.__height = height
+        self.__stride = level.stride
+        self.__size = level.size
+        self.__count = len(levels) * copies
+        self.__max_steps = max_steps
+        self.__offsets = numpy.array([level.offset(direction) for direction in DIRECTIONS], dtype=numpy.int64)
+
+        walls = numpy.zeros((len(levels), self.__size), dtype=bool)
+        goals = numpy.zeros((len(levels), self.__size), dtype=bool)
+        crates = numpy.zeros((len(levels), self.__size), dtype=bool)
+        players = numpy.zeros(len(levels), dtype=numpy.int64)
+        for index, level in enumerate(levels):
+            walls[index] = numpy.frombuffer(level.walls, dtype=numpy.uint8).astype(bool)
+            goals[index, list(level.goals)] = True
+            crates[index, list(level.crates)] = True
+            players[index] = level.players[0]
+
+        # Every board is kept in one flat array, with each board's cells starting at its base
+        self.__bases = numpy.arange(self.__count, dtype=numpy.int64) * self.__size
+        self.__walls = numpy.repeat(walls, copies, axis=0).ravel()
+        self.__goals = numpy.repeat(goals, copies, axis=0).ravel()
+        self.__start_crates = numpy.repeat(crates, copies, axis=0).ravel()
+        self.__start_players = numpy.repeat(players, copies) + self.__bases
+        self.__crate_counts = numpy.repeat(crates.sum(axis=1), copies)
+
+        self.__crates = self.__start_crates.copy()
+        self.__players = self.__start_players.copy()
+        self.__on_goals = numpy.zeros(self.__count, dtype=numpy.int64)
+        self.__steps = numpy.zeros(self.__count, dtype=numpy.int64)
+        self.reset()
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def players(self) -> "numpy.ndarray":
+        """ The cell of the player on each board, numbered the same as a Level of the padded map """
+        return self.__players - self.__bases
+
+    @property
+    def crates(self) -> "numpy.ndarray":
+        """ Whether there is a crate on each cell of each board, with a row for each board """
+        return self.__crates.reshape(self.__count, self.__size)
+
+    @property
+    def steps(self) -> "numpy.ndarray":
+        """ The moves made on each board since it was last reset, including moves which were blocked """
+        return self.__steps
+
+    @property
+    def solved(self) -> "numpy.ndarray":
+        return self.__on_goals == self.__crate_counts
+
+    def reset(self, boards: Optional["numpy.ndarray"] = None):
+        """
+        Put boards back to the start of their levels
+        :param boards: a boolean mask or indices of the boards to reset, or None to reset every board
+        :return: nothing
+        """
+        if boards is None:
+            boards = numpy.arange(self.__count)
+        elif boards.dtype == bool:
+            boards = numpy.flatnonzero(boards)
+        cells = (self.__bases[boards, None] + numpy.arange(self.__size)).ravel()
+        self.__crates[cells] = self.__start_crates[cells]
+        self.__players[boards] = self.__start_players[boards]
+        self.__steps[boards] = 0
+        on_goals = self.__crates[cells] & self.__goals[cells]
+        self.__on_goals[boards] = on_goals.reshape(len(boards), self.__size).sum(axis=1)
+
+    def step(self, actions: "numpy.ndarray") -> StepResult:
+        """
+        Make one move on every board
+        :param actions: the index in DIRECTIONS of the move to make on each board
+        :return: the rewards and what happened on each board
+        """
+        offsets = self.__offsets[actions]
+        crates = self.__crates
+        targets = self.__players + offsets
+
+        # Find the first square past any line of crates in front of each player
+        ends = targets.copy()
+        in_line = crates[ends]
+        while in_line.any():
+            ends[in_line] += offsets[in_line]
+            in_line = crates[ends]
+
+        moved = ~self.__walls[ends]
+        pushing = moved & (ends != targets)
+        # Shuffling a line of crates along is the same as moving the first crate to the end
+        pushed_from = targets[pushing]
+        pushed_to = ends[pushing]
+        crates[pushed_from] = False
+        crates[pushed_to] = True
+        self.__players[moved] = targets[moved]
+        self.__steps += 1
+
+        pushes = numpy.zeros(self.__count, dtype=numpy.int64)
+        pushes[pushing] = (pushed_to - pushed_from) // offsets[pushing]
+        goals_gained = numpy.zeros(self.__count, dtype=numpy.int64)
+        goals_gained[pushing] = self.__goals[pushed_to].astype(numpy.int64) - self.__goals[pushed_from]
+        self.__on_goals += goals_gained
+
+        solved = self.solved
+        rewards = STEP_REWARD + GOAL_REWARD * goals_gained + SOLVED_REWARD * (solved & (goals_gained > 0))
+        done = solved if self.__max_steps is None else solved | (self.__steps >= self.__max_steps)
+        return StepResult(rewards, done, moved, pushes)
+
+    def observe(self) -> "numpy.ndarray":
+        """
+        :return: what is on every square of every board, as an array of shape (boards, height, width) where each
+        square has the OBSERVE_ bits set for each thing on it
+        """
+        squares = (self.__walls * OBSERVE_WALL + self.__goals * OBSERVE_GOAL + self.__crates * OBSERVE_CRATE)
+        squares = squares.astype(numpy.uint8)
+        squares[self.__players] |= OBSERVE_PLAYER
+        squares = squares.reshape(self.__count, self.__height + 2, self.__stride)
+        return squares[:, 1:-1, 1:-1]
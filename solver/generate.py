@@ -0,0 +1,193 @@
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from solver.level import Level, WALL, FLOOR, PLAYER, CRATE, GOAL, CRATE_ON_GOAL, PLAYER_ON_GOAL
+from solver.solver import SearchBudget, SearchLimitReached, solve_level
+
+# The chance of each square inside a room being a wall before the room is tidied up
+WALL_DENSITY = 0.15
+
+# The chance of pulling a crate when the player walks away from one
+PULL_CHANCE = 0.6
+
+# How many candidates to give the workers at once, for each worker
+CANDIDATES_PER_WORKER = 4
+
+
+def generate_candidate(seed: int, width: int, height: int, crates: int, steps: int) -> Optional[List[List[str]]]:
+    """
+    Make a level by playing backwards: start with every crate on a goal, then walk the player around at random,
+    pulling crates along behind it. Every pull is a push played in reverse, so the level can always be solved.
+    :param seed: the seed for the random numbers, so the same seed always makes the same level
+    :param width: the width of the level including its outer walls
+    :param height: the height of the level including its outer walls
+    :param crates: the number of crates
+    :param steps: the number of random steps to take
+    :return: the map definition, or None if the room was too small or every crate finished back on its goal
+    """
+    rng = random.Random(seed)
+    definition = [[WALL] * width for _ in range(height)]
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            if rng.random() >= WALL_DENSITY:
+                definition[y][x] = FLOOR
+    level = Level(definition)
+
+    # Keep the biggest connected part of the room
+    floor = max(level.areas(), key=len, default=frozenset())
+    if len(floor) < 2 * crates + 1:
+        return None
+    cells = sorted(floor)
+    rng.shuffle(cells)
+    goals = set(cells[:crates])
+    crate_cells = set(goals)
+    player = cells[crates]
+
+    offsets = list(level.offsets.values())
+    for _ in range(steps):
+        offset = rng.choice(offsets)
+        target = player + offset
+        if target not in floor or target in crate_cells:
+            continue
+        behind = player - offset
+        if behind in crate_cells and rng.random() < PULL_CHANCE:
+            crate_cells.remove(behind)
+            crate_cells.add(player)
+        player = target
+
+    if crate_cells == goals:
+        return None
+
+    for cell in level.floor:
+        coordinate = level.coordinate(cell)
+        if cell not in floor:
+            string = WALL
+        elif cell == player:
+            string = PLAYER_ON_GOAL if cell in goals else PLAYER
+        elif cell in crate_cells:
+            string = CRATE_ON_GOAL if cell in goals else CRATE
+        elif cell in goals:
+            string = GOAL
+        else:
+            string = FLOOR
+        definition[coordinate.y][coordinate.x] = string
+    return definition
+
+
+def evaluate_candidate(seed: int, width: int, height: int, crates: int, steps: int, seconds: Optional[float],
+                       nodes: Optional[int]) -> Optional[Dict]:
+    """
+    Make a level and solve it, in a worker process
+    :return: the level's seed, map definition, solution and the nodes the solver expanded, or None if no
+    level was made or it could not be solved within the budget
+    """
+    definition = generate_candidate(seed, width, height, crates, steps)
+    if definition is None:
+        return None
+    budget = SearchBudget(seconds, nodes)
+    try:
+        solution = solve_level(Level(definition), budget)
+    except SearchLimitReached:
+        return None
+    if solution is None:
+        return None
+    return {"seed": seed, "definition": definition, "moves": solution.moves, "pushes": solution.pushes,
+            "nodes_expanded": solution.nodes_expanded}
+
+
+def generate_levels(count: int, seed: int = 0, width: int = 9, height: int = 8, crates: int = 3,
+                    steps: int = 300, min_pushes: int = 0, min_nodes: int = 0, seconds: Optional[float] = 10.0,
+                    nodes: Optional[int] = None, workers: Optional[int] = None,
+                    max_candidates: Optional[int] = None) -> List[Dict]:
+    """
+    Make levels in parallel, keeping only the ones which are hard enough. Candidates are made and solved in
+    batches across a pool of processes, and the seeds are consecutive from the given seed, so the same arguments
+    always give the same levels.
+    :param count: the number of levels wanted
+    :param seed: the seed of the first candidate
+    :param width: the width of each level including its outer walls
+    :param height: the height of each level including its outer walls
+    :param crates: the number of crates in each level
+    :param steps: the number of random steps taken making each level
+    :param min_pushes: the fewest pushes a level's solution can have to be kept
+    :param min_nodes: the fewest nodes the solver can expand solving a level for it to be kept
+    :param seconds: the time allowed for solving each candidate, or None for no limit
+    :param nodes: the nodes each candidate's search can expand, or None for no limit
+    :param workers: the number of worker processes, or None for one per CPU
+    :param max_candidates: the most candidates to try, or None to carry on until there are enough levels
+    :return: the levels kept, in order of seed, as returned by evaluate_candidate
+    """
+    workers = workers or os.cpu_count() or 1
+    last_seed = None if max_candidates is None else seed + max_candidates
+    levels = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while len(levels) < count and (last_seed is None or seed < last_seed):
+            batch_end = seed + CANDIDATES_PER_WORKER * workers
+            seeds = range(seed, batch_end if last_seed is None else min(batch_end, last_seed))
+            futures = [executor.submit(evaluate_candidate, s, width, height, crates, steps, seconds, nodes)
+                       for s in seeds]
+            for future in futures:
+                level = future.result()
+                if level is not None and level["pushes"] >= min_pushes and level["nodes_expanded"] >= min_nodes:
+                    levels.append(level)
+            seed += len(seeds)
+    return levels[:count]
+
+
+def format_maps(definitions: List[List[List[str]]], name: str = "GENERATED_MAP") -> str:
+    """
+    Write map definitions as Python in the same layout as maps.py
+    :param definitions: the map definitions
+    :param name: the name of the variables, which are numbered from 1
+    :return: the Python source
+    """
+    lines = []
+    names = []
+    for number, definition in enumerate(definitions, start=1):
+        names.append(f"{name}{number}")
+        lines.append(f"{names[-1]} = [")
+        lines.extend(f"    [{', '.join(repr(string) for string in row)}]," for row in definition)
+        lines.extend(["]", "", ""])
+    lines.append(f"{name}S = [{', '.join(names)}]")
+    return "\n".join(lines) + "\n"
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """
+    Make levels from the command line, and write them as Python
+    :param arguments: the command line arguments, or None to use sys.argv
+    :return: the exit code
+    """
+    parser = ArgumentParser(prog="python -m solver.generate", description="Make new levels by playing backwards")
+    parser.add_argument("--count", type=int, default=10, help="the number of levels to make")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the first candidate")
+    parser.add_argument("--width", type=int, default=9, help="the width of each level")
+    parser.add_argument("--height", type=int, default=8, help="the height of each level")
+    parser.add_argument("--crates", type=int, default=3, help="the number of crates in each level")
+    parser.add_argument("--steps", type=int, default=300, help="random steps taken making each level")
+    parser.add_argument("--min-pushes", type=int, default=10, help="the fewest pushes a level can need")
+    parser.add_argument("--min-nodes", type=int, default=0, help="the fewest nodes the solver can expand")
+    parser.add_argument("--seconds", type=float, default=10.0, help="time limit for solving each candidate")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--max-candidates", type=int, help="the most candidates to try")
+    parser.add_argument("--output", default="-", help="file to write the levels to (default: stdout)")
+    options = parser.parse_args(arguments)
+
+    levels = generate_levels(options.count, options.seed, options.width, options.height, options.crates,
+                             options.steps, options.min_pushes, options.min_nodes, options.seconds, None,
+                             options.workers, options.max_candidates)
+    source = format_maps([level["definition"] for level in levels])
+    if options.output == "-":
+        sys.stdout.write(source)
+    else:
+        with open(options.output, "w") as file:
+            file.write(source)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
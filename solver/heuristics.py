@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from solver.analysis import MapAnalysis, UNREACHABLE
+
+
+class CrateMatching:
+    """
+    The cheapest way of assigning every crate to a different goal, where the cost of a crate on a goal is
+    the number of pushes it needs ignoring other crates. Every crate needs at least that many pushes, so
+    the total is a lower bound on the pushes needed to solve the level which is much tighter than sending
+    each crate to its nearest goal.
+
+    The assignment is found with the Hungarian algorithm, which also keeps "potentials" for each crate and
+    goal. These stay valid when a single crate moves, so after a push only that crate needs reassigning.
+    Matchings are never changed after they are created, so they can be shared between search states.
+    """
+    def __init__(self, analysis: MapAnalysis, crates: Sequence[int], targets: Optional[Dict[int, List[int]]] = None):
+        """
+        :param analysis: the analysis of the level
+        :param crates: the cells of the crates
+        :param targets: cells to assign crates to instead of the goals, with the pushes needed to move a crate
+        from every cell to each, or None for the goals
+        """
+        if targets is None:
+            targets = analysis.goal_distances
+        self.__goals = [targets[target] for target in sorted(targets)]
+        self.__crates = list(crates)
+        self.__rows = [[table[crate] for table in self.__goals] for crate in self.__crates]
+        self.__assign_all()
+
+    @property
+    def cost(self) -> int:
+        """ The total pushes of the cheapest assignment, or UNREACHABLE if some crate cannot reach any free goal """
+        return self.__cost
+
+    @property
+    def crates(self) -> Tuple[int, ...]:
+        return tuple(self.__crates)
+
+    def assignment(self) -> List[Tuple[int, int]]:
+        """
+        :return: pairs of crate and goal index (in order of goal cell) for the cheapest assignment
+        """
+        return [(self.__crates[row - 1], column - 1) for column, row in enumerate(self.__column_rows) if row]
+
+    def moved(self, start: int, finish: int) -> "CrateMatching":
+        """
+        Create the matching after one crate has moved.
+        This takes O(n^2) time for n crates, rather than O(n^3) to start again.
+        :param start: the cell the crate was on
+        :param finish: the cell the crate is now on
+        :return: the new matching
+        """
+        matching = CrateMatching.__new__(CrateMatching)
+        matching.__goals = self.__goals
+        matching.__crates = list(self.__crates)
+        matching.__rows = list(self.__rows)
+        matching.__row_potentials = list(self.__row_potentials)
+        matching.__column_potentials = list(self.__column_potentials)
+        matching.__column_rows = list(self.__column_rows)
+
+        index = matching.__crates.index(start)
+        matching.__crates[index] = finish
+        matching.__rows[index] = [table[finish] for table in self.__goals]
+
+        if len(matching.__crates) != len(matching.__goals):
+            # With spare goals, freeing a goal can leave its potential too low to trust, so start again
+            matching.__assign_all()
+            return matching
+
+        # Free the crate's goal, and lower its potential just enough to be consistent with its new costs
+        row = index + 1
+        matching.__column_rows[matching.__column_rows.index(row)] = 0
+        matching.__row_potentials[row] = min(cost - potential for cost, potential in
+                                             zip(matching.__rows[index], matching.__column_potentials[1:]))
+        matching.__assign(row)
+        matching.__cost = matching.__calculate_cost()
+        return matching
+
+    def __assign_all(self):
+        """
+        Assign every crate from scratch
+        """
+        # Rows (crates) and columns (goals) are numbered from 1 so 0 can mean "unassigned"
+        self.__row_potentials = [0] * (len(self.__crates) + 1)
+        self.__column_potentials = [0] * (len(self.__goals) + 1)
+        self.__column_rows = [0] * (len(self.__goals) + 1)
+        if len(self.__crates) > len(self.__goals):
+            self.__cost = UNREACHABLE
+            return
+
+        for row in range(1, len(self.__crates) + 1):
+            self.__assign(row)
+        self.__cost = self.__calculate_cost()
+
+    def __assign(self, row: int):
+        """
+        Assign a goal to an unassigned crate by finding the shortest augmenting path, keeping every other
+        crate's assignment optimal.
+        """
+        rows = self.__rows
+        u = self.__row_potentials
+        v = self.__column_potentials
+        column_rows = self.__column_rows
+        columns = len(v)
+
+        infinity = UNREACHABLE * (len(u) + 1)
+        minimums = [infinity] * columns
+        previous = [0] * columns
+        used = [False] * columns
+
+        column_rows[0] = row
+        column = 0
+        while True:
+            used[column] = True
+            current_row = column_rows[column]
+            costs = rows[current_row - 1]
+            delta = infinity
+            next_column = 0
+            for j in range(1, columns):
+                if used[j]:
+                    continue
+                reduced = costs[j - 1] - u[current_row] - v[j]
+                if reduced < minimums[j]:
+                    minimums[j] = reduced
+                    previous[j] = column
+                if minimums[j] < delta:
+                    delta = minimums[j]
+                    next_column = j
+
+            for j in range(columns):
+                if used[j]:
+                    u[column_rows[j]] += delta
+                    v[j] -= delta
+                else:
+                    minimums[j] -= delta
+
+            column = next_column
+            if column_rows[column] == 0:
+                break
+
+        # Flip the assignments along the path
+        while column:
+            previous_column = previous[column]
+            column_rows[column] = column_rows[previous_column]
+            column = previous_column
+        column_rows[0] = 0
+
+    def __calculate_cost(self) -> int:
+        cost = sum(self.__rows[row - 1][column - 1] for column, row in enumerate(self.__column_rows) if row)
+        return UNREACHABLE if cost >= UNREACHABLE else cost
+
+
+def minimum_matching_cost(analysis: MapAnalysis, crates: Sequence[int]) -> int:
+    """
+    Calculate a lower bound on the pushes needed to move the crates onto goals, by assigning each crate to a
+    different goal as cheaply as possible. See CrateMatching to update this incrementally as crates move.
+    :param analysis: the analysis of the level
+    :param crates: the cells containing crates
+    :return: the lower bound, or UNREACHABLE if the crates can never all reach different goals
+    """
+    return CrateMatching(analysis, crates).cost
@@ -0,0 +1,162 @@
+import os
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from game_state import GameState
+from solver.level import Level, MOVE_TO_DIRECTION
+from solver.solver import SearchBudget, SearchLimitReached, solve_level
+
+# The longest a hint search can take, in seconds
+HINT_SECONDS = 30.0
+
+# How much to lower the priority of the worker process searching for hints, so on a machine with few CPUs the
+# game's frame loop still gets the time it needs
+HINT_NICENESS = 10
+
+
+class Hint(NamedTuple):
+    """
+    The moves up to and including the next push of an optimal solution, in LURD notation,
+    and the pushes left in that solution
+    """
+    moves: str
+    pushes: int
+
+
+class HintService:
+    """
+    Searches for hints for a level in a worker process, so the solver never takes time from the game's frame
+    loop, as a search on a thread would by holding the interpreter lock. Hints are remembered by the hash of the
+    state they are for (see GameState.hash), along with hints for every state on the way to solving the level.
+    Only one search runs at a time, and asking for a hint for a new state (or cancelling) stops the worker of any
+    search still running. A finished search is picked up the next time searched or get is called, so keep calling
+    one of them, such as once a frame, while waiting.
+    """
+    def __init__(self, seconds: Optional[float] = HINT_SECONDS):
+        self.__seconds = seconds
+        self.__hints: Dict[int, Optional[Hint]] = dict()
+        # The state being searched for, the worker searching and the end of the pipe its solution comes back on
+        self.__searching: Optional[Tuple[GameState, Process, Connection]] = None
+
+    def request(self, state: GameState):
+        """
+        Start searching for a hint for a state, unless it is already known or being searched for
+        :param state: the state to find a hint for, which is copied so can be changed afterwards
+        :return: nothing
+        """
+        self.__collect()
+        if state.hash in self.__hints or (self.__searching and self.__searching[0].hash == state.hash):
+            return
+        self.__cancel()
+
+        receiver, sender = Pipe(duplex=False)
+        level = state.level.with_pieces(state.crates, state.players)
+        process = Process(target=_search_in_process, args=(sender, level, self.__seconds), name="hints", daemon=True)
+        process.start()
+        sender.close()
+        self.__searching = (state.copy(), process, receiver)
+
+    def searched(self, state_hash: int) -> bool:
+        """
+        :param state_hash: the hash of a state
+        :return: True if the search for the state has finished, even if it found no hint
+        """
+        self.__collect()
+        return state_hash in self.__hints
+
+    def get(self, state_hash: int) -> Optional[Hint]:
+        """
+        :param state_hash: the hash of a state
+        :return: the hint for the state, or None if it is not known (yet) or the state cannot be solved
+        """
+        self.__collect()
+        return self.__hints.get(state_hash)
+
+    def cancel(self):
+        """
+        Stop the search that is running, if any. Hints already found are kept.
+        :return: nothing
+        """
+        self.__cancel()
+
+    def close(self):
+        """
+        Stop searching, ending the worker process
+        :return: nothing
+        """
+        self.__cancel()
+
+    def __cancel(self):
+        if self.__searching:
+            _, process, receiver = self.__searching
+            process.terminate()
+            process.join()
+            receiver.close()
+            self.__searching = None
+
+    def __collect(self):
+        """
+        Pick up the solution from the search that is running if it has finished, without waiting for it
+        """
+        if self.__searching is None:
+            return
+        state, process, receiver = self.__searching
+        if not receiver.poll():
+            return
+
+        try:
+            solution = receiver.recv()
+        except EOFError:
+            # The worker ended without sending anything, such as being killed by the operating system
+            solution = None
+        process.join()
+        receiver.close()
+        self.__searching = None
+
+        if solution is None:
+            self.__hints[state.hash] = None
+        else:
+            self.__remember(state, *solution)
+
+    def __remember(self, state: GameState, moves: str, pushes: int):
+        """
+        Store a hint for every state along a solution
+        """
+        # The end of the hint starting at each move, which is just after the next push
+        ends = []
+        end = len(moves)
+        for index in reversed(range(len(moves))):
+            if moves[index].isupper():
+                end = index + 1
+            ends.append(end)
+        ends.reverse()
+
+        for index, move in enumerate(moves):
+            self.__hints[state.hash] = Hint(moves[index:ends[index]], pushes)
+            before = state.pushes
+            state.move(MOVE_TO_DIRECTION[move.lower()])
+            pushes -= state.pushes - before
+
+        # There is nothing left to push once the level is solved
+        self.__hints.setdefault(state.hash, None)
+
+
+def _search_in_process(sender: Connection, level: Level, seconds: Optional[float]):
+    """
+    Solve a level in a worker process, sending the moves and pushes of the solution, or None if there is none
+    or it was not found in time
+    :param sender: the end of the pipe to send on
+    :param level: the level to solve
+    :param seconds: the time allowed for the search, or None for no limit
+    :return: nothing
+    """
+    if hasattr(os, "nice"):
+        # Not available on Windows, where the worker keeps the game's priority
+        os.nice(HINT_NICENESS)
+    try:
+        solution = solve_level(level, SearchBudget(seconds))
+    except SearchLimitReached:
+        solution = None
+    sender.send(None if solution is None else (solution.moves, solution.pushes))
+    sender.close()
@@ -0,0 +1,242 @@
+from typing import List, Dict, Tuple, FrozenSet
+
+from constants.direction import Direction
+from coordinate import Coordinate
+
+WALL = 'W'
+FLOOR = 'N'
+PLAYER = 'P'
+CRATE = 'B'
+GOAL = 'G'
+
+# A crate or player starting on a goal is written as both letters in the same square
+CRATE_ON_GOAL = CRATE + GOAL
+PLAYER_ON_GOAL = PLAYER + GOAL
+
+# Moves are written in LURD notation. Lower case is a move, upper case is a move which pushed a crate.
+DIRECTION_TO_MOVE: Dict[Direction, str] = {
+    Direction.left: 'l',
+    Direction.up: 'u',
+    Direction.right: 'r',
+    Direction.down: 'd',
+}
+MOVE_TO_DIRECTION: Dict[str, Direction] = {m: d for d, m in DIRECTION_TO_MOVE.items()}
+
+DIRECTIONS = [Direction.left, Direction.up, Direction.right, Direction.down]
+
+
+class Level:
+    """
+    A compact description of a map for headless searches, without any pieces or app container.
+
+    Every square is a "cell" numbered row by row. The map is surrounded by an extra border of walls
+    so that moving off a cell in any direction is just adding an offset, and can never leave the level.
+    """
+    def __init__(self, custom_map: List[List[str]]):
+        height = len(custom_map)
+        if height <= 0:
+            raise ValueError("No empty maps allowed! (height)")
+
+        width = len(custom_map[0])
+        if width <= 0:
+            raise ValueError("No empty maps allowed! (width)")
+
+        for row in custom_map:
+            if len(row) != width:
+                raise ValueError("Maps must be rectangles")
+
+        self.__definition = [list(row) for row in custom_map]
+        self.__width = width
+        self.__height = height
+        self.__stride = width + 2
+        self.__size = self.__stride * (height + 2)
+
+        self.__offsets: Dict[Direction, int] = {
+            Direction.left: -1,
+            Direction.right: 1,
+            Direction.up: -self.__stride,
+            Direction.down: self.__stride,
+        }
+
+        walls = bytearray(b'\x01') * self.__size
+        goals = []
+        crates = []
+        players = []
+        for y, row in enumerate(custom_map):
+            for x, string in enumerate(row):
+                cell = self.cell(x, y)
+                if string != WALL:
+                    walls[cell] = 0
+                if PLAYER in string:
+                    players.append(cell)
+                if CRATE in string:
+                    crates.append(cell)
+                if GOAL in string:
+                    goals.append(cell)
+
+        self.__walls = bytes(walls)
+        self.__goals: FrozenSet[int] = frozenset(goals)
+        self.__goals_mask = sum(1 << goal for goal in goals)
+        self.__crates: Tuple[int, ...] = tuple(crates)
+        self.__players: Tuple[int, ...] = tuple(players)
+        self.__floor: Tuple[int, ...] = tuple(c for c in range(self.__size) if not walls[c])
+
+    @property
+    def definition(self) -> List[List[str]]:
+        """ A copy of the map definition this level was built from, or only its walls and goals after with_pieces """
+        return [list(row) for row in self.__definition]
+
+    @property
+    def width(self) -> int:
+        return self.__width
+
+    @property
+    def height(self) -> int:
+        return self.__height
+
+    @property
+    def stride(self) -> int:
+        """ The difference between the cells of two vertically adjacent squares """
+        return self.__stride
+
+    @property
+    def size(self) -> int:
+        """ The number of cells, including the outer border """
+        return self.__size
+
+    @property
+    def walls(self) -> bytes:
+        """ One byte per cell which is 1 if the cell is a wall (or outside the map) and 0 otherwise """
+        return self.__walls
+
+    @property
+    def goals(self) -> FrozenSet[int]:
+        return self.__goals
+
+    @property
+    def goals_mask(self) -> int:
+        """ The goals as a bitboard, with bit n set if cell n is a goal """
+        return self.__goals_mask
+
+    @property
+    def crates(self) -> Tuple[int, ...]:
+        """ The starting cells of the crates """
+        return self.__crates
+
+    @property
+    def players(self) -> Tuple[int, ...]:
+        """ The starting cells of the players """
+        return self.__players
+
+    @property
+    def floor(self) -> Tuple[int, ...]:
+        """ All cells which are not walls """
+        return self.__floor
+
+    @property
+    def offsets(self) -> Dict[Direction, int]:
+        return self.__offsets
+
+    def offset(self, direction: Direction) -> int:
+        """
+        Get the change in cell number when moving in a direction
+        :param direction: the direction of movement
+        :return: the offset to add to a cell
+        """
+        return self.__offsets[direction]
+
+    def cell(self, x: int, y: int) -> int:
+        """
+        Get the cell for a square on the map
+        :param x: the x coordinate on the map
+        :param y: the y coordinate on the map
+        :return: the cell number
+        """
+        return (y + 1) * self.__stride + x + 1
+
+    def coordinate(self, cell: int) -> Coordinate:
+        """
+        Get the map coordinate of a cell
+        :param cell: the cell number
+        :return: the coordinate of the cell on the map
+        """
+        return Coordinate((cell % self.__stride) - 1, (cell // self.__stride) - 1)
+
+    def crates_mask(self, crates) -> int:
+        """
+        Convert some crate cells into a bitboard
+        :param crates: an iterable of cells containing crates
+        :return: the bitboard with bit n set if there is a crate on cell n
+        """
+        mask = 0
+        for crate in crates:
+            mask |= 1 << crate
+        return mask
+
+    def is_solved(self, crates_mask: int) -> bool:
+        """
+        :param crates_mask: the crates as a bitboard
+        :return: True if every crate is on a goal
+        """
+        return crates_mask & ~self.__goals_mask == 0
+
+    def areas(self) -> List[FrozenSet[int]]:
+        """
+        Split the floor into areas completely separated by walls. Nothing can ever move between two areas.
+        :return: the cells of each area
+        """
+        walls = self.__walls
+        offsets = list(self.__offsets.values())
+        seen = bytearray(walls)
+        areas = []
+        for start in self.__floor:
+            if seen[start]:
+                continue
+            seen[start] = 1
+            area = [start]
+            for cell in area:
+                for offset in offsets:
+                    neighbour = cell + offset
+                    if not seen[neighbour]:
+                        seen[neighbour] = 1
+                        area.append(neighbour)
+            areas.append(frozenset(area))
+        return areas
+
+    def restricted_to(self, area: FrozenSet[int]) -> "Level":
+        """
+        Create a copy of this level where everything outside the given area is a wall
+        :param area: the cells to keep
+        :return: the new level, which uses the same cell numbers as this one
+        """
+        definition = self.definition
+        for y, row in enumerate(definition):
+            for x in range(len(row)):
+                if self.cell(x, y) not in area:
+                    row[x] = WALL
+        return Level(definition).with_pieces([c for c in self.__crates if c in area],
+                                             [p for p in self.__players if p in area])
+
+    def with_pieces(self, crates, players) -> "Level":
+        """
+        Create a copy of this level with the crates and players somewhere else, such as part way through
+        a game. Unlike a map definition, this allows crates and players to start on goals.
+        :param crates: an iterable of cells containing crates
+        :param players: an iterable of cells containing players
+        :return: the new level
+        """
+        level = Level.__new__(Level)
+        level.__definition = [[GOAL if GOAL in string else WALL if string == WALL else FLOOR for string in row]
+                              for row in self.__definition]
+        level.__width = self.__width
+        level.__height = self.__height
+        level.__stride = self.__stride
+        level.__size = self.__size
+        level.__offsets = self.__offsets
+        level.__walls = self.__walls
+        level.__goals = self.__goals
+        level.__goals_mask = self.__goals_mask
+        level.__crates = tuple(crates)
+        level.__players = tuple(players)
+        level.__floor = self.__floor
+        return level
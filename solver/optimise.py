@@ -0,0 +1,254 @@
+import json
+import sys
+from argparse import ArgumentParser
+from heapq import heappush, heappop
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+from solver.analysis import UNREACHABLE, get_map_analysis
+from solver.heuristics import CrateMatching
+from solver.level import Level, DIRECTIONS, DIRECTION_TO_MOVE, MOVE_TO_DIRECTION
+from solver.solver import PUSH_COST, SearchBudget, SearchLimitReached, Solution, apply_move
+
+# The most moves of a solution re-solved at once
+WINDOW_MOVES = 40
+
+# The most nodes expanded re-solving a single window, after which the window is left as it is
+WINDOW_NODES = 20000
+
+# The most times to go over the whole solution, stopping early once a pass finds nothing shorter
+PASSES = 3
+
+# A position in a game, as the cells of the players and the crates as a bitboard
+_State = Tuple[Tuple[int, ...], int]
+
+
+def optimise(custom_map: List[List[str]], moves: str, budget: Optional[SearchBudget] = None,
+             window: int = WINDOW_MOVES) -> Solution:
+    """
+    Shorten a solution to a map. See optimise_level.
+    :param custom_map: the map definition, in the same format as read by read_map
+    :param moves: the solution in LURD notation, where the case of the letters is ignored
+    :param budget: limits on the work done, or None to carry on until nothing more can be shortened
+    :param window: the most moves to re-solve at once
+    :return: the shortened solution
+    :raises ValueError: if the moves do not solve the map
+    """
+    return optimise_level(Level(custom_map), moves, budget, window)
+
+
+def optimise_level(level: Level, moves: str, budget: Optional[SearchBudget] = None,
+                   window: int = WINDOW_MOVES) -> Solution:
+    """
+    Shorten a solution to a level, such as a replay of a human solving it, by first cutting out any moves that
+    come back to a position seen before, then finding the fewest pushes and moves between the two ends of each
+    window of the solution in turn. Windows overlap, so improvements can carry across their edges. A shorter
+    window never has more pushes, so the solution never gets worse, but it is not always the best possible.
+
+    If the budget runs out, the solution is returned as far as it has been shortened.
+    :param level: the level
+    :param moves: the solution in LURD notation, where the case of the letters is ignored
+    :param budget: limits on the work done, or None to carry on until nothing more can be shortened
+    :param window: the most moves to re-solve at once
+    :return: the shortened solution
+    :raises ValueError: if the moves do not solve the level
+    """
+    budget = budget or SearchBudget()
+    if any(move.lower() not in MOVE_TO_DIRECTION for move in moves):
+        raise ValueError("Moves must be written in LURD notation")
+    moves = moves.lower()
+    states = _replay(level, moves)
+    if not level.is_solved(states[-1][1]):
+        raise ValueError("The moves do not solve the level")
+
+    moves, states = _cut_loops(moves, states)
+    try:
+        for _ in range(PASSES):
+            improved = False
+            start = 0
+            while start < len(moves):
+                finish = min(start + window, len(moves))
+                limit = _pushes(level, moves[start:finish], states[start]) * PUSH_COST + finish - start
+                shorter = _shortest_path(level, states[start], states[finish], limit, budget)
+                if shorter is not None:
+                    moves = moves[:start] + shorter + moves[finish:]
+                    states = states[:start] + _replay(level, shorter, states[start]) + states[finish + 1:]
+                    improved = True
+                start += max(1, window // 2)
+            if not improved:
+                break
+    except SearchLimitReached:
+        pass
+
+    pushes = _pushes(level, moves, states[0])
+    letters = "".join(move.upper() if before[1] != after[1] else move
+                      for move, before, after in zip(moves, states, states[1:]))
+    return Solution(letters, pushes, budget.nodes_expanded)
+
+
+def _replay(level: Level, moves: str, state: Optional[_State] = None) -> List[_State]:
+    """
+    :return: the state before any moves, and after each of the moves
+    """
+    players, crates = state or (tuple(level.players), level.crates_mask(level.crates))
+    states = [(players, crates)]
+    for move in moves:
+        players, crates, _ = apply_move(level, players, crates, level.offset(MOVE_TO_DIRECTION[move]))
+        states.append((players, crates))
+    return states
+
+
+def _cut_loops(moves: str, states: List[_State]) -> Tuple[str, List[_State]]:
+    """
+    Remove the moves between visits to the same state, including moves into walls which change nothing
+    """
+    kept_moves = []
+    kept_states = [states[0]]
+    index = {states[0]: 0}
+    for move, state in zip(moves, states[1:]):
+        if state in index:
+            earlier = index[state]
+            for dropped in kept_states[earlier + 1:]:
+                del index[dropped]
+            del kept_states[earlier + 1:]
+            del kept_moves[earlier:]
+        else:
+            index[state] = len(kept_states)
+            kept_states.append(state)
+            kept_moves.append(move)
+    return "".join(kept_moves), kept_states
+
+
+def _pushes(level: Level, moves: str, state: _State) -> int:
+    """
+    :return: the number of times a crate moves one square during the moves
+    """
+    players, crates = state
+    pushes = 0
+    for move in moves:
+        players, crates, pushed = apply_move(level, players, crates, level.offset(MOVE_TO_DIRECTION[move]))
+        pushes += pushed
+    return pushes
+
+
+def _shortest_path(level: Level, start: _State, finish: _State, limit: int,
+                   budget: SearchBudget) -> Optional[str]:
+    """
+    Search move by move for the fewest pushes then moves from one exact state to another
+    :return: the moves, or None if there is no way cheaper than the limit within WINDOW_NODES nodes
+    """
+    analysis = get_map_analysis(level.definition)
+    walls = level.walls
+    offsets = [(DIRECTION_TO_MOVE[d], level.offset(d)) for d in DIRECTIONS]
+    targets = {crate: _distances_to(level, crate) for crate in _cells(finish[1])}
+    matchings: Dict[int, int] = dict()
+
+    def estimate(state: _State) -> int:
+        players, crates = state
+        if crates not in matchings:
+            matchings[crates] = CrateMatching(analysis, _cells(crates), targets).cost
+        if matchings[crates] == UNREACHABLE:
+            return UNREACHABLE
+        # Every move takes a player at most one square closer to where it finishes
+        walk = max(_manhattan(level, player, target) for player, target in zip(players, finish[0]))
+        return matchings[crates] * PUSH_COST + walk
+
+    counter = count()
+    queue = [(estimate(start), 0, next(counter), start)]
+    parents: Dict[_State, Optional[Tuple[_State, str]]] = {start: None}
+    best = {start: 0}
+    nodes_expanded = 0
+    while queue:
+        total, cost, _, state = heappop(queue)
+        if total >= limit or nodes_expanded >= WINDOW_NODES:
+            return None
+        if cost > best[state]:
+            continue
+        nodes_expanded += 1
+        budget.spend()
+
+        if state == finish:
+            moves = []
+            while parents[state] is not None:
+                state, move = parents[state]
+                moves.append(move)
+            return "".join(reversed(moves))
+
+        players, crates = state
+        for move, offset in offsets:
+            if all(walls[player + offset] for player in players):
+                continue
+            new_players, new_crates, pushes = apply_move(level, players, crates, offset)
+            new_state = (new_players, new_crates)
+            new_cost = cost + pushes * PUSH_COST + 1
+            if new_players == players or best.get(new_state, UNREACHABLE * PUSH_COST) <= new_cost:
+                continue
+            new_estimate = estimate(new_state)
+            if new_estimate >= UNREACHABLE:
+                continue
+            best[new_state] = new_cost
+            parents[new_state] = (state, move)
+            heappush(queue, (new_cost + new_estimate, new_cost, next(counter), new_state))
+    return None
+
+
+def _distances_to(level: Level, target: int) -> List[int]:
+    """
+    :return: the fewest pushes to move a crate from every cell to the target ignoring other crates,
+    or UNREACHABLE if it can never get there
+    """
+    walls = level.walls
+    offsets = list(level.offsets.values())
+    distances = [UNREACHABLE] * level.size
+    distances[target] = 0
+    queue = [target]
+    for cell in queue:
+        for offset in offsets:
+            # A crate on "previous" can be pushed onto "cell" if there is room behind it to push from
+            previous = cell - offset
+            if walls[previous] or walls[previous - offset] or distances[previous] != UNREACHABLE:
+                continue
+            distances[previous] = distances[cell] + 1
+            queue.append(previous)
+    return distances
+
+
+def _manhattan(level: Level, first: int, second: int) -> int:
+    stride = level.stride
+    return abs(first % stride - second % stride) + abs(first // stride - second // stride)
+
+
+def _cells(mask: int) -> List[int]:
+    return [cell for cell in range(mask.bit_length()) if mask >> cell & 1]
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """
+    Shorten a solution from the command line, and write the result as JSON
+    :param arguments: the command line arguments, or None to use sys.argv
+    :return: the exit code
+    """
+    from maps.level_pack import read_level_pack
+
+    parser = ArgumentParser(prog="python -m solver.optimise", description="Shorten a solution to a level")
+    parser.add_argument("pack", help="level pack file, with levels separated by blank lines")
+    parser.add_argument("moves", help="the solution in LURD notation")
+    parser.add_argument("--index", type=int, default=0, help="the index of the level in the pack")
+    parser.add_argument("--window", type=int, default=WINDOW_MOVES, help="the most moves to re-solve at once")
+    parser.add_argument("--seconds", type=float, help="time limit")
+    options = parser.parse_args(arguments)
+
+    definition = read_level_pack(options.pack)[options.index]
+    try:
+        solution = optimise(definition, options.moves, SearchBudget(options.seconds), options.window)
+    except ValueError as e:
+        parser.error(str(e))
+    report = {"moves": solution.moves, "length": len(solution.moves), "pushes": solution.pushes,
+              "original_length": len(options.moves), "nodes_expanded": solution.nodes_expanded}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
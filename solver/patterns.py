@@ -0,0 +1,261 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from argparse import ArgumentParser
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from solver.analysis import MapAnalysis, UNREACHABLE, get_map_analysis
+from solver.level import Level, WALL, GOAL
+
+# Pattern databases are files named after their level's walls and goals, with this suffix
+PATTERN_SUFFIX = ".pdb"
+
+# The file starts with these bytes, the format version and the number of cells in the table
+MAGIC = b"SKPD"
+VERSION = 1
+_HEADER = struct.Struct("<4sHH")
+
+# Stored for pairs of cells which crates can never both be pushed from onto goals
+NO_PATTERN = 255
+
+# Pair costs are stored in a byte, so larger costs are cut down to this, which is still a lower bound
+_LARGEST_COST = NO_PATTERN - 1
+
+# Used in the cell lookup for cells without a row in the table
+_NO_INDEX = -1
+
+
+class PatternDatabase:
+    """
+    The fewest pushes a single player needs to put every pair of crates on goals, ignoring the other crates,
+    read from a file written by write_pattern_database. The file is memory mapped, so solvers in different
+    processes share a single copy of it in the page cache.
+
+    Two crates can get in each other's way, so a pair often needs more pushes than its crates do on their own.
+    Pushes of different crates are different pushes, so for any way of splitting crates into pairs the sum of
+    the pair costs is a lower bound on the pushes to solve the level.
+    """
+    def __init__(self, analysis: MapAnalysis, path: str):
+        level = analysis.level
+        with open(path, "rb") as file:
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size = _HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} pattern database")
+
+        cells = array("H")
+        cells.frombytes(self.__map[_HEADER.size:_HEADER.size + size * cells.itemsize])
+        self.__index = [_NO_INDEX] * level.size
+        for index, cell in enumerate(cells):
+            if cell >= level.size or level.walls[cell]:
+                raise ValueError(f"{path} is for a different level")
+            self.__index[cell] = index
+        self.__size = size
+        self.__offset = _HEADER.size + size * cells.itemsize
+        if len(self.__map) != self.__offset + size * size:
+            raise ValueError(f"{path} is truncated")
+        self.__distances = analysis.distances
+
+    def pair_cost(self, first: int, second: int) -> int:
+        """
+        :param first: the cell of a crate
+        :param second: the cell of another crate
+        :return: the fewest pushes to put both crates on goals (at most 254), or UNREACHABLE if they never can be
+        """
+        first_index = self.__index[first]
+        second_index = self.__index[second]
+        if first_index == _NO_INDEX or second_index == _NO_INDEX:
+            return UNREACHABLE
+        cost = self.__map[self.__offset + first_index * self.__size + second_index]
+        return UNREACHABLE if cost == NO_PATTERN else cost
+
+    def lower_bound(self, crates: Sequence[int]) -> int:
+        """
+        Pair up the crates which get in each other's way the most, and add up the pair costs
+        :param crates: the cells of the crates
+        :return: a lower bound on the pushes needed to solve the level, or UNREACHABLE if it cannot be solved
+        """
+        distances = self.__distances
+        total = 0
+        for crate in crates:
+            total += distances[crate]
+        if total >= UNREACHABLE:
+            return UNREACHABLE
+
+        # The extra pushes each pair needs over its crates on their own
+        extras = []
+        for first in range(len(crates)):
+            for second in range(first + 1, len(crates)):
+                cost = self.pair_cost(crates[first], crates[second])
+                if cost == UNREACHABLE:
+                    return UNREACHABLE
+                extra = cost - distances[crates[first]] - distances[crates[second]]
+                if extra > 0:
+                    extras.append((extra, first, second))
+
+        paired = set()
+        for extra, first, second in sorted(extras, reverse=True):
+            if first not in paired and second not in paired:
+                total += extra
+                paired.update((first, second))
+        return total
+
+    def close(self):
+        self.__map.close()
+
+
+def pattern_key(level: Level) -> str:
+    """
+    :param level: a level
+    :return: a name for the level's pattern database, which only depends on the walls and goals
+    """
+    rows = ("".join(s if s == WALL else GOAL if GOAL in s else " " for s in row) for row in level.definition)
+    return hashlib.sha1("\n".join(rows).encode()).hexdigest()
+
+
+def build_pattern_database(analysis: MapAnalysis) -> Tuple[List[int], bytearray]:
+    """
+    Work backwards from every pair of goals, pulling crates away from them, to find the pushes needed for each
+    pair of cells. The player walks for free, and pulling two crates in a line at once undoes pushing them both.
+    :param analysis: the analysis of the level
+    :return: the cells with a row in the table, and the table of pair costs with a row and column for each cell
+    """
+    level = analysis.level
+    walls = level.walls
+    offsets = list(level.offsets.values())
+    cells = [cell for cell in level.floor if not analysis.is_dead(cell)]
+    size = len(cells)
+    index = {cell: i for i, cell in enumerate(cells)}
+    floor = list(level.floor)
+
+    # Distances of (first crate, second crate, player) states, with the crates in order of cell
+    best: Dict[Tuple[int, int, int], int] = dict()
+    buckets: List[List[Tuple[int, int, int]]] = [[]]
+    goals = sorted(level.goals)
+    for i, first in enumerate(goals):
+        for second in goals[i + 1:]:
+            for player in floor:
+                if player != first and player != second:
+                    best[(first, second, player)] = 0
+                    buckets[0].append((first, second, player))
+
+    table = bytearray([NO_PATTERN]) * (size * size)
+    distance = 0
+    while distance < len(buckets):
+        bucket = buckets[distance]
+        for state in bucket:
+            if best[state] != distance:
+                continue
+            first, second, player = state
+            pair = index[first] * size + index[second]
+            if table[pair] == NO_PATTERN:
+                table[pair] = table[index[second] * size + index[first]] = min(distance, _LARGEST_COST)
+
+            for offset in offsets:
+                behind = player - offset
+                ahead = player + offset
+                moves = []
+                if not walls[ahead] and ahead != first and ahead != second:
+                    moves.append(((first, second, ahead), 0))
+                if not walls[behind] and behind != first and behind != second:
+                    if ahead in (first, second):
+                        # Pull the crate in front, or both crates if the other is in line behind it
+                        other = second if ahead == first else first
+                        moves.append(((player, other, behind), 1))
+                        if other == ahead + offset:
+                            moves.append(((player, ahead, behind), 2))
+                for (new_first, new_second, new_player), cost in moves:
+                    if new_first > new_second:
+                        new_first, new_second = new_second, new_first
+                    new_state = (new_first, new_second, new_player)
+                    if new_first not in index or new_second not in index:
+                        continue
+                    new_distance = distance + cost
+                    if best.get(new_state, UNREACHABLE) <= new_distance:
+                        continue
+                    best[new_state] = new_distance
+                    while len(buckets) <= new_distance:
+                        buckets.append([])
+                    buckets[new_distance].append(new_state)
+        buckets[distance] = []
+        distance += 1
+    return cells, table
+
+
+def write_pattern_database(analysis: MapAnalysis, path: str):
+    """
+    Build the pattern database for a level and write it to a file
+    :param analysis: the analysis of the level
+    :param path: the path of the file
+    :return: nothing
+    """
+    cells, table = build_pattern_database(analysis)
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(cells)))
+        file.write(array("H", cells).tobytes())
+        file.write(table)
+
+
+_loaded: Dict[str, Optional[PatternDatabase]] = dict()
+
+
+def load_pattern_database(directory: str, level: Level) -> Optional[PatternDatabase]:
+    """
+    Load the pattern database for a level, which is only read the first time it is asked for in each process
+    :param directory: the directory the pattern databases were written to
+    :param level: the level
+    :return: the pattern database, or None if it has not been built
+    """
+    path = os.path.join(directory, pattern_key(level) + PATTERN_SUFFIX)
+    if path not in _loaded:
+        analysis = get_map_analysis(level.definition)
+        _loaded[path] = PatternDatabase(analysis, path) if os.path.exists(path) else None
+    return _loaded[path]
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """
+    Build pattern databases from the command line
+    :param arguments: the command line arguments, or None to use sys.argv
+    :return: the exit code
+    """
+    from maps.level_pack import read_level_pack
+
+    parser = ArgumentParser(prog="python -m solver.patterns", description="Build pattern databases for levels")
+    parser.add_argument("packs", nargs="*", help="level pack files, with levels separated by blank lines")
+    parser.add_argument("--all", action="store_true", help="build for every level in maps.maps.MAPS")
+    parser.add_argument("--directory", default="patterns", help="directory to write the pattern databases to")
+    options = parser.parse_args(arguments)
+
+    definitions = []
+    if options.all:
+        from maps.maps import MAPS
+        definitions.extend(MAPS)
+    for pack in options.packs:
+        definitions.extend(read_level_pack(pack))
+    if not definitions:
+        parser.error("nothing to build, give --all or some level packs")
+
+    # Levels with more than one player are solved one area at a time when possible, which are levels of their own
+    levels = []
+    for definition in definitions:
+        level = Level(definition)
+        levels.append(level)
+        if len(level.players) > 1:
+            areas = [area for area in level.areas() if any(player in area for player in level.players)]
+            levels.extend(level.restricted_to(area) for area in areas)
+
+    os.makedirs(options.directory, exist_ok=True)
+    for level in levels:
+        path = os.path.join(options.directory, pattern_key(level) + PATTERN_SUFFIX)
+        if not os.path.exists(path):
+            write_pattern_database(get_map_analysis(level.definition), path)
+            print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
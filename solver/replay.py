@@ -0,0 +1,173 @@
+import sys
+from argparse import ArgumentParser
+from array import array
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from solver.level import Level, WALL, FLOOR, PLAYER, CRATE, GOAL, CRATE_ON_GOAL, PLAYER_ON_GOAL, MOVE_TO_DIRECTION
+from solver.solver import apply_move
+
+# What is on each cell of the board while replaying with a single player
+_EMPTY = 0
+_WALL = 1
+_CRATE = 2
+
+
+class Replay(NamedTuple):
+    """
+    The result of replaying moves on a level.
+    If a move could not be made, the replay stops there: steps is the number of moves made before it, and the
+    players and crates are where they were before it.
+    """
+    valid: bool
+    steps: int
+    players: Tuple[int, ...]
+    crates: Tuple[int, ...]
+    solved: bool
+    # The number of times a crate moved one square on each step
+    pushes: array
+
+
+def replay(custom_map: List[List[str]], moves: str, check_case: bool = True) -> Replay:
+    """
+    Replay moves on a map. See replay_level.
+    :param custom_map: the map definition, in the same format as read by read_map
+    :param moves: the moves in LURD notation
+    :param check_case: whether an upper case move must push a crate and a lower case move must not
+    :return: the replay
+    """
+    return replay_level(Level(custom_map), moves, check_case)
+
+
+def replay_level(level: Level, moves: str, check_case: bool = True) -> Replay:
+    """
+    Replay moves on a level without the app container, following the same rules as the game.
+    A move is invalid if it is not in LURD notation, if no player could move, or if its case is checked and
+    does not match whether it pushed a crate. Levels with a single player are replayed on a flat board, which
+    is many times faster than moving pieces around a grid.
+    :param level: the level
+    :param moves: the moves in LURD notation
+    :param check_case: whether an upper case move must push a crate and a lower case move must not
+    :return: the replay
+    """
+    if len(level.players) == 1:
+        return _replay_single(level, moves, check_case)
+
+    players = level.players
+    crates = level.crates_mask(level.crates)
+    pushes = array("H")
+    valid = True
+    for move in moves:
+        direction = MOVE_TO_DIRECTION.get(move.lower())
+        if direction is None:
+            valid = False
+            break
+        new_players, new_crates, pushed = apply_move(level, players, crates, level.offset(direction))
+        if new_players == players or (check_case and move.isupper() != (pushed > 0)):
+            valid = False
+            break
+        players, crates = new_players, new_crates
+        pushes.append(pushed)
+    return Replay(valid, len(pushes), players, _cells(crates), level.is_solved(crates), pushes)
+
+
+def _replay_single(level: Level, moves: str, check_case: bool) -> Replay:
+    board = bytearray(_WALL if wall else _EMPTY for wall in level.walls)
+    for crate in level.crates:
+        board[crate] = _CRATE
+    offsets = {}
+    for move, direction in MOVE_TO_DIRECTION.items():
+        offsets[move] = offsets[move.upper()] = level.offset(direction)
+    # Without checking case, every letter can push
+    pushing = set(offsets) if not check_case else {move for move in offsets if move.isupper()}
+
+    player = level.players[0]
+    pushes = array("H", bytes(2 * len(moves)))
+    valid = True
+    step = 0
+    for move in moves:
+        offset = offsets.get(move)
+        if offset is None:
+            valid = False
+            break
+        target = player + offset
+        contents = board[target]
+        if contents == _EMPTY:
+            if check_case and move in pushing:
+                valid = False
+                break
+        elif contents == _CRATE:
+            if move not in pushing:
+                valid = False
+                break
+            end = target + offset
+            while board[end] == _CRATE:
+                end += offset
+            if board[end] != _EMPTY:
+                valid = False
+                break
+            # Shuffling a line of crates along is the same as moving the first crate to the end
+            board[target] = _EMPTY
+            board[end] = _CRATE
+            pushes[step] = (end - target) // offset
+        else:
+            valid = False
+            break
+        player = target
+        step += 1
+
+    del pushes[step:]
+    crates = tuple(cell for cell in level.floor if board[cell] == _CRATE)
+    solved = all(crate in level.goals for crate in crates)
+    return Replay(valid, step, (player,), crates, solved, pushes)
+
+
+def position_map(level: Level, players: Sequence[int], crates: Sequence[int]) -> List[List[str]]:
+    """
+    Write a position part way through a game as a map definition, such as the end of a replay
+    :param level: the level
+    :param players: the cells of the players
+    :param crates: the cells of the crates
+    :return: the map definition, in the same format as read by read_map
+    """
+    definition = [[WALL if string == WALL else GOAL if GOAL in string else FLOOR for string in row]
+                  for row in level.definition]
+    for cells, piece, piece_on_goal in ((players, PLAYER, PLAYER_ON_GOAL), (crates, CRATE, CRATE_ON_GOAL)):
+        for cell in cells:
+            coordinate = level.coordinate(cell)
+            on_goal = definition[coordinate.y][coordinate.x] == GOAL
+            definition[coordinate.y][coordinate.x] = piece_on_goal if on_goal else piece
+    return definition
+
+
+def _cells(mask: int) -> Tuple[int, ...]:
+    return tuple(cell for cell in range(mask.bit_length()) if mask >> cell & 1)
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """
+    Check a solution from the command line
+    :param arguments: the command line arguments, or None to use sys.argv
+    :return: 0 if the moves are valid and solve the level, otherwise 1
+    """
+    from maps.level_pack import read_level_pack
+    from maps.xsb import XSB_LETTERS
+
+    parser = ArgumentParser(prog="python -m solver.replay", description="Replay moves on a level")
+    parser.add_argument("pack", help="level pack file, with levels separated by blank lines")
+    parser.add_argument("moves", help="the moves in LURD notation")
+    parser.add_argument("--index", type=int, default=0, help="the index of the level in the pack")
+    parser.add_argument("--ignore-case", action="store_true", help="allow any move to push")
+    options = parser.parse_args(arguments)
+
+    level = Level(read_level_pack(options.pack)[options.index])
+    result = replay_level(level, options.moves, not options.ignore_case)
+    print(f"{'valid' if result.valid else 'invalid'} after {result.steps} moves and {sum(result.pushes)} pushes, "
+          f"{'solved' if result.solved else 'not solved'}")
+    letters = {string: letter for letter, string in XSB_LETTERS.items() if letter not in "-_"}
+    for row in position_map(level, result.players, result.crates):
+        print("".join(letters[string] for string in row))
+    return 0 if result.valid and result.solved else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection, wait
+from time import monotonic, perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from maps.level_pack import read_level_pack
+from solver.optimise import optimise as optimise_solution
+from solver.solver import SearchBudget, SearchLimitReached, solve
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where memory is neither limited nor measured
+    resource = None
+
+# How often to check for levels which have run too long, in seconds
+POLL_SECONDS = 0.5
+
+# Extra time a level is given to stop by itself before it is cancelled, in seconds
+GRACE_SECONDS = 5.0
+
+
+def solve_entry(definition: List[List[str]], seconds: Optional[float], nodes: Optional[int],
+                memory: Optional[int], macros: bool = False, patterns: Optional[str] = None,
+                visited_memory: Optional[int] = None, bidirectional: bool = False, optimise: bool = False) -> Dict:
+    """
+    Solve a single level, in a worker process
+    :param definition: the map definition
+    :param seconds: the time allowed for the search, or None for no limit
+    :param nodes: the nodes the search can expand, or None for no limit
+    :param memory: the memory the worker can use in megabytes, or None for no limit
+    :param macros: True to search with macro pushes, see solve_level
+    :param patterns: the directory of pattern databases, or None to not use them
+    :param visited_memory: the memory the visited states can use in megabytes before they are written to disk,
+    or None for no limit
+    :param bidirectional: True to search from both ends, see solve_level
+    :param optimise: True to shorten the solution found, see optimise_level
+    :return: the report for the level
+    """
+    if resource is not None and memory is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = memory * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    report = {"status": "solved", "moves": None, "length": None, "pushes": None, "nodes_expanded": None}
+    budget = SearchBudget(seconds, nodes, None if visited_memory is None else visited_memory * 1024 * 1024)
+    start = perf_counter()
+    try:
+        solution = solve(definition, budget, macros, patterns, bidirectional)
+        if solution is not None and optimise:
+            solution = optimise_solution(definition, solution.moves, budget)
+        if solution is None:
+            report["status"] = "unsolvable"
+        else:
+            report.update(moves=solution.moves, length=len(solution.moves), pushes=solution.pushes)
+    except SearchLimitReached as e:
+        report["status"] = e.reason
+    except MemoryError:
+        report["status"] = "memory limit"
+    except ValueError as e:
+        report["status"] = f"invalid: {e}"
+    report["nodes_expanded"] = budget.nodes_expanded
+    report["wall_time"] = perf_counter() - start
+    report["peak_rss_kb"] = _peak_rss_kb()
+    report["visited_peak_kb"] = budget.visited_memory // 1024
+    report["spilled_kb"] = budget.spilled // 1024
+    return report
+
+
+def solve_batch(levels: List[Tuple[str, int, List[List[str]]]], workers: Optional[int] = None,
+                seconds: Optional[float] = None, nodes: Optional[int] = None,
+                memory: Optional[int] = None, macros: bool = False, patterns: Optional[str] = None,
+                visited_memory: Optional[int] = None, bidirectional: bool = False,
+                optimise: bool = False) -> List[Dict]:
+    """
+    Solve many levels in parallel, in a new worker process for each level. Each level's search stops itself
+    when it runs out of time or nodes, and the process of any level still running well past its time limit,
+    counted from when it started solving, is stopped so the next level can take its place.
+    :param levels: tuples of where each level came from, its index there, and its map definition
+    :param workers: the number of worker processes, or None for one per CPU
+    :param seconds: the time allowed for each level, or None for no limit
+    :param nodes: the nodes each level's search can expand, or None for no limit
+    :param memory: the memory each worker can use in megabytes, or None for no limit
+    :param macros: True to search with macro pushes, see solve_level
+    :param patterns: the directory of pattern databases, or None to not use them
+    :param visited_memory: the memory each level's visited states can use in megabytes before they are written
+    to disk, or None for no limit
+    :param bidirectional: True to search from both ends, see solve_level
+    :param optimise: True to shorten the solutions found, see optimise_level
+    :return: a report for every level, in the same order
+    """
+    workers = workers or os.cpu_count() or 1
+    queued = deque(range(len(levels)))
+    # The processes solving levels, by the end of the pipe their reports come back on
+    running: Dict[Connection, Tuple[int, Process]] = dict()
+    # When each running level's worker said it had started solving
+    started: Dict[Connection, float] = dict()
+    reports: Dict[int, Dict] = dict()
+
+    def finish(receiver: Connection):
+        _, process = running.pop(receiver)
+        started.pop(receiver, None)
+        receiver.close()
+        process.join()
+
+    try:
+        while queued or running:
+            # A fresh process for every level makes the peak memory belong to that level alone
+            while queued and len(running) < workers:
+                position = queued.popleft()
+                receiver, sender = Pipe(duplex=False)
+                process = Process(target=_solve_in_process,
+                                  args=(sender, (levels[position][2], seconds, nodes, memory, macros, patterns,
+                                                 visited_memory, bidirectional, optimise)))
+                process.start()
+                sender.close()
+                running[receiver] = (position, process)
+
+            for receiver in wait(list(running), timeout=POLL_SECONDS):
+                position, process = running[receiver]
+                try:
+                    report = receiver.recv()
+                except EOFError:
+                    # The process ended without a report, such as being killed by the operating system
+                    finish(receiver)
+                    reports[position] = _failed_report(f"error: worker exited with code {process.exitcode}")
+                    continue
+                if report is None:
+                    started[receiver] = monotonic()
+                else:
+                    reports[position] = report
+                    finish(receiver)
+
+            # A search which has not stopped by itself long after its time limit is stuck, so stop its process
+            # to free its place for the levels still queued
+            now = monotonic()
+            for receiver, start in list(started.items()):
+                if seconds is not None and now - start > seconds + GRACE_SECONDS:
+                    position, process = running[receiver]
+                    process.terminate()
+                    finish(receiver)
+                    reports[position] = _failed_report("cancelled", now - start)
+    finally:
+        for receiver, (_, process) in list(running.items()):
+            process.terminate()
+            finish(receiver)
+
+    results = []
+    for position, (source, index, _) in enumerate(levels):
+        results.append(dict(source=source, index=index, **reports[position]))
+    return results
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    """
+    Solve levels from the command line, and write a JSON report
+    :param arguments: the command line arguments, or None to use sys.argv
+    :return: the exit code
+    """
+    parser = ArgumentParser(prog="python -m solver.solve", description="Solve Sokoban levels in parallel")
+    parser.add_argument("packs", nargs="*", help="level pack files, with levels separated by blank lines")
+    parser.add_argument("--all", action="store_true", help="solve every level in maps.maps.MAPS")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="time limit for each level")
+    parser.add_argument("--nodes", type=int, help="limit on nodes expanded for each level")
+    parser.add_argument("--memory", type=int, default=2048, help="memory limit for each level in megabytes")
+    parser.add_argument("--visited-memory", type=int,
+                        help="memory for each level's visited states in megabytes, after which they are written to "
+                             "a temporary file")
+    parser.add_argument("--macros", action="store_true",
+                        help="push crates through tunnels and into goal rooms in single steps, which is faster "
+                             "but may not find the fewest pushes")
+    parser.add_argument("--bidirectional", action="store_true",
+                        help="push forwards from the start and pull backwards from the end until the searches meet, "
+                             "which may not find the fewest pushes")
+    parser.add_argument("--optimise", action="store_true",
+                        help="shorten each solution found, which is most useful with --macros or --bidirectional")
+    parser.add_argument("--patterns", help="directory of pattern databases built by python -m solver.patterns")
+    parser.add_argument("--report", default="-", help="file to write the JSON report to (default: stdout)")
+    options = parser.parse_args(arguments)
+
+    levels = []
+    if options.all:
+        from maps.maps import MAPS
+        levels.extend(("MAPS", index, definition) for index, definition in enumerate(MAPS))
+    for pack in options.packs:
+        levels.extend((pack, index, definition) for index, definition in enumerate(read_level_pack(pack)))
+    if not levels:
+        parser.error("nothing to solve, give --all or some level packs")
+
+    start = perf_counter()
+    results = solve_batch(levels, options.workers, options.seconds, options.nodes, options.memory,
+                          options.macros, options.patterns, options.visited_memory,
+                          options.bidirectional, options.optimise)
+    statuses = [result["status"] for result in results]
+    report = {
+        "levels": results,
+        "summary": {
+            "levels": len(results),
+            "solved": statuses.count("solved"),
+            "unsolvable": statuses.count("unsolvable"),
+            "unfinished": len(results) - statuses.count("solved") - statuses.count("unsolvable"),
+            "wall_time": perf_counter() - start,
+        },
+    }
+
+    if options.report == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(options.report, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+def _solve_in_process(sender: Connection, arguments: Tuple):
+    """
+    Solve a level in a worker process, sending None as soon as it starts and then the report
+    :param sender: the end of the pipe to send on
+    :param arguments: the arguments for solve_entry
+    :return: nothing
+    """
+    sender.send(None)
+    try:
+        report = solve_entry(*arguments)
+    except Exception as e:
+        report = _failed_report(f"error: {e}")
+    sender.send(report)
+    sender.close()
+
+
+def _failed_report(status: str, wall_time: Optional[float] = None) -> Dict:
+    return {"status": status, "moves": None, "length": None, "pushes": None, "nodes_expanded": None,
+            "wall_time": wall_time, "peak_rss_kb": None, "visited_peak_kb": None, "spilled_kb": None}
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes but macOS reports bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,830 @@
+from array import array
+from heapq import heappush, heappop
+from itertools import count
+from time import monotonic
+from typing import List, NamedTuple, Optional, Tuple, Dict, FrozenSet
+
+from solver.analysis import GoalRoom, MapAnalysis, UNREACHABLE, get_map_analysis
+from solver.heuristics import CrateMatching, minimum_matching_cost
+from solver.level import Level, DIRECTIONS, DIRECTION_TO_MOVE, MOVE_TO_DIRECTION
+from solver.patterns import PatternDatabase, load_pattern_database
+from solver.visited import VisitedTable
+
+# When searching move by move, the cost of a state is (pushes * PUSH_COST) + moves, so that
+# the fewest pushes is always preferred and the fewest moves is used to break ties
+PUSH_COST = 1 << 20
+
+# Values used in a scratch copy of the walls when flood filling where the player can walk
+_WALL = 1
+_VISITED = 2
+_CRATE = 3
+
+
+class Solution(NamedTuple):
+    """
+    A solution to a level.
+    The moves are in LURD notation, where upper case letters are moves which pushed at least one crate.
+    The pushes are the number of times any crate moved by one square.
+    """
+    moves: str
+    pushes: int
+    nodes_expanded: int
+
+
+class SearchLimitReached(Exception):
+    """
+    Raised when a search uses up its budget before finding a solution or proving there is none
+    """
+    def __init__(self, reason: str, nodes_expanded: int):
+        super().__init__(f"Search stopped after {nodes_expanded} nodes: {reason}")
+        self.reason = reason
+        self.nodes_expanded = nodes_expanded
+
+
+class SearchBudget:
+    """
+    Limits on how much work a search can do. Searches spend the budget as they expand nodes, and raise
+    SearchLimitReached once it runs out. A budget can be shared by several searches for the same level.
+
+    The memory is not a limit, but how much the visited states can take before the search starts writing them
+    to disk (see VisitedTable). The most memory they took, and how much was written to disk, are recorded here.
+    """
+    # How many nodes to expand between looking at the clock
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, seconds: Optional[float] = None, nodes: Optional[int] = None,
+                 memory: Optional[int] = None):
+        """
+        :param seconds: the wall time allowed from now, or None for no limit
+        :param nodes: the number of nodes that can be expanded, or None for no limit
+        :param memory: the bytes the visited states can use before they are written to disk, or None for no limit
+        """
+        self.__deadline = None if seconds is None else monotonic() + seconds
+        self.__nodes = nodes
+        self.__memory = memory
+        self.__nodes_expanded = 0
+        self.__visited_memory = 0
+        self.__spilled = 0
+        self.__cancelled = False
+
+    @property
+    def nodes_expanded(self) -> int:
+        return self.__nodes_expanded
+
+    @property
+    def memory(self) -> Optional[int]:
+        return self.__memory
+
+    @property
+    def visited_memory(self) -> int:
+        """ The most bytes the visited states of any search using this budget took in memory """
+        return self.__visited_memory
+
+    @property
+    def spilled(self) -> int:
+        """ The total bytes of visited states written to disk by searches using this budget """
+        return self.__spilled
+
+    def record_visited(self, visited: VisitedTable):
+        """
+        Record the memory used by the visited states of a search
+        :param visited: the visited states
+        :return: nothing
+        """
+        self.__visited_memory = max(self.__visited_memory, visited.peak_memory)
+        self.__spilled += visited.spilled
+
+    def cancel(self):
+        """
+        Stop any search using this budget the next time it expands a node. This can be called from another thread.
+        :return: nothing
+        """
+        self.__cancelled = True
+
+    def spend(self):
+        """
+        Record a node being expanded
+        :return: nothing
+        """
+        self.__nodes_expanded += 1
+        if self.__cancelled:
+            raise SearchLimitReached("cancelled", self.__nodes_expanded)
+        if self.__nodes is not None and self.__nodes_expanded > self.__nodes:
+            raise SearchLimitReached("node limit", self.__nodes_expanded)
+        if (self.__deadline is not None and self.__nodes_expanded % self.CLOCK_INTERVAL == 0
+                and monotonic() > self.__deadline):
+            raise SearchLimitReached("time limit", self.__nodes_expanded)
+
+
+def lower_bound(analysis: MapAnalysis, crates: List[int]) -> int:
+    """
+    Estimate the fewest pushes needed to solve from a position without overestimating.
+    Every crate needs pushing onto a different goal, so this is the cheapest way of assigning them.
+    :param analysis: the analysis of the level being solved
+    :param crates: the cells containing crates
+    :return: the lower bound on the number of pushes, or UNREACHABLE if the crates can never all reach goals
+    """
+    return minimum_matching_cost(analysis, crates)
+
+
+def iterate_cells(mask: int):
+    """
+    Iterate over the cells set in a bitboard
+    :param mask: the bitboard
+    :return: a generator of the cells, lowest first
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def apply_move(level: Level, players: Tuple[int, ...], crates: int, offset: int) -> Tuple[Tuple[int, ...], int, int]:
+    """
+    Move every player by the given offset following the rules of the game. Players move at the same time,
+    starting with the one furthest in the direction of movement. A player can push a line of crates as long
+    as the square beyond the line is not a wall or another player.
+    :param level: the level being played
+    :param players: the cells of the players
+    :param crates: the crates as a bitboard
+    :param offset: the offset of the direction to move in
+    :return: the new players, new crates, and the number of times a crate moved one square
+    """
+    walls = level.walls
+    new_players = list(players)
+    pushes = 0
+    for index in sorted(range(len(players)), key=lambda i: -players[i] * offset):
+        target = players[index] + offset
+        end = target
+        while crates >> end & 1:
+            end += offset
+        if walls[end] or end in new_players:
+            continue
+        if end != target:
+            # Shuffling a line of crates along is the same as moving the first crate to the end
+            crates ^= (1 << target) | (1 << end)
+            pushes += (end - target) // offset
+        new_players[index] = target
+
+    return tuple(new_players), crates, pushes
+
+
+def walk_path(level: Level, start: int, finish: int, crates: int) -> Optional[str]:
+    """
+    Find the shortest walk for a single player between two cells without pushing any crates
+    :param level: the level being played
+    :param start: the cell the player starts on
+    :param finish: the cell the player needs to reach
+    :param crates: the crates as a bitboard
+    :return: the moves in LURD notation, or None if the player cannot reach the finish
+    """
+    if start == finish:
+        return ""
+
+    walls = level.walls
+    previous: Dict[int, Tuple[int, str]] = {start: (start, "")}
+    queue = [start]
+    for cell in queue:
+        for direction in DIRECTIONS:
+            neighbour = cell + level.offset(direction)
+            if neighbour in previous or walls[neighbour] or crates >> neighbour & 1:
+                continue
+            previous[neighbour] = (cell, DIRECTION_TO_MOVE[direction])
+            if neighbour == finish:
+                moves = []
+                while neighbour != start:
+                    neighbour, move = previous[neighbour]
+                    moves.append(move)
+                return "".join(reversed(moves))
+            queue.append(neighbour)
+    return None
+
+
+def solve(custom_map: List[List[str]], budget: Optional[SearchBudget] = None,
+          macros: bool = False, patterns: Optional[str] = None,
+          bidirectional: bool = False) -> Optional[Solution]:
+    """
+    Find a solution to a map with the fewest pushes. This does not need pygame or an app container.
+    :param custom_map: the map definition, in the same format as read by read_map
+    :param budget: limits on the search, or None to search until finished
+    :param macros: True to use macro pushes (see solve_level)
+    :param patterns: the directory of pattern databases (see solve_level), or None to not use them
+    :param bidirectional: True to search from both ends (see solve_level)
+    :return: the solution, or None if the map cannot be solved
+    :raises SearchLimitReached: if the budget runs out
+    """
+    return solve_level(Level(custom_map), budget, macros, patterns, bidirectional)
+
+
+def solve_level(level: Level, budget: Optional[SearchBudget] = None,
+                macros: bool = False, patterns: Optional[str] = None,
+                bidirectional: bool = False) -> Optional[Solution]:
+    """
+    Find a solution to a level with the fewest pushes, using A* with an admissible heuristic (see lower_bound).
+
+    All players move together, so when there is more than one player each area of the level with a player
+    in it is solved on its own, and the solutions are then woven together into a single list of moves.
+    If that is not possible, the whole level is searched move by move instead.
+
+    With macros, a crate pushed into a tunnel is pushed straight through it and a crate pushed into a goal
+    room is pushed straight onto a goal, each as a single step of the search (see MacroPushes). This searches
+    far fewer states on levels with tunnels and goal rooms, but the solution may no longer have the fewest
+    pushes. Macros are not used when the level has to be searched move by move.
+
+    Pattern databases built beforehand by solver.patterns give a tighter lower bound when searching over
+    pushes, for levels which have one in the directory.
+
+    Searching bidirectionally pushes forwards from the start and pulls backwards from the solved position at
+    the same time, until the two searches meet. This expands far fewer states on levels with many crates, but
+    the solution may not have the fewest pushes. It needs as many crates as goals, and ignores macros and
+    pattern databases.
+    :param level: the level to solve
+    :param budget: limits on the search, or None to search until finished
+    :param macros: True to use macro pushes
+    :param patterns: the directory of pattern databases, or None to not use them
+    :param bidirectional: True to search from both ends
+    :return: the solution, or None if the level cannot be solved
+    :raises SearchLimitReached: if the budget runs out
+    """
+    budget = budget or SearchBudget()
+    if len(level.crates) > len(level.goals):
+        return None
+    if not level.players:
+        return Solution("", 0, 0) if level.is_solved(level.crates_mask(level.crates)) else None
+
+    analysis = get_map_analysis(level.definition)
+    if any(analysis.is_dead(crate) for crate in level.crates):
+        return None
+
+    # Crates in an area without a player can never move
+    areas = [area for area in level.areas() if any(player in area for player in level.players)]
+    stranded = level.crates_mask(level.crates) & ~level.crates_mask(cell for area in areas for cell in area)
+    if not level.is_solved(stranded):
+        return None
+
+    if len(level.players) == 1:
+        if bidirectional and len(level.crates) == len(level.goals):
+            return _solve_bidirectionally(level, analysis, budget)
+        database = load_pattern_database(patterns, level) if patterns is not None else None
+        if macros:
+            solution = _solve_by_pushes(level, analysis, budget, MacroPushes(level, analysis), database)
+            if solution is not None:
+                return solution
+            # Macros never push crates off the goals of goal rooms, which very rarely makes a level unsolvable
+        return _solve_by_pushes(level, analysis, budget, None, database)
+
+    if all(sum(player in area for player in level.players) == 1 for area in areas):
+        solution = _solve_by_areas(level, areas, budget, macros, patterns, bidirectional)
+        if solution is not None:
+            return solution
+    return _solve_by_moves(level, analysis, budget)
+
+
+class MacroPushes:
+    """
+    Pushes which are always carried on in the same way, found from the tunnels and goal rooms of a level.
+    Once a crate is pushed into a tunnel it is pushed on to the end, as nothing else can happen in the tunnel
+    while it is there. Once a crate is pushed into a goal room it is pushed straight onto one of the room's
+    empty goals, and crates on the goals of goal rooms are never pushed again.
+    """
+    def __init__(self, level: Level, analysis: MapAnalysis):
+        self.__level = level
+        self.__distances = analysis.distances
+        self.__offsets = list(level.offsets.values())
+        self.__tunnels = {1: analysis.horizontal_tunnels, level.stride: analysis.vertical_tunnels}
+        self.__goal_rooms = {cell: room for room in analysis.goal_rooms for cell in room.cells}
+        self.__parked = level.crates_mask(goal for room in analysis.goal_rooms for goal in room.goals)
+
+    @property
+    def parked(self) -> int:
+        """ The goals of goal rooms as a bitboard, where crates are never pushed from """
+        return self.__parked
+
+    def expand(self, crates: int, pusher: int, offset: int) -> List[Tuple[int, Tuple[Tuple[int, int], ...]]]:
+        """
+        :param crates: the crates as a bitboard
+        :param pusher: where the player pushes from, next to a crate with nothing behind it
+        :param offset: the direction of the push
+        :return: for each way the push carries on, where the crate finishes and the pushes (where the
+        player pushes from and the direction) which take it there, starting with the push itself
+        """
+        walls = self.__level.walls
+        tunnel = self.__tunnels[abs(offset)]
+        crate = pusher + offset
+        others = crates ^ (1 << crate)
+        pushes = ((pusher, offset),)
+        end = crate + offset
+        while end in tunnel and end not in self.__level.goals:
+            following = end + offset
+            if walls[following] or others >> following & 1 or self.__distances[following] == UNREACHABLE:
+                break
+            pushes += ((end - offset, offset),)
+            end = following
+
+        room = self.__goal_rooms.get(end)
+        paths = self.__paths_to_goals(others, end, end - offset, room) if room is not None else None
+        if not paths:
+            return [(end, pushes)]
+        return [(goal, pushes + path) for goal, path in paths.items()]
+
+    def __paths_to_goals(self, others: int, start: int, player: int,
+                         room: GoalRoom) -> Dict[int, Tuple[Tuple[int, int], ...]]:
+        """
+        Find the fewest pushes taking a crate to each empty goal in a room, leaving the other crates in place
+        """
+        walls = self.__level.walls
+        # States are the crate and the player, which is always where the crate was before the last push
+        previous: Dict[Tuple[int, int], Optional[tuple]] = {(start, player): None}
+        queue = [(start, player)]
+        paths = dict()
+        for state in queue:
+            crate, player = state
+            if crate in room.goals and crate not in paths:
+                path = []
+                key = state
+                while previous[key] is not None:
+                    key, push = previous[key]
+                    path.append(push)
+                paths[crate] = tuple(reversed(path))
+
+            occupied, _ = _flood_fill(walls, self.__offsets, others | 1 << crate, player)
+            for offset in self.__offsets:
+                destination = crate + offset
+                if occupied[crate - offset] != _VISITED or destination not in room.cells or \
+                        others >> destination & 1:
+                    continue
+                if (destination, crate) not in previous:
+                    previous[(destination, crate)] = (state, (crate - offset, offset))
+                    queue.append((destination, crate))
+        return paths
+
+
+def _flood_fill(walls: bytes, offsets: List[int], crates: int, player: int) -> Tuple[bytearray, List[int]]:
+    """
+    Find where the player can walk
+    :return: a copy of the walls with crates marked _CRATE and the cells the player can reach marked _VISITED,
+    and the list of cells the player can reach
+    """
+    occupied = bytearray(walls)
+    for crate in iterate_cells(crates):
+        occupied[crate] = _CRATE
+    occupied[player] = _VISITED
+    reachable = [player]
+    for cell in reachable:
+        for o in offsets:
+            neighbour = cell + o
+            if not occupied[neighbour]:
+                occupied[neighbour] = _VISITED
+                reachable.append(neighbour)
+    return occupied, reachable
+
+
+def _solve_by_pushes(level: Level, analysis: MapAnalysis, budget: SearchBudget,
+                     macros: Optional[MacroPushes] = None,
+                     database: Optional[PatternDatabase] = None) -> Optional[Solution]:
+    """
+    Search over pushes only, for a single player. Between pushes, the player can walk anywhere it can reach,
+    so states are identified by the crates and the lowest cell the player can reach. On symmetric levels,
+    only one of each set of mirror image states is expanded. With macros, a push of a single crate may carry
+    on as several pushes in one step. With a pattern database, the lower bound is the larger of the matching
+    cost and the pattern database's bound.
+
+    Visited states are kept in a VisitedTable, from the crates packed into bits to the cells the player has
+    been seen in with those crates, partitioned by the lower bound. As the search goes on the lower bounds of
+    the states it expands fall, so partitions with high lower bounds are rarely needed again.
+    """
+    walls = level.walls
+    offsets = list(level.offsets.values())
+    distances = analysis.distances
+    symmetry_group = analysis.symmetry_group
+    parked = macros.parked if macros is not None else 0
+    crates = level.crates_mask(level.crates)
+
+    # Crates are only ever on cells they can be pushed onto a goal from, so the crates pack into a bit for each
+    # of those cells, and the cells the player has been seen in pack into a bit for each floor cell
+    live_cells = [cell for cell in level.floor if not analysis.is_dead(cell)]
+    crate_bits = [0] * level.size
+    for index, cell in enumerate(live_cells):
+        crate_bits[cell] = 1 << index
+    crate_bytes = (len(live_cells) + 7) // 8
+    floor_bits = [0] * level.size
+    for index, cell in enumerate(level.floor):
+        floor_bits[cell] = 1 << index
+    floor_bytes = (len(level.floor) + 7) // 8
+
+    def find_visited(crates: int, bound: int) -> Tuple[bytes, List[Tuple[int, ...]], int]:
+        """
+        Find the packed canonical crates of a state, the symmetries mapping onto them and the cells the player
+        has been seen in with them
+        """
+        if symmetry_group.is_trivial:
+            canonical, permutations = crates, None
+        else:
+            canonical, permutations = symmetry_group.canonical_form(crates)
+        packed = 0
+        for crate in iterate_cells(canonical):
+            packed |= crate_bits[crate]
+        state = packed.to_bytes(crate_bytes, "little")
+        seen = visited.get(bound, state)
+        return state, permutations, 0 if seen is None else int.from_bytes(seen, "little")
+
+    def is_visited(crates: int, player: int, bound: int) -> bool:
+        _, permutations, seen = find_visited(crates, bound)
+        return seen & floor_bits[player if permutations is None else permutations[0][player]] != 0
+
+    # Entries are (estimated cost, -pushes, tie breaker, crates, player, parent, pushes made, matching), where
+    # the parent is the index of the state pushed from in the trail, the pushes made are where the player pushed
+    # from and in which direction, and the matching of crates to goals is updated with each step to give the
+    # lower bound
+    matching = CrateMatching(analysis, level.crates)
+    bound = matching.cost
+    if database is not None and bound != UNREACHABLE:
+        bound = max(bound, database.lower_bound(level.crates))
+    if bound == UNREACHABLE:
+        return None
+    counter = count()
+    queue = [(bound, 0, next(counter), crates, level.players[0], -1, (), matching)]
+    visited = VisitedTable(crate_bytes, floor_bytes, budget.memory)
+    trail = _PushTrail()
+    nodes_expanded = 0
+
+    try:
+        while queue:
+            estimate, negative_pushes, _, crates, player, parent, pushes_made, matching = heappop(queue)
+            bound = estimate + negative_pushes
+            state, permutations, seen = find_visited(crates, bound)
+            if seen & floor_bits[player if permutations is None else permutations[0][player]]:
+                continue
+
+            # Flood fill where the player can walk, and remember every image of it under the symmetries
+            occupied, reachable = _flood_fill(walls, offsets, crates, player)
+            for permutation in permutations or ():
+                for cell in reachable:
+                    seen |= floor_bits[permutation[cell]]
+            if permutations is None:
+                for cell in reachable:
+                    seen |= floor_bits[cell]
+            visited.put(bound, state, seen.to_bytes(floor_bytes, "little"))
+            node = trail.add(parent, pushes_made)
+            nodes_expanded += 1
+            budget.spend()
+
+            if level.is_solved(crates):
+                return _build_push_solution(level, trail.path(node), nodes_expanded)
+
+            pushes = -negative_pushes
+            for cell in reachable:
+                for o in offsets:
+                    target = cell + o
+                    if occupied[target] != _CRATE:
+                        continue
+                    end = target + o
+                    while occupied[end] == _CRATE:
+                        end += o
+                    if occupied[end] == _WALL or distances[end] == UNREACHABLE:
+                        continue
+
+                    if macros is None or end != target + o:
+                        if parked and any(parked >> crate & 1 for crate in range(target, end, o)):
+                            continue
+                        steps = [(end, ((cell, o),), (end - target) // o)]
+                    elif parked >> target & 1:
+                        continue
+                    else:
+                        steps = [(finish, made, len(made)) for finish, made in macros.expand(crates, cell, o)]
+
+                    for finish, made, pushed in steps:
+                        new_crates = crates ^ (1 << target) ^ (1 << finish)
+                        new_player = made[-1][0] + made[-1][1]
+                        new_matching = matching.moved(target, finish)
+                        bound = new_matching.cost
+                        if database is not None and bound != UNREACHABLE:
+                            bound = max(bound, database.lower_bound(list(iterate_cells(new_crates))))
+                        if bound == UNREACHABLE or is_visited(new_crates, new_player, bound):
+                            continue
+                        new_pushes = pushes + pushed
+                        heappush(queue, (new_pushes + bound, -new_pushes, next(counter), new_crates, new_player,
+                                         node, made, new_matching))
+    finally:
+        budget.record_visited(visited)
+        visited.close()
+
+    return None
+
+
+class _PushTrail:
+    """
+    The way to every expanded state in a push search, kept in flat arrays: the index of the state it was
+    reached from, and the pushes made from there as pairs of where the player pushed from and the direction
+    """
+    def __init__(self):
+        self.parents = array("i")
+        self.starts = array("i")
+        self.pushes = array("i")
+
+    def add(self, parent: int, pushes_made: Tuple[Tuple[int, int], ...]) -> int:
+        self.parents.append(parent)
+        self.starts.append(len(self.pushes))
+        for pusher, offset in pushes_made:
+            self.pushes.append(pusher)
+            self.pushes.append(offset)
+        return len(self.parents) - 1
+
+    def path(self, node: int) -> List[Tuple[int, int]]:
+        """
+        :param node: the index of a state
+        :return: the pushes made on the way to the state, from the start
+        """
+        path = []
+        while node != -1:
+            end = self.starts[node + 1] if node + 1 < len(self.starts) else len(self.pushes)
+            pushes = self.pushes[self.starts[node]:end]
+            path.extend(reversed(list(zip(pushes[::2], pushes[1::2]))))
+            node = self.parents[node]
+        path.reverse()
+        return path
+
+
+def _build_push_solution(level: Level, pushes_made: List[Tuple[int, int]], nodes_expanded: int) -> Solution:
+    """
+    Play the pushes from the start, walking the player between each push
+    """
+    moves = []
+    pushes = 0
+    player = level.players[0]
+    crates = level.crates_mask(level.crates)
+    for pusher, offset in pushes_made:
+        moves.append(walk_path(level, player, pusher, crates))
+        direction = next(d for d in DIRECTIONS if level.offset(d) == offset)
+        moves.append(DIRECTION_TO_MOVE[direction].upper())
+        (player,), crates, pushed = apply_move(level, (pusher,), crates, offset)
+        pushes += pushed
+
+    return Solution("".join(moves), pushes, nodes_expanded)
+
+
+def _solve_bidirectionally(level: Level, analysis: MapAnalysis, budget: SearchBudget) -> Optional[Solution]:
+    """
+    Search forwards over pushes from the start and backwards over pulls from the solved position at the same
+    time, expanding a state from each in turn, until a state is reached from both sides. Each side only needs to
+    cover about half of the way, so the searches are much smaller than one search all the way, but the solution
+    may not have the fewest pushes. This needs a crate on every goal at the end, and a single player.
+
+    Pulling a crate is undoing a push, so a line of crates pushed together is undone by pulling the first
+    crates of a line (any number of them) back together.
+    """
+    walls = level.walls
+    offsets = list(level.offsets.values())
+    distances = analysis.distances
+    goals = level.goals_mask
+
+    # Pulls are guided by how far each crate is from the cells the crates start on
+    starts = {crate: _push_distances(level, crate) for crate in level.crates}
+    forward_matching = CrateMatching(analysis, level.crates)
+    if forward_matching.cost == UNREACHABLE:
+        return None
+
+    # Entries are (estimated cost, -pushes, tie breaker, crates, player, parent, push, matching), where
+    # the push is where the player pushed from and in which direction. For pulls, it is the push that undoes
+    # the pull, so the solution is the pushes to the meeting point followed by the pulls in reverse.
+    counter = count()
+    forward = [(forward_matching.cost, 0, next(counter), level.crates_mask(level.crates), level.players[0], -1,
+                None, forward_matching)]
+    backward = []
+    backward_matching = CrateMatching(analysis, sorted(level.goals), starts)
+    covered = bytearray(walls)
+    for player in level.floor:
+        # Every area the player could finish in is a place to start pulling from
+        if covered[player] or goals >> player & 1:
+            continue
+        _, reachable = _flood_fill(walls, offsets, goals, player)
+        for cell in reachable:
+            covered[cell] = 1
+        heappush(backward, (backward_matching.cost, 0, next(counter), goals, player, -1, None, backward_matching))
+
+    # Both searches share a table of the states they have reached, with each side's index in its trail
+    reached: Dict[Tuple[int, int], List[int]] = dict()
+    trails = (_PushTrail(), _PushTrail())
+    nodes_expanded = 0
+
+    while forward and backward:
+        # Expand from whichever side has fewer states waiting, which keeps both searches about as costly
+        side = 0 if len(forward) <= len(backward) else 1
+        queue = (forward, backward)[side]
+        _, negative_pushes, _, crates, player, parent, push, matching = heappop(queue)
+        occupied, reachable = _flood_fill(walls, offsets, crates, player)
+        key = (crates, min(reachable))
+        nodes = reached.setdefault(key, [-1, -1])
+        if nodes[side] != -1:
+            continue
+        nodes[side] = trails[side].add(parent, (push,) if push is not None else ())
+        nodes_expanded += 1
+        budget.spend()
+
+        if nodes[1 - side] != -1:
+            pulls = trails[1].path(nodes[1])
+            pulls.reverse()
+            return _build_push_solution(level, trails[0].path(nodes[0]) + pulls, nodes_expanded)
+
+        pushes = -negative_pushes
+        for cell in reachable:
+            for o in offsets:
+                target = cell + o
+                if occupied[target] != _CRATE:
+                    continue
+                if side == 0:
+                    end = target + o
+                    while occupied[end] == _CRATE:
+                        end += o
+                    if occupied[end] == _WALL or distances[end] == UNREACHABLE:
+                        continue
+                    moves = [(target, end, (end - target) // o, target, (cell, o))]
+                else:
+                    behind = cell - o
+                    if occupied[behind] == _WALL or occupied[behind] == _CRATE:
+                        continue
+                    moves = []
+                    end = target
+                    while occupied[end] == _CRATE:
+                        moves.append((end, cell, (end - cell) // o, behind, (behind, o)))
+                        end += o
+
+                for start, finish, pushed, new_player, new_push in moves:
+                    new_matching = matching.moved(start, finish)
+                    if new_matching.cost == UNREACHABLE:
+                        continue
+                    new_pushes = pushes + pushed
+                    heappush(queue, (new_pushes + new_matching.cost, -new_pushes, next(counter),
+                                     crates ^ (1 << start) ^ (1 << finish), new_player, nodes[side], new_push,
+                                     new_matching))
+
+    return None
+
+
+def _push_distances(level: Level, start: int) -> List[int]:
+    """
+    :param level: the level
+    :param start: the cell a crate starts on
+    :return: the fewest pushes to move the crate from the start to every cell ignoring other crates,
+    or UNREACHABLE if it can never get there
+    """
+    walls = level.walls
+    offsets = list(level.offsets.values())
+    distances = [UNREACHABLE] * level.size
+    distances[start] = 0
+    queue = [start]
+    for cell in queue:
+        for offset in offsets:
+            following = cell + offset
+            if walls[cell - offset] or walls[following] or distances[following] != UNREACHABLE:
+                continue
+            distances[following] = distances[cell] + 1
+            queue.append(following)
+    return distances
+
+
+def _solve_by_areas(level: Level, areas: List[FrozenSet[int]], budget: SearchBudget,
+                    macros: bool, patterns: Optional[str], bidirectional: bool) -> Optional[Solution]:
+    """
+    Solve each area containing a player on its own, then search for moves that carry out every area's
+    pushes in order. Whenever one player pushes, the others must only walk or bump into walls.
+    If the areas can be solved but not woven together this returns None, even if the level can be solved.
+    """
+    plans = []
+    pushes = 0
+    nodes_expanded = 0
+    for area in areas:
+        area_level = level.restricted_to(area)
+        solution = solve_level(area_level, budget, macros, patterns, bidirectional)
+        if solution is None:
+            return None
+        pushes += solution.pushes
+        nodes_expanded += solution.nodes_expanded
+
+        # Record the crates in the area after each push
+        players = area_level.players
+        crates = area_level.crates_mask(area_level.crates)
+        plan = [crates]
+        for move in solution.moves:
+            players, crates, _ = apply_move(area_level, players, crates,
+                                            area_level.offset(MOVE_TO_DIRECTION[move.lower()]))
+            if move.isupper():
+                plan.append(crates)
+        plans.append((area_level.crates_mask(area), plan))
+
+    offsets = [(DIRECTION_TO_MOVE[d], level.offset(d)) for d in DIRECTIONS]
+    others = level.crates_mask(level.crates) & ~sum(area_mask for area_mask, _ in plans)
+    players = tuple(level.players)
+    progress = tuple(0 for _ in plans)
+    remaining = sum(len(plan) - 1 for _, plan in plans)
+
+    # A best first search which prefers making progress through the plans, so is quick but not always shortest
+    counter = count()
+    queue = [(remaining, 0, next(counter), progress, players)]
+    parents: Dict[tuple, Optional[Tuple[tuple, str]]] = {(progress, players): None}
+    while queue:
+        remaining, moves, _, progress, players = heappop(queue)
+        nodes_expanded += 1
+        budget.spend()
+        if remaining == 0:
+            key = (progress, players)
+            path = []
+            while parents[key] is not None:
+                key, move = parents[key]
+                path.append(move)
+            return Solution("".join(reversed(path)), pushes, nodes_expanded)
+
+        crates = others
+        for (_, plan), index in zip(plans, progress):
+            crates |= plan[index]
+
+        for move, offset in offsets:
+            new_players, new_crates, pushed = apply_move(level, players, crates, offset)
+            if new_players == players:
+                continue
+
+            new_progress = []
+            for (area_mask, plan), index in zip(plans, progress):
+                area_crates = new_crates & area_mask
+                if area_crates == plan[index]:
+                    new_progress.append(index)
+                elif index + 1 < len(plan) and area_crates == plan[index + 1]:
+                    new_progress.append(index + 1)
+                else:
+                    break
+            else:
+                key = (tuple(new_progress), new_players)
+                if key in parents:
+                    continue
+                parents[key] = ((progress, players), move.upper() if pushed else move)
+                new_remaining = remaining - (sum(new_progress) - sum(progress))
+                heappush(queue, (new_remaining, moves + 1, next(counter), key[0], new_players))
+
+    return None
+
+
+def _solve_by_moves(level: Level, analysis: MapAnalysis, budget: SearchBudget) -> Optional[Solution]:
+    """
+    Search move by move, which is needed when there is more than one player since they all move together.
+    On symmetric levels, only one of each set of mirror image states is expanded.
+    """
+    offsets = [(DIRECTION_TO_MOVE[d], level.offset(d)) for d in DIRECTIONS]
+    distances = analysis.distances
+    symmetry_group = analysis.symmetry_group
+    players = tuple(level.players)
+    crates = level.crates_mask(level.crates)
+    heuristic = lower_bound(analysis, list(level.crates))
+    if heuristic == UNREACHABLE:
+        return None
+    heuristic *= PUSH_COST
+
+    counter = count()
+    queue = [(heuristic, 0, next(counter), players, crates)]
+    best: Dict[Tuple[Tuple[int, ...], int], int] = {(players, crates): 0}
+    parents: Dict[Tuple[Tuple[int, ...], int], Optional[Tuple[Tuple[Tuple[int, ...], int], str]]] = \
+        {(players, crates): None}
+    closed = set()
+    nodes_expanded = 0
+
+    while queue:
+        estimate, cost, _, players, crates = heappop(queue)
+        key = (players, crates)
+        canonical_key = key if symmetry_group.is_trivial else symmetry_group.canonical_players(crates, players)
+        if canonical_key in closed:
+            continue
+        closed.add(canonical_key)
+        nodes_expanded += 1
+        budget.spend()
+
+        if level.is_solved(crates):
+            moves = []
+            while parents[key] is not None:
+                key, move = parents[key]
+                moves.append(move)
+            return Solution("".join(reversed(moves)), cost // PUSH_COST, nodes_expanded)
+
+        heuristic = estimate - cost
+        for move, offset in offsets:
+            new_players, new_crates, pushes = apply_move(level, players, crates, offset)
+            new_key = (new_players, new_crates)
+            if new_key in closed or new_players == players:
+                continue
+
+            new_heuristic = heuristic
+            if pushes:
+                if any(distances[c] == UNREACHABLE for c in iterate_cells(new_crates & ~crates)):
+                    continue
+                new_heuristic = lower_bound(analysis, list(iterate_cells(new_crates)))
+                if new_heuristic == UNREACHABLE:
+                    continue
+                new_heuristic *= PUSH_COST
+                move = move.upper()
+
+            new_cost = cost + pushes * PUSH_COST + 1
+            if new_cost >= best.get(new_key, UNREACHABLE * PUSH_COST):
+                continue
+            best[new_key] = new_cost
+            parents[new_key] = (key, move)
+            heappush(queue, (new_cost + new_heuristic, new_cost, next(counter), new_players, new_crates))
+
+    return None
@@ -0,0 +1,113 @@
+from typing import List, Tuple
+
+from solver.level import Level
+
+
+class SymmetryGroup:
+    """
+    The rotations and reflections which leave a level's walls and goals unchanged, each as a mapping from
+    every cell to the cell it is moved to. Positions which are mirror images of each other need the same
+    number of pushes to solve, so a search only needs to visit one of them. The canonical form of a position
+    is the smallest of its images, so every position in the same class has the same canonical form.
+    """
+    def __init__(self, level: Level):
+        self.__permutations = find_symmetries(level)
+        self.__identity = tuple(range(level.size))
+
+    @property
+    def permutations(self) -> List[Tuple[int, ...]]:
+        """ The mapping of cells for each symmetry, not including the identity """
+        return self.__permutations
+
+    @property
+    def is_trivial(self) -> bool:
+        """ True if the level has no symmetry, so every position is already canonical """
+        return not self.__permutations
+
+    def canonical_crates(self, crates: int) -> int:
+        """
+        :param crates: the crates as a bitboard
+        :return: the smallest image of the crates under the symmetries
+        """
+        best = crates
+        for permutation in self.__permutations:
+            best = min(best, _map_mask(crates, permutation))
+        return best
+
+    def canonical_form(self, crates: int) -> Tuple[int, List[Tuple[int, ...]]]:
+        """
+        :param crates: the crates as a bitboard
+        :return: the smallest image of the crates, and every symmetry (including the identity) which maps the
+        crates onto it, so the cells of the player can be mapped the same way
+        """
+        best = crates
+        permutations = [self.__identity]
+        for permutation in self.__permutations:
+            image = _map_mask(crates, permutation)
+            if image < best:
+                best = image
+                permutations = [permutation]
+            elif image == best:
+                permutations.append(permutation)
+        return best, permutations
+
+    def canonical_players(self, crates: int, players: Tuple[int, ...]) -> Tuple[Tuple[int, ...], int]:
+        """
+        The canonical form of a position with players in exact places,
+        matching the (players, crates) keys used when searching move by move
+        :param crates: the crates as a bitboard
+        :param players: the cells of the players
+        :return: the smallest image of the players and crates
+        """
+        best = (crates, tuple(sorted(players)))
+        for permutation in self.__permutations:
+            image = _map_mask(crates, permutation)
+            if image <= best[0]:
+                best = min(best, (image, tuple(sorted(permutation[player] for player in players))))
+        return best[1], best[0]
+
+
+def find_symmetries(level: Level) -> List[Tuple[int, ...]]:
+    """
+    Find the rotations and reflections of a level which leave the walls and goals where they are.
+    Only half turns and reflections in the axes are possible unless the level is square.
+    :param level: the level
+    :return: the mapping of cells for each symmetry, not including the identity
+    """
+    # Work on the padded grid of cells, which has the same symmetries as the map
+    width = level.stride
+    height = level.size // width
+    transforms = [
+        lambda x, y: (width - 1 - x, y),
+        lambda x, y: (x, height - 1 - y),
+        lambda x, y: (width - 1 - x, height - 1 - y),
+    ]
+    if width == height:
+        transforms += [
+            lambda x, y: (y, x),
+            lambda x, y: (height - 1 - y, width - 1 - x),
+            lambda x, y: (height - 1 - y, x),
+            lambda x, y: (y, width - 1 - x),
+        ]
+
+    walls = level.walls
+    goals = level.goals
+    symmetries = []
+    for transform in transforms:
+        permutation = []
+        for cell in range(level.size):
+            x, y = transform(cell % width, cell // width)
+            permutation.append(y * width + x)
+        if all(walls[permutation[c]] == walls[c] for c in range(level.size)) and \
+                {permutation[goal] for goal in goals} == goals:
+            symmetries.append(tuple(permutation))
+    return symmetries
+
+
+def _map_mask(mask: int, permutation: Tuple[int, ...]) -> int:
+    image = 0
+    while mask:
+        low = mask & -mask
+        image |= 1 << permutation[low.bit_length() - 1]
+        mask ^= low
+    return image
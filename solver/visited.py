@@ -0,0 +1,204 @@
+import tempfile
+from itertools import count
+from typing import Dict, Optional
+
+# New partitions start with this many slots, and double in size when more than half full
+_INITIAL_SLOTS = 64
+
+
+class _Partition:
+    """
+    An open addressed hash table with linear probing, kept in flat byte arrays. While a partition is spilled,
+    its arrays are in the spill file instead of in memory.
+    """
+    def __init__(self, record_size: int):
+        self.slots = _INITIAL_SLOTS
+        self.count = 0
+        self.used: Optional[bytearray] = bytearray(self.slots)
+        self.records: Optional[bytearray] = bytearray(self.slots * record_size)
+        self.last_used = 0
+        # Where the arrays were last written in the spill file, and how much room there is there
+        self.file_offset: Optional[int] = None
+        self.file_size = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.used) + len(self.records) if self.used is not None else 0
+
+
+class VisitedTable:
+    """
+    The states a search has visited, as a hash table from fixed width byte strings to fixed width values, such as
+    packed crates to the cells the player has been seen in with those crates. Both are stored in flat byte arrays
+    instead of as Python objects, which takes a fraction of the memory.
+
+    States are split into partitions chosen by the caller, which should group states that are visited around
+    the same time, such as by their lower bound. When the partitions in memory take more than the memory
+    budget, the ones used least recently are written to a temporary file, and read back when next needed.
+    """
+    def __init__(self, width: int, value_width: int, memory: Optional[int] = None):
+        """
+        :param width: the length of every packed state in bytes
+        :param value_width: the length of every value in bytes
+        :param memory: the bytes the partitions can use in memory before spilling to disk, or None for no limit
+        """
+        self.__width = width
+        self.__record_size = width + value_width
+        self.__memory = memory
+        self.__partitions: Dict[int, _Partition] = dict()
+        self.__clock = count(1)
+        self.__count = 0
+        self.__in_memory = 0
+        self.__peak_memory = 0
+        self.__file = None
+        self.__file_size = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def peak_memory(self) -> int:
+        """ The most bytes the partitions in memory have used at once """
+        return self.__peak_memory
+
+    @property
+    def spilled(self) -> int:
+        """ The size of the spill file in bytes, which is 0 if nothing has been spilled """
+        return self.__file_size
+
+    def get(self, partition: int, state: bytes) -> Optional[bytes]:
+        """
+        :param partition: the partition the state belongs in
+        :param state: the packed state
+        :return: the value stored for the state, or None if it has not been visited
+        """
+        table = self.__load(partition, False)
+        if table is None:
+            return None
+        slot = self.__find(table, state)
+        if not table.used[slot]:
+            return None
+        start = slot * self.__record_size
+        return bytes(table.records[start + self.__width:start + self.__record_size])
+
+    def put(self, partition: int, state: bytes, value: bytes):
+        """
+        Record a state as visited, replacing the value stored for it if it already has been
+        :param partition: the partition the state belongs in, which must be the same every time for a state
+        :param state: the packed state, which must be the width given when creating the table
+        :param value: the value, which must be the width given when creating the table
+        :return: nothing
+        """
+        table = self.__load(partition, True)
+        slot = self.__find(table, state)
+        start = slot * self.__record_size
+        table.records[start + self.__width:start + self.__record_size] = value
+        if table.used[slot]:
+            return
+
+        table.used[slot] = 1
+        table.records[start:start + self.__width] = state
+        table.count += 1
+        self.__count += 1
+        if table.count * 2 > table.slots:
+            self.__grow(table)
+
+    def close(self):
+        """
+        Delete the spill file and free the memory used
+        :return: nothing
+        """
+        self.__partitions.clear()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __find(self, table: _Partition, state: bytes) -> int:
+        """
+        Find the slot holding a state, or the empty slot it would go in
+        """
+        width = self.__width
+        record_size = self.__record_size
+        mask = table.slots - 1
+        used = table.used
+        records = table.records
+        slot = hash(state) & mask
+        while used[slot]:
+            start = slot * record_size
+            if records[start:start + width] == state:
+                return slot
+            slot = (slot + 1) & mask
+        return slot
+
+    def __grow(self, table: _Partition):
+        old_used = table.used
+        old_records = table.records
+        old_size = table.size
+        width = self.__width
+        record_size = self.__record_size
+
+        table.slots *= 2
+        table.used = bytearray(table.slots)
+        table.records = bytearray(table.slots * record_size)
+        for slot, used in enumerate(old_used):
+            if used:
+                start = slot * record_size
+                new_slot = self.__find(table, bytes(old_records[start:start + width]))
+                table.used[new_slot] = 1
+                new_start = new_slot * record_size
+                table.records[new_start:new_start + record_size] = old_records[start:start + record_size]
+        self.__use_memory(table.size - old_size, table)
+
+    def __load(self, partition: int, create: bool) -> Optional[_Partition]:
+        """
+        Get a partition, reading it back from the spill file if needed
+        """
+        table = self.__partitions.get(partition)
+        if table is None:
+            if not create:
+                return None
+            table = _Partition(self.__record_size)
+            self.__partitions[partition] = table
+            table.last_used = next(self.__clock)
+            self.__use_memory(table.size, table)
+            return table
+
+        table.last_used = next(self.__clock)
+        if table.used is None:
+            self.__file.seek(table.file_offset)
+            table.used = bytearray(self.__file.read(table.slots))
+            table.records = bytearray(self.__file.read(table.slots * self.__record_size))
+            self.__use_memory(table.size, table)
+        return table
+
+    def __use_memory(self, size: int, keep: _Partition):
+        """
+        Account for memory used by partitions, spilling the least recently used ones if over the budget
+        """
+        self.__in_memory += size
+        self.__peak_memory = max(self.__peak_memory, self.__in_memory)
+        if self.__memory is None or self.__in_memory <= self.__memory:
+            return
+
+        loaded = [table for table in self.__partitions.values() if table.used is not None and table is not keep]
+        loaded.sort(key=lambda table: table.last_used)
+        for table in loaded:
+            if self.__in_memory <= self.__memory // 2:
+                break
+            self.__spill(table)
+
+    def __spill(self, table: _Partition):
+        if self.__file is None:
+            self.__file = tempfile.TemporaryFile(prefix="visited")
+        size = table.size
+        if table.file_offset is None or table.file_size < size:
+            # Tables only grow, so a table that no longer fits where it was goes at the end of the file
+            table.file_offset = self.__file_size
+            table.file_size = size
+            self.__file_size += size
+        self.__file.seek(table.file_offset)
+        self.__file.write(table.used)
+        self.__file.write(table.records)
+        self.__in_memory -= size
+        table.used = None
+        table.records = None
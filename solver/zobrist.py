@@ -0,0 +1,69 @@
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+from zobrist import zobrist_keys
+
+
+class ZobristTable:
+    """
+    Zobrist keys for crates and players on the cells of a level
+    """
+    def __init__(self, size: int):
+        self.__crate_keys = zobrist_keys("crate", size)
+        self.__player_keys = zobrist_keys("player", size)
+
+    @property
+    def crate_keys(self) -> Tuple[int, ...]:
+        return self.__crate_keys
+
+    @property
+    def player_keys(self) -> Tuple[int, ...]:
+        return self.__player_keys
+
+    def crates_hash(self, crates: Iterable[int]) -> int:
+        """
+        :param crates: the cells containing crates
+        :return: the hash of the crates
+        """
+        value = 0
+        for crate in crates:
+            value ^= self.__crate_keys[crate]
+        return value
+
+    def players_hash(self, players: Iterable[int]) -> int:
+        """
+        :param players: the cells containing players
+        :return: the hash of the players
+        """
+        value = 0
+        for player in players:
+            value ^= self.__player_keys[player]
+        return value
+
+    def push(self, crates_hash: int, start: int, finish: int) -> int:
+        """
+        Update a hash of the crates after a crate moved
+        :param crates_hash: the hash before the push
+        :param start: the cell the crate moved from
+        :param finish: the cell the crate moved to
+        :return: the new hash
+        """
+        return crates_hash ^ self.__crate_keys[start] ^ self.__crate_keys[finish]
+
+    def position_hash(self, crates_hash: int, normalised_player: int) -> int:
+        """
+        Hash a position where only the region the player can walk around matters, not where in it the player is.
+        :param crates_hash: the hash of the crates
+        :param normalised_player: a cell identifying the player's region, such as the lowest cell in it
+        :return: the hash of the position
+        """
+        return crates_hash ^ self.__player_keys[normalised_player]
+
+
+@lru_cache(maxsize=None)
+def get_zobrist_table(size: int) -> ZobristTable:
+    """
+    :param size: the number of cells in the level
+    :return: a shared Zobrist table for levels of that size
+    """
+    return ZobristTable(size)
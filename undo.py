@@ -126,6 +126,27 @@ class UndoManager:
 
         self.undo_to_index(target_index)
 
+    @property
+    def position(self) -> int:
+        """ The current index in the undo history, which can be passed to undo_to_index or rollback """
+        return self.__current_index
+
+    def rollback(self, target_index: int):
+        """
+        Undo to a specific index, and forget everything after it so it can never be redone.
+        Used to throw away changes which were only tried out, such as a move which turned out to be blocked.
+        :param target_index: the index to roll back to, which must not be ahead of the current position
+        :return: nothing
+        """
+        if target_index == self.__current_index:
+            return
+
+        self.undo_to_index(target_index)
+        del self.__undo_actions[target_index:]
+        del self.__redo_actions[target_index:]
+        for label in self.__labels:
+            self.__labels[label] = self.__labels[label][:bisect(self.__labels[label], target_index)]
+
     def undo_to_index(self, target_index: int):
         """
         Undo to a specific index. Note that zero undoes everything.
@@ -248,3 +269,54 @@ def test_undo_manager():
     undo_manager.redo("saved")
     assert ls == [1, 4]
 
+
+
+def test_undo_manager_rollback():
+    undo_manager = UndoManager()
+    ls = []
+    undo_manager.save_position("saved")
+    assert undo_manager.position == 0
+
+    ls.append(1)
+    undo_manager.register(ls.pop, lambda: ls.append(1))
+    undo_manager.save_position("saved")
+    start = undo_manager.position
+    assert start == 1
+
+    ls.append(2)
+    undo_manager.register(ls.pop, lambda: ls.append(2))
+    undo_manager.save_position("saved")
+    ls.append(3)
+    undo_manager.register(ls.pop, lambda: ls.append(3))
+    assert undo_manager.position == 3
+
+    # Rolling back to the current position changes nothing
+    undo_manager.rollback(3)
+    assert ls == [1, 2, 3]
+    assert undo_manager.position == 3
+
+    undo_manager.rollback(start)
+    assert ls == [1]
+    assert undo_manager.position == start
+
+    # What was rolled back, and the labels saved after it, are forgotten so can never be redone
+    undo_manager.redo("saved")
+    assert ls == [1]
+    assert undo_manager.position == start
+    try:
+        undo_manager.redo_to_index(start + 1)
+        assert False
+    except ValueError:
+        pass
+
+    # Earlier history is kept
+    undo_manager.undo("saved")
+    assert ls == []
+    undo_manager.redo("saved")
+    assert ls == [1]
+
+    try:
+        undo_manager.rollback(start + 1)
+        assert False
+    except ValueError:
+        pass
@@ -2,28 +2,37 @@ from typing import List, NamedTuple, Optional
 
 import pygame
 from pygame.event import EventType
+from pygame.rect import Rect
 
 from app_container import AppContainer
 from constants.colours import YOU_WIN_COLOUR, BACKGROUND_COLOUR
 from constants.direction import Direction, direction_sorter, direction_to_coordinate, try_get_move_from_key
 from constants.text import MAP_VIEW_YOU_WIN
 from coordinate import Coordinate
+from game_state import GameState
 from layouts.aspect_layout import AspectLayout
 from layouts.grid_layout import GridLayout
 from layouts.layout import BasicLayout
 from layouts.margin_layout import MarginLayout
 from maps.map_reader import read_map
 from maps.maps import MAPS
-from opengl_support.helpers import set_background_and_clear
+from opengl_support.helpers import set_background_and_clear, set_draw_opacity
 from pieces.crate import CratePiece
 from pieces.goal import GoalPiece
 from pieces.piece_draw_order import PIECE_DRAW_ORDER
 from pieces.player import PlayerPiece
+from solver.analysis import get_map_analysis
+from solver.deadlocks import Deadlock, DeadlockDetector
+from solver.hints import Hint, HintService
+from solver.level import MOVE_TO_DIRECTION
 from views.start_view import StartView
 from views.view import View, ViewModel
 
 PLAYER_MOVE_UNDO_LABEL = "player_move"
 
+# How solid the players showing a hint are drawn
+HINT_OPACITY = 0.5
+
 
 class MapViewParameters(NamedTuple):
     map_index: int
@@ -37,10 +46,28 @@ class MapViewModel(ViewModel[MapViewParameters]):
 
         self.undo_manager.enabled = False
         self.grid = read_map(self.app_container, map_definition)
+        # Only maps being played are analysed for deadlocks, as the analysis searches from every goal
+        self.grid.map_analysis = get_map_analysis(map_definition)
+        level = self.grid.map_analysis.level
+        crates = [level.cell(crate.x, crate.y) for crate in self.grid.get_pieces_of_type(CratePiece)]
+        self.grid.deadlock_detector = DeadlockDetector(self.grid.map_analysis, crates)
         self.undo_manager.enabled = True
         self.undo_manager.save_position(PLAYER_MOVE_UNDO_LABEL)
         self.map_won = False
 
+        # Hints are searched for in the background, and shown once found until the players move
+        self.hints = HintService()
+        self.hint: Optional[Hint] = None
+        self.hint_state: Optional[GameState] = None
+        self.hint_players: List[Coordinate] = []
+        self.hint_direction: Optional[Direction] = None
+
+    @property
+    def deadlock(self) -> Optional[Deadlock]:
+        """ Why the map can no longer be won, or None if it still might be """
+        detector = self.grid.deadlock_detector
+        return detector.deadlock if detector else None
+
     @property
     def players_can_move(self):
         return not self.map_won and not self.animator.animating()
@@ -53,6 +80,62 @@ class MapViewModel(ViewModel[MapViewParameters]):
         if self.map_won:
             self.music_player.play_you_win()
 
+    def move_players(self, direction: Direction) -> bool:
+        """
+        Move the players, the same as pressing an arrow key
+        :param direction: the direction players should move in
+        :return: True if any player moved
+        """
+        player_moved = False
+        players = self.grid.get_pieces_of_type(PlayerPiece)
+        players_sorted = sorted(players, key=lambda c: direction_sorter(direction)(c))
+
+        for index, player in enumerate(players_sorted):
+            coordinate_change = direction_to_coordinate(direction)
+            player_moved = player.move(player.coordinate + coordinate_change) or player_moved
+
+        if player_moved:
+            self.clear_hint()
+            self.undo_manager.save_position(PLAYER_MOVE_UNDO_LABEL)
+        return player_moved
+
+    def request_hint(self):
+        """
+        Start looking for the next push from the current position, which is shown when found
+        :return: nothing
+        """
+        self.clear_hint()
+        self.hint_state = GameState.from_grid(self.grid)
+        self.hints.request(self.hint_state)
+
+    def update_hint(self):
+        """
+        Pick up the requested hint if it has been found
+        :return: nothing
+        """
+        if self.hint_state is None or self.hint is not None:
+            return
+
+        self.hint = self.hints.get(self.hint_state.hash)
+        if self.hint is not None:
+            # Show the players where they need to be to make the push
+            state = self.hint_state.copy()
+            for move in self.hint.moves[:-1]:
+                state.move(MOVE_TO_DIRECTION[move])
+            self.hint_players = [state.level.coordinate(player) for player in state.players]
+            self.hint_direction = MOVE_TO_DIRECTION[self.hint.moves[-1].lower()]
+
+    def clear_hint(self):
+        """
+        Stop looking for and showing a hint, as the players have moved
+        :return: nothing
+        """
+        self.hints.cancel()
+        self.hint = None
+        self.hint_state = None
+        self.hint_players = []
+        self.hint_direction = None
+
 
 class MapView(View[MapViewParameters, MapViewModel]):
     """
@@ -95,6 +178,7 @@ class MapView(View[MapViewParameters, MapViewModel]):
     def post_event_loop(self):
         if not self.model.map_won:
             self.model.check_win()
+        self.model.update_hint()
 
     def on_events(self, events: List[EventType]):
         for event in events:
@@ -105,9 +189,13 @@ class MapView(View[MapViewParameters, MapViewModel]):
         if event.type == pygame.KEYDOWN:
             if self.model.players_can_move:
                 if event.key == pygame.K_u:
+                    self.model.clear_hint()
                     self.undo_manager.undo(PLAYER_MOVE_UNDO_LABEL)
                 elif event.key == pygame.K_r:
+                    self.model.clear_hint()
                     self.undo_manager.redo(PLAYER_MOVE_UNDO_LABEL)
+                elif event.key == pygame.K_h:
+                    self.model.request_hint()
 
             # Patch to allow changing levels without a level menu!
             map_index = -1
@@ -176,10 +264,27 @@ class MapView(View[MapViewParameters, MapViewModel]):
         for piece in self.grid.get_pieces_of_type(PlayerPiece):
             piece.draw(self.grid_layout.bounding_rect.topleft, self.square_size)
 
+        if self.model.hint is not None:
+            self.draw_hint()
+
         # TODO: use z values to handle draw order and draw this in the static draw method
         if self.model.map_won:
             self.draw_you_win()
 
+    def draw_hint(self):
+        """
+        Draw faded players where they need to stand to make the next push, facing the way to push
+        :return: nothing
+        """
+        grid_offset = self.grid_layout.bounding_rect.topleft
+        set_draw_opacity(HINT_OPACITY)
+        for coordinate in self.model.hint_players:
+            rect = Rect(grid_offset[0] + (coordinate.x * self.square_size),
+                        grid_offset[1] + (coordinate.y * self.square_size),
+                        self.square_size, self.square_size)
+            self.resources.player[self.model.hint_direction][0].draw(rect)
+        set_draw_opacity(1.0)
+
     def draw_you_win(self):
         """
         Draw the you win text!
@@ -193,23 +298,14 @@ class MapView(View[MapViewParameters, MapViewModel]):
         :param direction: the direction players should move in
         :return: nothing
         """
-        player_moved = False
-        players = self.grid.get_pieces_of_type(PlayerPiece)
-        players_sorted = sorted(players, key=lambda c: direction_sorter(direction)(c))
-
-        for index, player in enumerate(players_sorted):
-            coordinate_change = direction_to_coordinate(direction)
-            player_moved = player.move(player.coordinate + coordinate_change) or player_moved
-
-        if player_moved:
-            self.undo_manager.save_position("player_move")
+        self.model.move_players(direction)
 
     @property
     def square_size(self):
         return self.square_layout.bounding_rect.width
 
     def close(self):
-        pass
+        self.model.hints.close()
 
     @property
     def grid(self):
@@ -88,17 +88,16 @@ class StartViewModel(ViewModel[StartViewParameters]):
         self.grid.add_piece(self.player_piece, self.player_loop[0])
 
         # Title bricks
+        brick = StaticPiece(self.grid, self.app_container, self.resources.menu_background)
         for y in range(1, TITLE_HEIGHT + 1):
             for x in range(1, self.grid.width - 1):
-                self.grid.add_piece(StaticPiece(self.grid, self.app_container, self.resources.menu_background),
-                                    Coordinate(x, y))
+                self.grid.add_piece(brick, Coordinate(x, y))
 
         # Menu item bricks
         for x in range(MENU_OPTION_LEFT, MENU_OPTION_RIGHT + 1):
             for i in range(0, len(MENU_OPTION_BY_INDEX)):
                 y = menu_option_position(i)
-                self.grid.add_piece(StaticPiece(self.grid, self.app_container, self.resources.menu_background),
-                                    Coordinate(x, y))
+                self.grid.add_piece(brick, Coordinate(x, y))
 
         # Regular wall. We alternate blocked off positions every 2 menu items, starting with the second...
         for i in range(1, len(MENU_OPTION_BY_INDEX), 2):
@@ -110,13 +109,13 @@ class StartViewModel(ViewModel[StartViewParameters]):
                 # Wall on the left
                 r = range(1, MENU_OPTION_LEFT)
             for x in r:
-                self.grid.add_piece(WallPiece(self.grid, self.app_container), Coordinate(x, y))
+                self.grid.add_piece(self.grid.terrain_piece(WallPiece), Coordinate(x, y))
 
         # Crate
         self.grid.add_piece(self.crate_piece, Coordinate(2, menu_option_position(1) - 1))
 
         # Goal
-        self.grid.add_piece(GoalPiece(self.grid, self.app_container), Coordinate(GRID_WIDTH - 2, GRID_HEIGHT - 2))
+        self.grid.add_piece(self.grid.terrain_piece(GoalPiece), Coordinate(GRID_WIDTH - 2, GRID_HEIGHT - 2))
 
         # Player loop
         # Around the crate
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from random import Random
+from typing import Tuple
+
+# Keys are generated from a fixed seed so hashes of the same position agree between runs and processes
+ZOBRIST_SEED = "sokoban"
+
+# Keys made by zobrist_key are 64 bits
+_KEY_MASK = (1 << 64) - 1
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(name: str, size: int) -> Tuple[int, ...]:
+    """
+    Get random 64 bit keys for a kind of piece on every cell. Hashing a position is then just xor-ing together
+    the keys of everything in it, so moving a piece updates the hash with two xors.
+    The same name and size always gives the same keys.
+    :param name: the kind of piece the keys are for
+    :param size: the number of cells
+    :return: a key for every cell
+    """
+    random = Random(f"{ZOBRIST_SEED}:{name}:{size}")
+    return tuple(random.getrandbits(64) for _ in range(size))
+
+
+def zobrist_key(name: str, cell: int) -> int:
+    """
+    Get the random 64 bit key for a kind of piece on one cell, without a table of keys for every cell, for boards
+    too big to keep one. The key is the cell mixed with a seed for the name by the SplitMix64 finaliser.
+    The same name and cell always gives the same key.
+    :param name: the kind of piece the key is for
+    :param cell: the cell
+    :return: the key
+    """
+    key = (zobrist_keys(name, 1)[0] + cell * 0x9E3779B97F4A7C15) & _KEY_MASK
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & _KEY_MASK
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & _KEY_MASK
+    return key ^ (key >> 31)